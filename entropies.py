@@ -1,68 +1,305 @@
-import scipy.stats
-from game_state import *
+import argparse
+import csv
+import os
+import shutil
+from multiprocessing import Pool
+import numpy as np
+from packed_words import write_packed_words, PACKED_WORDS_FILE
+from shared_tables import SharedTables
+from feedback import encode_words, compute_patterns, words_digest, WORD_LEN, NUM_PATTERNS, PATTERN_DIGITS, \
+    POWERS, GREEN, GREEN_COUNTS, YELLOW_COUNTS, GREY_COUNTS
 
 
 WORDS_LIST_FILE = "wordslist.txt"
+FREQ_WORDS_FILE = "freq_words.txt"
 ENTROPY_FILE = "entropies_final.txt"
+WORD_DATA_FILE = "word_data.csv"
+CHECKPOINT_DIR = "entropy_shards"
+MANIFEST_FILE = "manifest.txt"
 
+NUM_SHARDS = 64
+BATCH_SIZE = 32  # words calculated between two checkpoint writes
+MAX_ENTROPY = np.log2(NUM_PATTERNS)
 
-# Preprocessing indications
-INDICATIONS = list(itertools.product([Indication.GREY, Indication.YELLOW, Indication.GREEN], repeat=WORD_LEN))
+WORD_DATA_COLUMNS = ['word', 'avg_green', 'avg_yellow', 'avg_grey', 'entropy', 'avg_green_scaled',
+                     'avg_yellow_scaled', 'avg_grey_scaled', 'entropy_scaled', 'TYPE', 'GREEN', 'YELLOW', 'GREY',
+                     'ENTROPY']
+
+
+def read_words(file_path):
+    """
+    reads a words file
+    :param file_path:
+    :return: list of words in file
+    """
+    with open(file_path, "r", encoding='utf-8-sig') as words_file:
+        return [w for w in words_file.read().split("\n") if w]
 
 
 class EntropyPreprocess:
+    """
+    Calculates the entropy of the indication on a word, when the hidden word is any word of a words file
+    """
+
+    def __init__(self, words_file_path, letters=None):
+        """
+        :param words_file_path: words file
+        :param letters: the encoded words of the file, if they are known (shared by the pool workers)
+        """
+        self.letters = encode_words(read_words(words_file_path)) if letters is None else letters
+        self.num_words = len(self.letters)
+
+    # Counts the number of words matching each indication, given the patterns of words against all words.
+    # A word matches an indication if its letters fit it - a green letter also fits a yellow indication,
+    # so a word with green letters matches its pattern with any subset of the greens turned to yellow.
+    def count_possible_words(self, patterns):
+        patterns = patterns.astype(np.intp)
+        num_rows = len(patterns)
+        codes = patterns + NUM_PATTERNS * np.arange(num_rows)[:, None]
+        counts = np.bincount(codes.ravel(), minlength=num_rows * NUM_PATTERNS)
+        # bit i is set if letter i is green
+        green_bits = ((PATTERN_DIGITS[patterns] == GREEN) * (1 << np.arange(WORD_LEN))).sum(axis=2)
+        has_green = green_bits != 0
+        codes, green_bits = codes[has_green], green_bits[has_green]
+        for subset in range(1, 2 ** WORD_LEN):
+            fits = (green_bits & subset) == subset
+            turned_yellow = ((subset >> np.arange(WORD_LEN)) & 1).astype(bool)
+            counts += np.bincount(codes[fits] - POWERS[turned_yellow].sum(), minlength=num_rows * NUM_PATTERNS)
+        return counts.reshape(num_rows, NUM_PATTERNS)
+
+    # Calculates entropies of words according to all possible indications
+    def get_entropies(self, word_list):
+        counts = self.count_possible_words(compute_patterns(encode_words(word_list), self.letters))
+        probabilities = counts / counts.sum(axis=1, keepdims=True)
+        logs = np.log2(probabilities, where=probabilities > 0, out=np.zeros_like(probabilities))
+        return -(probabilities * logs).sum(axis=1)
 
-    def __init__(self, words_file_path, entropy_file_path):
-        # Processing words file
-        words_file = open(words_file_path, "r", encoding='utf-8-sig')
-        all_words = words_file.read()
-        self.words_list = all_words.split("\n")
-        self.num_words = len(self.words_list)
-        words_file.close()
-
-        # Processing entropy
-        self.entropy_file = open(entropy_file_path, 'a')
-        self.process_entropy()
-        self.entropy_file.close()
-
-    def process_entropy(self):
-        count = 0
-        start = False
-        for word in self.words_list:
-            if count % 1000 == 0:
-                print("FINISHED {} words".format(count))
-            if word == 'malty':
-                start = True
-            if start:
-                entropy = self.get_entropy(word)
-                to_write = word + ' ' + str(entropy) + '\n'
-                print(word + ' ' + str(entropy))
-                self.entropy_file.write(to_write)
-            count += 1
-
-    # Counts the number of words matching the indication according to word
-    def count_possible_words(self, word, indication):
-        count = 0
-        for w in self.words_list:
-            possible = True
-            for i in range(WORD_LEN):
-                if (indication[i] == Indication.GREEN and w[i] != word[i]) \
-                        or (indication[i] == Indication.YELLOW and word[i] not in w) \
-                        or (indication[i] == Indication.GREY and word[i] in w):
-                    possible = False
-            if possible:
-                count += 1
-        return count
-
-    # Calculates entropy of a word according to all possible indications
     def get_entropy(self, word):
-        probabilities = []
-        # indications = itertools.product([Indication.GREY, Indication.YELLOW, Indication.GREEN], repeat=WORD_LEN)
-        for indication in INDICATIONS:
-            num_possible_words = self.count_possible_words(word, indication)
-            prob = num_possible_words / self.num_words
-            probabilities.append(prob)
-        return scipy.stats.entropy(probabilities, base=2)
+        return self.get_entropies([word])[0]
+
+    # Calculates the entropies of a shard of words, appending them to its checkpoint file.
+    # Words already in the checkpoint file are skipped, so an interrupted shard resumes where it stopped.
+    def process_shard(self, shard_words, checkpoint_path):
+        done = read_checkpoint(checkpoint_path, shard_words)
+        with open(checkpoint_path, 'a') as checkpoint:
+            for start in range(done, len(shard_words), BATCH_SIZE):
+                batch = shard_words[start:start + BATCH_SIZE]
+                entropies = self.get_entropies(batch)
+                checkpoint.write(''.join(word + ' ' + repr(float(e)) + '\n' for word, e in zip(batch, entropies)))
+                checkpoint.flush()
+        return len(shard_words) - done
+
+
+def read_checkpoint(checkpoint_path, shard_words):
+    """
+    reads a shard checkpoint file, dropping a partly written last line
+    :param checkpoint_path:
+    :param shard_words: words of the shard, in the order they are calculated
+    :return: number of words of the shard already calculated
+    """
+    if not os.path.exists(checkpoint_path):
+        return 0
+    with open(checkpoint_path, 'r') as checkpoint:
+        content = checkpoint.read()
+    complete = content[:content.rfind('\n') + 1]
+    lines = complete.splitlines()
+    for i, line in enumerate(lines):
+        if line.split(' ')[0] != shard_words[i]:
+            raise Exception("checkpoint {} does not match its shard.".format(checkpoint_path))
+    if len(complete) != len(content):
+        with open(checkpoint_path, 'w') as checkpoint:
+            checkpoint.write(complete)
+    return len(lines)
+
+
+def get_shards(words_list, num_shards):
+    """
+    splits the words list to contiguous shards
+    :param words_list:
+    :param num_shards:
+    :return: list of word lists
+    """
+    shard_size = -(-len(words_list) // num_shards)
+    return [words_list[i:i + shard_size] for i in range(0, len(words_list), shard_size)]
+
+
+def shard_path(checkpoint_dir, shard):
+    return os.path.join(checkpoint_dir, 'shard_{:04d}.txt'.format(shard))
+
+
+def check_manifest(checkpoint_dir, words_list, num_shards):
+    """
+    makes sure existing checkpoints were made for the same words and sharding, or creates a new manifest
+    :param checkpoint_dir:
+    :param words_list:
+    :param num_shards:
+    :return:
+    """
+    manifest = '{} {}'.format(num_shards, words_digest(words_list, 0))
+    manifest_path = os.path.join(checkpoint_dir, MANIFEST_FILE)
+    os.makedirs(checkpoint_dir, exist_ok=True)
+    if os.path.exists(manifest_path):
+        with open(manifest_path, 'r') as f:
+            if f.read().strip() != manifest:
+                raise Exception("checkpoints in {} were made for other words or shards.".format(checkpoint_dir))
+    else:
+        with open(manifest_path, 'w') as f:
+            f.write(manifest)
+
+
+_worker_preprocess = None
+_worker_tables = None
+
+
+def _init_worker(words_file_path, tables_spec):
+    global _worker_preprocess, _worker_tables
+    _worker_tables = SharedTables.attach(tables_spec)
+    _worker_preprocess = EntropyPreprocess(words_file_path, _worker_tables['letters'])
+
+
+def _process_shard(args):
+    shard_words, checkpoint_path = args
+    return _worker_preprocess.process_shard(shard_words, checkpoint_path)
+
+
+def process_entropies(words_file_path, checkpoint_dir, num_shards=NUM_SHARDS, workers=None):
+    """
+    calculates the entropies of all words, sharded across a process pool
+    :param words_file_path: words file
+    :param checkpoint_dir: directory of the shards checkpoint files
+    :param num_shards: number of shards
+    :param workers: number of processes (defaults to the number of CPUs)
+    :return: list of shards checkpoint files
+    """
+    words_list = read_words(words_file_path)
+    check_manifest(checkpoint_dir, words_list, num_shards)
+    shards = get_shards(words_list, num_shards)
+    paths = [shard_path(checkpoint_dir, i) for i in range(len(shards))]
+    count = 0
+    # the encoded words are published once for all the workers
+    with SharedTables.publish({'letters': encode_words(words_list)}) as tables, \
+            Pool(workers, initializer=_init_worker, initargs=(words_file_path, tables.spec)) as pool:
+        for num_calculated in pool.imap_unordered(_process_shard, zip(shards, paths)):
+            count += num_calculated
+            print("FINISHED {} words".format(count))
+    return paths
+
+
+def validate_entropies(entropies, words_list):
+    """
+    validates calculated entropies - every word exactly once, with a legal entropy value
+    :param entropies: list of (word, entropy) pairs
+    :param words_list: all words
+    :return:
+    """
+    seen = set()
+    for word, entropy in entropies:
+        if word in seen:
+            raise Exception("duplicate entropy for word {}.".format(word))
+        seen.add(word)
+        if not 0 <= entropy <= MAX_ENTROPY + 1e-9:
+            raise Exception("illegal entropy {} for word {}.".format(entropy, word))
+    missing = set(words_list) - seen
+    extra = seen - set(words_list)
+    if missing or extra:
+        raise Exception("{} words are missing and {} are unknown.".format(len(missing), len(extra)))
+
+
+def merge_shards(paths, words_list, entropy_file_path):
+    """
+    merges shards checkpoint files to a single sorted entropy file
+    :param paths: shards checkpoint files
+    :param words_list: all words
+    :param entropy_file_path: output file
+    :return: dictionary of word: entropy
+    """
+    entropies = []
+    for path in paths:
+        with open(path, 'r') as shard:
+            for line in shard:
+                word, entropy = line.split()
+                entropies.append((word, float(entropy)))
+    validate_entropies(entropies, words_list)
+    entropies.sort()
+    tmp_path = entropy_file_path + '.tmp'
+    with open(tmp_path, 'w') as entropy_file:
+        entropy_file.write(''.join(word + ' ' + repr(entropy) + '\n' for word, entropy in entropies))
+    os.replace(tmp_path, entropy_file_path)
+    return dict(entropies)
+
+
+def _round(values, digits):
+    """
+    rounds half up, as the values in word_data.csv are rounded
+    """
+    return np.floor(np.asarray(values) * 10 ** digits + 0.5) / 10 ** digits
+
+
+def _format(value):
+    return '{:.2f}'.format(value).rstrip('0').rstrip('.')
+
+
+def build_word_data(entropies, freq_words_file_path, word_data_file_path):
+    """
+    writes the constant values of the frequent words (used by the const evaluation)
+    :param entropies: dictionary of word: entropy
+    :param freq_words_file_path: frequent words file
+    :param word_data_file_path: output csv file
+    :return:
+    """
+    frequent_words = read_words(freq_words_file_path)
+    letters = encode_words(frequent_words)
+    # colors of each frequent word (rows) when it is guessed and a frequent word (columns) is hidden
+    patterns = compute_patterns(letters, letters)
+    columns = [_round(GREEN_COUNTS[patterns].sum(axis=0) / len(frequent_words), 2),
+               _round(YELLOW_COUNTS[patterns].sum(axis=0) / len(frequent_words), 2),
+               _round(GREY_COUNTS[patterns].sum(axis=0) / len(frequent_words), 2),
+               _round([entropies[w] for w in frequent_words], 2)]
+    mins = [c.min() for c in columns]
+    maxs = [c.max() for c in columns]
+    scaled = [(c - low) / (high - low) for c, low, high in zip(columns, mins, maxs)]
+    # the scaled columns are ordered green, yellow, grey, entropy
+    tmp_path = word_data_file_path + '.tmp'
+    with open(tmp_path, 'w', newline='') as word_data:
+        writer = csv.writer(word_data)
+        writer.writerow(WORD_DATA_COLUMNS)
+        for i, word in enumerate(frequent_words):
+            row = [word] + [_format(c[i]) for c in columns] + ['{:.3f}'.format(c[i]) for c in scaled]
+            if i == 0:
+                row += ['MIN'] + [_format(v) for v in mins]
+            elif i == 1:
+                row += ['MAX'] + [_format(v) for v in maxs]
+            else:
+                row += [''] * 5
+            writer.writerow(row)
+    os.replace(tmp_path, word_data_file_path)
+
+
+def main():
+    """
+    calculates the entropies of all words and the constant values of the frequent words, and packs them
+    :return:
+    """
+    parser = argparse.ArgumentParser(description='Wordle entropies preprocessing')
+    parser.add_argument('--workers', help='Number of processes (default: number of CPUs).', default=None, type=int)
+    parser.add_argument('--shards', help='Number of shards the words are split to.', default=NUM_SHARDS, type=int)
+    parser.add_argument('--checkpoint-dir', help='Directory of the shards checkpoints.', default=CHECKPOINT_DIR)
+    parser.add_argument('--words', help='Words file.', default=WORDS_LIST_FILE)
+    parser.add_argument('--output', help='Entropies output file.', default=ENTROPY_FILE)
+    parser.add_argument('--freq-words', help='Frequent words file.', default=FREQ_WORDS_FILE)
+    parser.add_argument('--word-data', help='Word data output file.', default=WORD_DATA_FILE)
+    parser.add_argument('--packed', help='Packed words output file.', default=PACKED_WORDS_FILE)
+    parser.add_argument('--keep-checkpoints', help='Keep the shards checkpoints after merging.',
+                        action='store_true')
+    args = parser.parse_args()
+    paths = process_entropies(args.words, args.checkpoint_dir, args.shards, args.workers)
+    entropies = merge_shards(paths, read_words(args.words), args.output)
+    build_word_data(entropies, args.freq_words, args.word_data)
+    write_packed_words(args.packed, words_list_file=args.words, freq_words_file=args.freq_words,
+                       word_data_file=args.word_data, entropy_file=args.output)
+    if not args.keep_checkpoints:
+        shutil.rmtree(args.checkpoint_dir)
 
 
-EntropyPreprocess(WORDS_LIST_FILE, ENTROPY_FILE)
+if __name__ == '__main__':
+    main()
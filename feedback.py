@@ -0,0 +1,239 @@
+import hashlib
+import os
+import numpy as np
+
+WORD_LEN = 5
+NUM_LETTERS = 26
+ALPHABET_SIZE = NUM_LETTERS + 1  # characters outside a-z (e.g. 'FALSE' in the words files) share one extra letter
+NUM_PATTERNS = 3 ** WORD_LEN
+
+# pattern digits - same values as the Indication enum
+GREY = 0
+YELLOW = 1
+GREEN = 2
+
+FEEDBACK_FILE = 'feedback_matrix.npy'
+FEEDBACK_DIGEST_FILE = 'feedback_matrix.sha1'
+BUILD_CHUNK = 512  # guesses per chunk when building the matrix
+ENTROPY_CHUNK_CELLS = 2 ** 22  # max (guess, candidate) pairs handled at once when computing entropies
+
+POWERS = 3 ** np.arange(WORD_LEN)
+# pattern digits of every pattern code, shape (NUM_PATTERNS, WORD_LEN)
+PATTERN_DIGITS = (np.arange(NUM_PATTERNS)[:, None] // POWERS) % 3
+GREEN_COUNTS = (PATTERN_DIGITS == GREEN).sum(axis=1)
+YELLOW_COUNTS = (PATTERN_DIGITS == YELLOW).sum(axis=1)
+GREY_COUNTS = (PATTERN_DIGITS == GREY).sum(axis=1)
+ALL_GREEN = NUM_PATTERNS - 1
+
+
+def get_pattern(guess, answer):
+    """
+    returns the pattern code of the indication given on a guess, when the hidden word is answer
+    :param guess: guessed word
+    :param answer: hidden word
+    :return: base 3 code - sum of indication[i] * 3**i
+    """
+    code = 0
+    for i in range(WORD_LEN):
+        if guess[i] == answer[i]:
+            code += GREEN * 3 ** i
+        elif guess[i] in answer:
+            code += YELLOW * 3 ** i
+    return code
+
+
+def encode_words(word_list):
+    """
+    converts a list of words to an array of letter indices
+    :param word_list: list of 5 letters lower case words
+    :return: uint8 array of shape (len(word_list), WORD_LEN)
+    """
+    joined = ''.join(word_list).encode('ascii')
+    letters = np.frombuffer(joined, dtype=np.uint8) - np.uint8(ord('a'))
+    letters[letters >= NUM_LETTERS] = NUM_LETTERS
+    return letters.reshape(-1, WORD_LEN)
+
+
+def compute_patterns(guess_letters, answer_letters):
+    """
+    computes the pattern codes of all guesses against all answers
+    :param guess_letters: encoded guesses, shape (G, WORD_LEN)
+    :param answer_letters: encoded answers, shape (A, WORD_LEN)
+    :return: uint8 array of shape (G, A)
+    """
+    num_answers = len(answer_letters)
+    present = np.zeros((num_answers, ALPHABET_SIZE), dtype=bool)
+    present[np.arange(num_answers)[:, None], answer_letters] = True
+    green = guess_letters[:, None, :] == answer_letters[None, :, :]
+    in_answer = present[:, guess_letters].transpose(1, 0, 2)
+    digits = np.where(green, GREEN, in_answer.astype(np.uint8) * YELLOW)
+    return (digits * POWERS).sum(axis=2).astype(np.uint8)
+
+
+def words_digest(word_list, num_answers):
+    """
+    returns a digest identifying the word lists a matrix was built from
+    :param word_list: all words (rows)
+    :param num_answers: number of answer words (columns)
+    :return: hex digest
+    """
+    digest = hashlib.sha1()
+    digest.update(str(num_answers).encode('ascii'))
+    digest.update('\n'.join(word_list).encode('ascii'))
+    return digest.hexdigest()
+
+
+class FeedbackMatrix:
+    """
+    Holds the pattern codes of every guess against every answer.
+    Rows are all words, columns are the first num_answers words of the same list,
+    so a word id is both its row and (if it is an answer) its column.
+    The matrix is built once and saved to disk, later loads memory-map it.
+    """
+    def __init__(self, word_list, num_answers, file_name=FEEDBACK_FILE, digest_file_name=FEEDBACK_DIGEST_FILE,
+                 letters=None):
+        self.word_list = word_list
+        self.num_answers = num_answers
+        self.letters = encode_words(word_list) if letters is None else letters
+        self.matrix = self._load_or_build(file_name, digest_file_name)
+
+    def _load_or_build(self, file_name, digest_file_name):
+        """
+        memory-maps the matrix file, or builds it if it is missing or out of date
+        :param file_name: matrix file
+        :param digest_file_name: file holding the digest of the word lists
+        :return: (num words, num answers) uint8 array
+        """
+        digest = words_digest(self.word_list, self.num_answers)
+        if os.path.exists(file_name) and os.path.exists(digest_file_name):
+            with open(digest_file_name, 'r') as f:
+                saved_digest = f.read().strip()
+            if saved_digest == digest:
+                return np.load(file_name, mmap_mode='r')
+        matrix = self.build()
+        tmp_name = file_name + '.tmp'
+        with open(tmp_name, 'wb') as f:
+            np.save(f, matrix)
+        os.replace(tmp_name, file_name)
+        with open(digest_file_name, 'w') as f:
+            f.write(digest)
+        return np.load(file_name, mmap_mode='r')
+
+    def build(self):
+        """
+        computes the full matrix
+        :return: (num words, num answers) uint8 array
+        """
+        answer_letters = self.letters[:self.num_answers]
+        matrix = np.empty((len(self.word_list), self.num_answers), dtype=np.uint8)
+        for start in range(0, len(self.word_list), BUILD_CHUNK):
+            stop = start + BUILD_CHUNK
+            matrix[start:stop] = compute_patterns(self.letters[start:stop], answer_letters)
+        return matrix
+
+    def patterns(self, guess_ids, answer_ids):
+        """
+        returns the pattern codes of guesses against answers
+        :param guess_ids: a word id or an array of word ids
+        :param answer_ids: array of word ids of the hidden words
+        :return: 1D array for a single guess, (guesses, answers) array otherwise
+        """
+        answer_ids = np.asarray(answer_ids, dtype=np.intp)
+        if answer_ids.size == 0 or answer_ids.max() < self.num_answers:
+            if np.ndim(guess_ids) == 0:
+                return self.matrix[guess_ids][answer_ids]
+            guess_ids = np.asarray(guess_ids, dtype=np.intp)
+            # the smaller of the answers columns of all the rows and the guesses rows is gathered first
+            if len(self.matrix) * len(answer_ids) < len(guess_ids) * self.num_answers:
+                return self.matrix[:, answer_ids][guess_ids]
+            return self.matrix[guess_ids][:, answer_ids]
+        # some of the answers are not columns of the matrix
+        guess_letters = self.letters[np.atleast_1d(guess_ids)]
+        res = compute_patterns(guess_letters, self.letters[answer_ids])
+        return res[0] if np.ndim(guess_ids) == 0 else res
+
+    def pattern_counts(self, guess_ids, candidate_ids):
+        """
+        counts the candidates giving each pattern, for every guess
+        :param guess_ids: array of word ids of the guesses
+        :param candidate_ids: array of word ids of the possible hidden words
+        :return: (guesses, NUM_PATTERNS) array of counts
+        """
+        guess_ids = np.asarray(guess_ids, dtype=np.intp)
+        patterns = self.patterns(guess_ids, candidate_ids).astype(np.intp)
+        patterns += NUM_PATTERNS * np.arange(len(guess_ids))[:, None]
+        counts = np.bincount(patterns.ravel(), minlength=NUM_PATTERNS * len(guess_ids))
+        return counts.reshape(len(guess_ids), NUM_PATTERNS)
+
+    def entropies(self, guess_ids, candidate_ids, num_words=None, max_cells=ENTROPY_CHUNK_CELLS):
+        """
+        returns the entropy (in bits) of the indication on each guess, when the hidden word is one of the candidates
+        :param guess_ids: a word id or an array of word ids
+        :param candidate_ids: array of word ids of the possible hidden words
+        :param num_words: total number of possible words (defaults to the number of candidates)
+        :param max_cells: max (guess, candidate) pairs handled at once
+        :return: entropy for a single guess, array of entropies otherwise
+        """
+        single = np.ndim(guess_ids) == 0
+        guess_ids = np.atleast_1d(np.asarray(guess_ids, dtype=np.intp))
+        candidate_ids = np.asarray(candidate_ids, dtype=np.intp)
+        if num_words is None:
+            num_words = len(candidate_ids)
+        res = np.zeros(len(guess_ids))
+        if num_words == 0 or len(candidate_ids) == 0:
+            return res[0] if single else res
+        # the term of each pattern depends only on its count - the terms of all counts are calculated once
+        probs = np.arange(len(candidate_ids) + 1) / num_words
+        terms = probs * np.log2(probs, where=probs > 0, out=np.zeros_like(probs))
+        chunk = max(1, max_cells // len(candidate_ids))
+        for start in range(0, len(guess_ids), chunk):
+            counts = self.pattern_counts(guess_ids[start:start + chunk], candidate_ids)
+            res[start:start + chunk] = -terms[counts].sum(axis=1)
+        return res[0] if single else res
+
+    def entropy_estimates(self, guess_ids, sample_ids, num_counted, num_words=None, max_cells=ENTROPY_CHUNK_CELLS):
+        """
+        estimates the entropies of guesses (as entropies would calculate them over num_counted candidates) from a
+        random sample of the candidates, drawn without replacement. The entropy of the sample is corrected for its
+        bias, and its standard error estimated, by the jackknife (leaving out one sampled candidate at a time).
+        :param guess_ids: array of word ids of the guesses
+        :param sample_ids: array of word ids of the sampled candidates
+        :param num_counted: number of candidates sampled from
+        :param num_words: total number of possible words (defaults to num_counted)
+        :param max_cells: max (guess, candidate) pairs handled at once
+        :return: (array of estimated entropies, array of their standard errors)
+        """
+        guess_ids = np.asarray(guess_ids, dtype=np.intp)
+        sample_size = len(sample_ids)
+        if num_words is None:
+            num_words = num_counted
+        estimates = np.zeros(len(guess_ids))
+        errors = np.zeros(len(guess_ids))
+        if sample_size < 2 or num_words == 0:
+            return estimates, errors
+        # c * log2(c) of each count - the entropy of n words with counts c is log2(n) - sum(c * log2(c)) / n
+        counts_range = np.arange(sample_size + 1)
+        terms = counts_range * np.log2(np.maximum(counts_range, 1))
+        # the change of sum(c * log2(c)) when a word of a pattern with count c is left out
+        left_out_terms = np.zeros_like(terms)
+        left_out_terms[1:] = terms[:-1] - terms[1:]
+        # finite population correction - a sample of all the candidates has no error
+        fpc = (num_counted - sample_size) / max(num_counted - 1, 1)
+        # the candidates are a part (ratio) of the possible words, the rest of the probability is not counted
+        ratio = num_counted / num_words
+        chunk = max(1, max_cells // sample_size)
+        for start in range(0, len(guess_ids), chunk):
+            counts = self.pattern_counts(guess_ids[start:start + chunk], sample_ids)
+            totals = terms[counts].sum(axis=1)
+            entropy = np.log2(sample_size) - totals / sample_size
+            # the entropies of the sample without each of its words - their mean and spread give the jackknife
+            # bias correction and variance
+            changes = left_out_terms[counts]
+            change_sums = (counts * changes).sum(axis=1)
+            left_out_mean = np.log2(sample_size - 1) - (totals + change_sums / sample_size) / (sample_size - 1)
+            entropy += fpc * (sample_size - 1) * (entropy - left_out_mean)
+            spread = (counts * changes ** 2).sum(axis=1) - change_sums ** 2 / sample_size
+            variance = fpc * np.maximum(spread, 0) / (sample_size * (sample_size - 1))
+            estimates[start:start + chunk] = ratio * entropy - ratio * np.log2(ratio)
+            errors[start:start + chunk] = ratio * np.sqrt(variance)
+        return estimates, errors
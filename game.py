@@ -1,7 +1,6 @@
 import tkinter as tk
 from tkinter import messagebox
-from game_state import *
-from search import *
+from game_engine import *
 
 COLOR_GREEN = "#53E887"
 COLOR_YELLOW = "#F2E73E"
@@ -10,107 +9,11 @@ COLOR_GREY = "#8A8A8A"
 COLOR_BG = "#4F4F4F"
 COLOR_BUTTON = "#AAABAA"
 
-WORD_LEN = 5
-NUM_GUSSES = 6
-
-# guess const:
-G_TRUE = 0 # letter is in final location place
-G_ALMOST = 1 # right letter wrong place
-G_WRONG = 2 # letter not in word
 G_COLORS={G_TRUE:COLOR_GREEN,
           G_ALMOST:COLOR_YELLOW,
           G_WRONG:COLOR_GREY}
 
 
-WON = 1
-SUCCES_TURN = 0
-ERROR_WORD_LEN = -1
-ERROR_GAME_OVER = -2
-
-MSG_ERROR_LEN = f"please use a {WORD_LEN} long real word."
-MSG_ERROR_GAME_OVER = "Out of guess. The word was {}"
-
-
-class Game:
-    """
-    This class is in charge of managing the Wordle game
-    """
-    def __init__(self):
-        self.words = Words()
-        self.board = [None]*WORD_LEN  # holds the current guess.
-        self.cur_mark = [None]*WORD_LEN
-        self.indication = [None]*WORD_LEN
-        self.green_list = [None]*WORD_LEN
-        self.yellow_dict = dict()  # letter: wrong indexes
-        self.bad_letters = set()  # letters with GREY indication
-        self.true_word = self.words.get_word(FREQ_WORDS)
-        self.legal_words = set(self.words.get_word_list(ALL_WORDS))
-        self.guess_num = 0
-        self.winning_flag = False
-
-    def __legal_guess(self, word):
-        """
-        check if a word is legal as a guess (5 letters long and an english word)
-        :param word:
-        :return:
-        """
-        return len(word) == WORD_LEN and word in self.legal_words
-
-    def __get_marking(self, guess):
-        """
-        returns an indication (answer) on a guess
-        :param guess: word guessed
-        """
-        for i in range(len(guess)):
-            if guess[i] == self.true_word[i]:
-                self.cur_mark[i] = G_TRUE
-                self.green_list[i] = guess[i]
-                self.indication[i] = Indication.GREEN
-            elif guess[i] in self.true_word:
-                self.cur_mark[i] = G_ALMOST
-                self.indication[i] = Indication.YELLOW
-                if guess[i] not in self.yellow_dict.keys():
-                    self.yellow_dict[guess[i]] = [i]
-                else:
-                    self.yellow_dict[guess[i]].append(i)
-            else:
-                self.cur_mark[i] = G_WRONG
-                self.indication[i] = Indication.GREY
-                self.bad_letters.add(guess[i])
-
-    def __update_guess(self, new_guess):
-        """
-        updates the current guess on the board
-        :param new_guess: new word guessed
-        """
-        self.guess_num += 1
-        if new_guess == self.true_word:
-            self.cur_mark = [G_TRUE]*WORD_LEN
-            self.winning_flag = True
-            return WON
-        self.__get_marking(new_guess)
-        self.board = list(new_guess)
-
-    def make_a_guess(self, new_guess):
-        """
-        manages the procedure of making a new guess
-        :param new_guess: new guessed word
-        :return:
-        """
-        if self.guess_num < NUM_GUSSES:
-            if self.__legal_guess(new_guess):
-                return SUCCES_TURN if self.__update_guess(new_guess)!= WON else WON
-            else:
-                print(MSG_ERROR_LEN)
-                return ERROR_WORD_LEN
-        else:  # out of guesses
-            print(MSG_ERROR_GAME_OVER)
-            return ERROR_GAME_OVER
-
-    def not_ended(self):
-        return self.guess_num < NUM_GUSSES and not self.winning_flag
-
-
 class Game_GUI:
     """
     This class handles the GUI of the Wordle game
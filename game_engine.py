@@ -0,0 +1,162 @@
+import random
+from game_state import *
+from feedback import get_pattern, ALL_GREEN
+
+WORD_LEN = 5
+NUM_GUSSES = 6
+
+# guess const:
+G_TRUE = 0 # letter is in final location place
+G_ALMOST = 1 # right letter wrong place
+G_WRONG = 2 # letter not in word
+
+
+WON = 1
+SUCCES_TURN = 0
+ERROR_WORD_LEN = -1
+ERROR_GAME_OVER = -2
+
+MSG_ERROR_LEN = f"please use a {WORD_LEN} long real word."
+MSG_ERROR_GAME_OVER = "Out of guess. The word was {}"
+
+# number of guesses of multi board games (Dordle, Quordle, Octordle), other games have a guess per extra board
+BOARD_GUESSES = {1: NUM_GUSSES, 2: 7, 4: 9, 8: 13}
+
+
+def board_guesses(num_boards):
+    """
+    returns the number of guesses of a multi board game
+    :param num_boards: number of boards
+    :return:
+    """
+    return BOARD_GUESSES.get(num_boards, NUM_GUSSES + num_boards - 1)
+
+
+class Game:
+    """
+    This class is in charge of managing the Wordle game
+    """
+    def __init__(self, words=None):
+        self.words = Words() if words is None else words
+        self.board = [None]*WORD_LEN  # holds the current guess.
+        self.cur_mark = [None]*WORD_LEN
+        self.indication = [None]*WORD_LEN
+        self.green_list = [None]*WORD_LEN
+        self.yellow_dict = dict()  # letter: wrong indexes
+        self.bad_letters = set()  # letters with GREY indication
+        self.true_word = self.words.get_word(FREQ_WORDS)
+        self.legal_words = set(self.words.get_word_list(ALL_WORDS))
+        self.guess_num = 0
+        self.winning_flag = False
+
+    def __legal_guess(self, word):
+        """
+        check if a word is legal as a guess (5 letters long and an english word)
+        :param word:
+        :return:
+        """
+        return len(word) == WORD_LEN and word in self.legal_words
+
+    def __get_marking(self, guess):
+        """
+        returns an indication (answer) on a guess
+        :param guess: word guessed
+        """
+        for i in range(len(guess)):
+            if guess[i] == self.true_word[i]:
+                self.cur_mark[i] = G_TRUE
+                self.green_list[i] = guess[i]
+                self.indication[i] = Indication.GREEN
+            elif guess[i] in self.true_word:
+                self.cur_mark[i] = G_ALMOST
+                self.indication[i] = Indication.YELLOW
+                if guess[i] not in self.yellow_dict.keys():
+                    self.yellow_dict[guess[i]] = [i]
+                else:
+                    self.yellow_dict[guess[i]].append(i)
+            else:
+                self.cur_mark[i] = G_WRONG
+                self.indication[i] = Indication.GREY
+                self.bad_letters.add(guess[i])
+
+    def __update_guess(self, new_guess):
+        """
+        updates the current guess on the board
+        :param new_guess: new word guessed
+        """
+        self.guess_num += 1
+        if new_guess == self.true_word:
+            self.cur_mark = [G_TRUE]*WORD_LEN
+            self.winning_flag = True
+            return WON
+        self.__get_marking(new_guess)
+        self.board = list(new_guess)
+
+    def make_a_guess(self, new_guess):
+        """
+        manages the procedure of making a new guess
+        :param new_guess: new guessed word
+        :return:
+        """
+        if self.guess_num < NUM_GUSSES:
+            if self.__legal_guess(new_guess):
+                return SUCCES_TURN if self.__update_guess(new_guess)!= WON else WON
+            else:
+                print(MSG_ERROR_LEN)
+                return ERROR_WORD_LEN
+        else:  # out of guesses
+            print(MSG_ERROR_GAME_OVER)
+            return ERROR_GAME_OVER
+
+    def not_ended(self):
+        return self.guess_num < NUM_GUSSES and not self.winning_flag
+
+
+class MultiGame:
+    """
+    This class is in charge of managing a multi board game (Quordle, Octordle) - every guess is played on all the
+    unsolved boards, and the game is won when all the boards are solved
+    """
+    def __init__(self, num_boards, words=None, true_words=None):
+        if num_boards < 1:
+            raise Exception("a multi board game needs at least one board.")
+        self.words = Words() if words is None else words
+        if true_words is None:
+            true_words = random.sample(self.words.get_word_list(FREQ_WORDS), num_boards)
+        if len(true_words) != num_boards:
+            raise Exception("a hidden word is needed for each of the {} boards.".format(num_boards))
+        self.num_boards = num_boards
+        self.true_words = list(true_words)
+        self.max_guesses = board_guesses(num_boards)
+        self.legal_words = set(self.words.get_word_list(ALL_WORDS))
+        self.solved = [False] * num_boards
+        self.solved_turns = [None] * num_boards  # guess number solving each board
+        self.indications = [ALL_GREEN] * num_boards  # pattern codes of the last guess (all green on solved boards)
+        self.guess_num = 0
+        self.winning_flag = False
+
+    def make_a_guess(self, new_guess):
+        """
+        plays a guess on all the unsolved boards
+        :param new_guess: new guessed word
+        :return:
+        """
+        if self.guess_num >= self.max_guesses:
+            print(MSG_ERROR_GAME_OVER.format(' '.join(self.true_words)))
+            return ERROR_GAME_OVER
+        if len(new_guess) != WORD_LEN or new_guess not in self.legal_words:
+            print(MSG_ERROR_LEN)
+            return ERROR_WORD_LEN
+        self.guess_num += 1
+        for board, true_word in enumerate(self.true_words):
+            if self.solved[board]:
+                continue
+            self.indications[board] = get_pattern(new_guess, true_word)
+            if new_guess == true_word:
+                self.solved[board] = True
+                self.solved_turns[board] = self.guess_num
+        self.winning_flag = all(self.solved)
+        return WON if self.winning_flag else SUCCES_TURN
+
+    def not_ended(self):
+        return self.guess_num < self.max_guesses and not self.winning_flag
@@ -1,11 +1,18 @@
 from enum import Enum
+import hashlib
 import itertools
+import numpy as np
 from words import *
+from feedback import ALL_GREEN
+from instrumentation import STATS, instrumented
 
 WORD_LEN = 5
 START_WORD = 'cares'  # start word of the agents - had the best constant evaluation out of all words
 
 
+POSITION_OFFSETS = np.arange(WORD_LEN) * ALPHABET_SIZE  # letter codes of each position in letter count tables
+
+
 class Players(Enum):
     GUESSER = 0
     INDICATOR = 1
@@ -17,14 +24,408 @@ class Indication(Enum):
     GREEN = 2
 
 
+# feedback letter: indication
+FEEDBACK_LETTERS = {'b': Indication.GREY, 'y': Indication.YELLOW, 'g': Indication.GREEN}
+
+
+def indication_to_pattern(indication):
+    """
+    converts an indication to its pattern code
+    :param indication: list of Indication enums
+    :return: base 3 code - sum of indication[i] * 3**i
+    """
+    return sum(indication[i].value * 3 ** i for i in range(WORD_LEN))
+
+
+def pattern_to_indication(pattern):
+    """
+    converts a pattern code to an indication
+    :param pattern: base 3 code
+    :return: list of Indication enums
+    """
+    return [Indication((pattern // 3 ** i) % 3) for i in range(WORD_LEN)]
+
+
+def parse_feedback(feedback):
+    """
+    converts a feedback given as text (batch mode, solver service) to a pattern code
+    :param feedback: string of b (grey), y (yellow) and g (green) letters, or a pattern code
+    :return: base 3 code
+    """
+    if isinstance(feedback, int):
+        if not 0 <= feedback <= ALL_GREEN:
+            raise Exception('feedback code out of range: {}'.format(feedback))
+        return feedback
+    if not isinstance(feedback, str) or len(feedback) != WORD_LEN or \
+            any(letter not in FEEDBACK_LETTERS for letter in feedback.lower()):
+        raise Exception('feedback should be {} letters of b, y and g: {}'.format(WORD_LEN, feedback))
+    return sum(FEEDBACK_LETTERS[letter].value * 3 ** i for i, letter in enumerate(feedback.lower()))
+
+
+def format_feedback(pattern):
+    """
+    converts a pattern code to a feedback string
+    :param pattern: base 3 code
+    :return: string of b, y and g letters
+    """
+    letters = {indication: letter for letter, indication in FEEDBACK_LETTERS.items()}
+    return ''.join(letters[indication] for indication in pattern_to_indication(pattern))
+
+
+def possible_indications(word, green_letters, yellow_letters):
+    """
+    returns a list of all possible indications to be given on a word, given the letters known so far
+    :param word: guessed word
+    :param green_letters: green letter of each index (or None)
+    :param yellow_letters: set of yellow letters
+    :return:
+    """
+    if len(yellow_letters) == 0 and all(letter is None for letter in green_letters):
+        return list(itertools.product([Indication.GREY, Indication.YELLOW, Indication.GREEN],
+                                 repeat=WORD_LEN))
+    indication_map = [None]*WORD_LEN
+    for i,letter in enumerate(word):
+        if green_letters[i] and letter == green_letters[i]:
+            indication_map[i] = [Indication.GREEN]
+        elif letter in yellow_letters:
+            indication_map[i] = (Indication.GREEN, Indication.YELLOW)
+        else:
+            indication_map[i] = (Indication.GREEN, Indication.YELLOW, Indication.GREY)
+    res=[]
+    for indi0 in indication_map[0]:
+        for indi1 in indication_map[1]:
+            for indi2 in indication_map[2]:
+                for indi3 in indication_map[3]:
+                    for indi4 in indication_map[4]:
+                        res.append([indi0, indi1, indi2, indi3, indi4])
+    return res
+
+
+@instrumented('filter_candidates')
+def filter_candidates(words: Words, candidate_ids, word, indication, prev_guess):
+    """
+    returns the ids of the candidates matching an indication given on a word
+    :param words: Words object
+    :param candidate_ids: sorted array of word ids
+    :param word: guessed word
+    :param indication: list of Indication enums
+    :param prev_guess: words guessed before (never possible)
+    :return: sorted array of word ids
+    """
+    letters = words.letters[words.get_word_id(word)]
+    keep = np.ones(len(candidate_ids), dtype=bool)
+    for i, letter in enumerate(letters):
+        if indication[i] == Indication.GREEN:
+            keep &= words.green_masks[i, letter][candidate_ids]
+        elif indication[i] == Indication.YELLOW:
+            keep &= words.yellow_masks[i, letter][candidate_ids]
+        else:
+            keep &= words.grey_masks[letter][candidate_ids]
+    if prev_guess:
+        keep &= ~np.isin(candidate_ids, words.get_word_ids(list(prev_guess)))
+    return candidate_ids[keep]
+
+
+def letter_counts(words: Words, candidate_ids):
+    """
+    counts the letters of words at each position
+    :param words: Words object
+    :param candidate_ids: array of word ids
+    :return: (WORD_LEN, ALPHABET_SIZE) array - number of the words with each letter at each position
+    """
+    codes = words.letters[candidate_ids] + POSITION_OFFSETS
+    return np.bincount(codes.ravel(), minlength=WORD_LEN * ALPHABET_SIZE).reshape(WORD_LEN, ALPHABET_SIZE)
+
+
+def update_letter_counts(words: Words, counts, candidate_ids, kept_ids):
+    """
+    returns the letter counts of a subset of words, given the counts of all of them - the removed words are
+    subtracted, unless fewer words are kept than removed
+    :param words: Words object
+    :param counts: letter counts of candidate_ids
+    :param candidate_ids: sorted array of word ids
+    :param kept_ids: sorted array of the ids of the subset
+    :return: letter counts of kept_ids
+    """
+    if len(kept_ids) == len(candidate_ids):
+        return counts
+    if 2 * len(kept_ids) <= len(candidate_ids):
+        return letter_counts(words, kept_ids)
+    return counts - letter_counts(words, np.setdiff1d(candidate_ids, kept_ids, assume_unique=True))
+
+
+def candidates_key(candidate_ids):
+    """
+    returns a short digest identifying a set of possible words
+    :param candidate_ids: sorted array of word ids
+    :return: bytes
+    """
+    return hashlib.blake2b(np.asarray(candidate_ids, dtype=np.int32).tobytes(), digest_size=16).digest()
+
+
+class SearchState(object):
+    """
+    A compact immutable state, used by the search agents.
+    Successors share their parent's structures - a guess successor only replaces the word,
+    and an indication successor holds the (smaller) array of ids of its possible words.
+    """
+    __slots__ = ('words', '_word', '_indication', '_candidate_ids', '_green_letters', '_yellow_letters',
+                 '_prev_guess', '_candidates_key', '_partition', '_letter_counts')
+
+    def __init__(self, words: Words, word, candidate_ids, green_letters, yellow_letters, prev_guess,
+                 indication=None, letter_counts=None):
+        self.words = words
+        self._word = word
+        self._indication = indication
+        self._candidate_ids = candidate_ids
+        self._green_letters = green_letters
+        self._yellow_letters = yellow_letters
+        self._prev_guess = prev_guess
+        self._candidates_key = None
+        self._partition = None
+        # a single item list, shared by the states with the same possible words (filled on first use)
+        self._letter_counts = [None] if letter_counts is None else letter_counts
+
+    def get_word(self):
+        """
+        returns the current word of the state
+        :return:
+        """
+        return self._word
+
+    def get_indication(self):
+        """
+        returns the indication given on the word of the state (or None)
+        :return:
+        """
+        return self._indication
+
+    def get_prev_guess(self):
+        """
+        returns a frozenset of the previous words guessed
+        :return:
+        """
+        return self._prev_guess
+
+    def get_num_of_turns(self):
+        """
+        returns the number of turns that took place
+        :return:
+        """
+        return len(self._prev_guess) + 1
+
+    def get_green_letters(self):
+        """
+        returns a tuple of green letters
+        :return:
+        """
+        return self._green_letters
+
+    def get_yellow_letters(self):
+        """
+        returns a frozenset of the yellow letters
+        :return:
+        """
+        return self._yellow_letters
+
+    def get_num_green_letters(self):
+        """
+        returns the number of green letters so far
+        :return:
+        """
+        return len([i for i in self._green_letters if i == Indication.GREEN])
+
+    def get_possible_words(self):
+        """
+        returns a list of all possible words to guess in the state
+        :return:
+        """
+        return self.words.get_words(self._candidate_ids)
+
+    def get_candidate_ids(self):
+        """
+        returns a sorted array of the ids of all possible words to guess in the state
+        :return:
+        """
+        return self._candidate_ids
+
+    def get_candidates(self):
+        """
+        returns a boolean mask (over word ids) of the possible words to guess in the state
+        :return:
+        """
+        mask = np.zeros(len(self.words.vocabulary), dtype=bool)
+        mask[self._candidate_ids] = True
+        return mask
+
+    def get_candidates_key(self):
+        """
+        returns a short digest identifying the set of possible words
+        :return: bytes
+        """
+        if self._candidates_key is None:
+            self._candidates_key = candidates_key(self._candidate_ids)
+        return self._candidates_key
+
+    def get_num_possible_words(self):
+        """
+        returns the number of possible words to guess in the state
+        :return:
+        """
+        return len(self._candidate_ids)
+
+    def get_letter_counts(self):
+        """
+        returns the number of possible words with each letter at each position. The counts are passed to the
+        successors, and updated by the words an indication removes.
+        :return: (WORD_LEN, ALPHABET_SIZE) array
+        """
+        if self._letter_counts[0] is None:
+            self._letter_counts[0] = letter_counts(self.words, self._candidate_ids)
+        return self._letter_counts[0]
+
+    def get_possible_indications(self):
+        """
+        returns a list of all possible indications to be given in the state
+        :return:
+        """
+        return possible_indications(self._word, self._green_letters, self._yellow_letters)
+
+    def get_indication_partition(self):
+        """
+        partitions the possible words (that were not guessed before) by the indication they give on the word.
+        Only indications given by some possible word are returned.
+        :return: dictionary of pattern code: sorted array of the ids of the possible words giving it
+        """
+        if self._partition is None:
+            self._partition = self._make_partition()
+        return self._partition
+
+    @instrumented('partition')
+    def _make_partition(self):
+        candidate_ids = self._candidate_ids
+        if self._prev_guess:
+            candidate_ids = candidate_ids[~np.isin(candidate_ids, self.words.get_word_ids(list(self._prev_guess)))]
+        patterns = self.words.feedback.patterns(self.words.get_word_id(self._word), candidate_ids)
+        order = np.argsort(patterns, kind='stable')
+        codes, starts = np.unique(patterns[order], return_index=True)
+        buckets = np.split(candidate_ids[order], starts[1:])
+        return dict(zip(codes.tolist(), buckets))
+
+    def get_realizable_indications(self):
+        """
+        returns a list of the indications some possible word gives on the word of the state
+        :return:
+        """
+        return [pattern_to_indication(code) for code in self.get_indication_partition()]
+
+    def get_indication_probabilities(self):
+        """
+        returns the probability of each realizable indication (in the order of get_realizable_indications)
+        :return: array of probabilities
+        """
+        sizes = np.array([len(bucket) for bucket in self.get_indication_partition().values()])
+        return sizes / sizes.sum() if len(sizes) else sizes
+
+    def get_legal_actions(self, agent):
+        """
+        returns the legal actions of a player - possible words for the guesser,
+        realizable indications for the indicator
+        :param agent:
+        :return:
+        """
+        if agent == Players.INDICATOR:
+            return self.get_realizable_indications()
+        elif agent == Players.GUESSER:
+            return self.get_possible_words()
+        else:
+            raise Exception("illegal agent index.")
+
+    def with_word(self, word, prev_guess=None):
+        """
+        returns the state after guessing a word
+        :param word:
+        :param prev_guess: previous guesses of the new state (default - same as this state)
+        :return: SearchState
+        """
+        if prev_guess is None:
+            prev_guess = self._prev_guess
+        return SearchState(self.words, word, self._candidate_ids, self._green_letters, self._yellow_letters,
+                           prev_guess, letter_counts=self._letter_counts)
+
+    def with_letters(self, green_letters, yellow_letters):
+        """
+        returns the state with other known letters
+        :param green_letters: tuple of green letters
+        :param yellow_letters: frozenset of yellow letters
+        :return: SearchState
+        """
+        return SearchState(self.words, self._word, self._candidate_ids, green_letters, yellow_letters,
+                           self._prev_guess, self._indication, self._letter_counts)
+
+    def with_indication(self, indication, filtered=True, add_letters=True):
+        """
+        returns the state after an indication is given on its word
+        :param indication: list of Indication enums
+        :param filtered: filter the possible words by the indication
+        :param add_letters: add the green and yellow letters of the indication
+        :return: SearchState
+        """
+        candidate_ids = self._candidate_ids
+        green_letters = self._green_letters
+        yellow_letters = self._yellow_letters
+        if indication[0] is not None:
+            if filtered and self._partition is not None:
+                # the possible words of each realizable indication are already known
+                candidate_ids = self._partition.get(indication_to_pattern(indication), candidate_ids[:0])
+            elif filtered:
+                candidate_ids = filter_candidates(self.words, candidate_ids, self._word, indication,
+                                                  self._prev_guess)
+            if add_letters:
+                green = [self._word[i] if indication[i] == Indication.GREEN else green_letters[i]
+                         for i in range(WORD_LEN)]
+                green_letters = tuple(green)
+                yellow = {self._word[i] for i in range(WORD_LEN) if indication[i] == Indication.YELLOW}
+                if not yellow <= yellow_letters:
+                    yellow_letters = yellow_letters | yellow
+        counts = self._letter_counts
+        if candidate_ids is not self._candidate_ids:
+            parent_counts = counts[0]
+            counts = [None if parent_counts is None else
+                      update_letter_counts(self.words, parent_counts, self._candidate_ids, candidate_ids)]
+        return SearchState(self.words, self._word, candidate_ids, green_letters, yellow_letters,
+                           self._prev_guess, indication, counts)
+
+    def generate_successor(self, agent, action):
+        """
+        generates a successor for an action
+        :param agent:
+        :param action: word or indication
+        :return: SearchState
+        """
+        if STATS.enabled:
+            STATS.count('successors')
+        if agent == Players.INDICATOR:
+            return self.with_indication(action)
+        elif agent == Players.GUESSER:
+            return self.with_word(action)
+        else:
+            raise Exception("illegal agent index.")
+
+
 class GameState(object):
     """
-    This class handles the state of the game
+    This class handles the state of the game.
+    It is a mutable facade (used by the game and the GUI) over an immutable SearchState.
     """
     def __init__(self, word, words: Words, indication=None, green_letters=None,
-                 yellow_letters=None, possible_words=None, prev_guess=None):
-        if possible_words is None:
-            possible_words = words.get_word_list(FREQ_WORDS)
+                 yellow_letters=None, possible_words=None, prev_guess=None, candidates=None):
+        if candidates is None:
+            if possible_words is None:
+                possible_words = words.get_word_list(FREQ_WORDS)
+            candidate_ids = np.flatnonzero(words.get_words_mask(possible_words))
+        else:
+            candidate_ids = np.flatnonzero(candidates)
         if green_letters is None:
             green_letters = [None] * WORD_LEN
         if yellow_letters is None:
@@ -34,42 +435,55 @@ class GameState(object):
         if prev_guess is None:
             prev_guess = set()
         self.words = words
-        self._word = word
-        self._indication = indication
-        self._green_letters = green_letters
-        self._yellow_letters = yellow_letters
-        self._possible_words = possible_words
-        self._prev_guess = prev_guess
-        self._prev_possible_words_length = len(possible_words)
+        self._node = SearchState(words, word, candidate_ids.astype(np.int32), tuple(green_letters),
+                                 frozenset(yellow_letters), frozenset(prev_guess))
         self.set_indication(indication)
 
+    def get_search_state(self):
+        """
+        returns the immutable state used by the search agents
+        :return: SearchState
+        """
+        return self._node
+
+    def copy(self):
+        """
+        returns a copy of the state, which can be changed independently (the immutable search state is shared)
+        :return: GameState
+        """
+        state = GameState.__new__(GameState)
+        state.words = self.words
+        state._node = self._node
+        return state
+
     def get_word(self):
         """
         returns the current word of the state
         :return:
         """
-        return self._word
+        return self._node.get_word()
 
     def get_indication(self):
         """
         returns the current indications of the state
         :return:
         """
-        return self._indication
+        indication = self._node.get_indication()
+        return [None] * WORD_LEN if indication is None else indication
 
     def get_prev_guess(self):
         """
         returns a list of the previous words guessed
         :return:
         """
-        return self._prev_guess.copy()
+        return set(self._node.get_prev_guess())
 
     def get_num_of_turns(self):
         """
         returns the number of turns that took place
         :return:
         """
-        return len(self._prev_guess) + 1
+        return self._node.get_num_of_turns()
 
     def set_indication(self, indication):
         """
@@ -77,14 +491,7 @@ class GameState(object):
         :param indication: Indication enum
         :return:
         """
-        self._indication = indication
-        if self._indication[0] is not None:
-            self.update_possible_words()
-            for i in range(WORD_LEN):
-                if self._indication[i] == Indication.GREEN:
-                    self.add_green_letter(self._word[i], i)
-                elif self._indication[i] == Indication.YELLOW:
-                    self.add_yellow_letter(self._word[i])
+        self._node = self._node.with_indication(indication)
 
     def set_word(self, word):
         """
@@ -92,9 +499,7 @@ class GameState(object):
         :param word:
         :return:
         """
-        self._word = word
-        self._indication = [None] * WORD_LEN
-        self._prev_guess.add(word)
+        self._node = self._node.with_word(word, self._node.get_prev_guess() | {word})
 
     def add_green_letter(self, letter, index):
         """
@@ -103,7 +508,9 @@ class GameState(object):
         :param index:
         :return:
         """
-        self._green_letters[index] = letter
+        green_letters = list(self._node.get_green_letters())
+        green_letters[index] = letter
+        self._node = self._node.with_letters(tuple(green_letters), self._node.get_yellow_letters())
 
     def add_yellow_letter(self, letter):
         """
@@ -111,80 +518,93 @@ class GameState(object):
         :param letter:
         :return:
         """
-        self._yellow_letters.add(letter)
+        self._node = self._node.with_letters(self._node.get_green_letters(),
+                                             self._node.get_yellow_letters() | {letter})
 
     def get_green_letters(self):
         """
         returns a list of green letters
         :return:
         """
-        return self._green_letters[:]
+        return list(self._node.get_green_letters())
 
     def get_yellow_letters(self):
         """
         returns a set of the yellow letters
         :return:
         """
-        return self._yellow_letters.copy()
+        return set(self._node.get_yellow_letters())
 
     def get_num_green_letters(self):
         """
         returns the number of green letters so far
         :return:
         """
-        return len([i for i in self._green_letters if i == Indication.GREEN])
+        return self._node.get_num_green_letters()
 
     def get_possible_words(self):
         """
         returns a list of all possible words to guess in current state
         :return:
         """
-        return self._possible_words[:]
+        return self._node.get_possible_words()
+
+    def get_candidate_ids(self):
+        """
+        returns an array of the ids of all possible words to guess in current state
+        :return:
+        """
+        return self._node.get_candidate_ids()
+
+    def get_candidates(self):
+        """
+        returns the boolean mask (over word ids) of the possible words to guess in current state
+        :return:
+        """
+        return self._node.get_candidates()
+
+    def get_candidates_key(self):
+        """
+        returns a short digest identifying the set of possible words in current state
+        :return: bytes
+        """
+        return self._node.get_candidates_key()
+
+    def get_num_possible_words(self):
+        """
+        returns the number of possible words to guess in current state
+        :return:
+        """
+        return self._node.get_num_possible_words()
+
+    def get_letter_counts(self):
+        """
+        returns the number of possible words with each letter at each position
+        :return: (WORD_LEN, ALPHABET_SIZE) array
+        """
+        return self._node.get_letter_counts()
 
     def get_possible_indications(self):
         """
         returns a list of all possible indications to be given in current state
         :return:
         """
-        if len(self._yellow_letters) == 0 and self._green_letters == [None] * WORD_LEN:
-            return list(itertools.product([Indication.GREY, Indication.YELLOW, Indication.GREEN],
-                                     repeat=WORD_LEN))
-        indication_map = [None]*WORD_LEN
-        for i,letter in enumerate(self._word):
-            if self._green_letters[i] and letter == self._green_letters[i]:
-                indication_map[i] = [Indication.GREEN]
-            elif letter in self._yellow_letters:
-                indication_map[i] = (Indication.GREEN, Indication.YELLOW)
-            else:
-                indication_map[i] = (Indication.GREEN, Indication.YELLOW, Indication.GREY)
-        res=[]
-        for indi0 in indication_map[0]:
-            for indi1 in indication_map[1]:
-                for indi2 in indication_map[2]:
-                    for indi3 in indication_map[3]:
-                        for indi4 in indication_map[4]:
-                            res.append([indi0, indi1, indi2, indi3, indi4])
-        return res
+        return self._node.get_possible_indications()
+
+    def get_indication_partition(self):
+        """
+        partitions the possible words by the indication they give on the word of the state
+        :return: dictionary of pattern code: sorted array of the ids of the possible words giving it
+        """
+        return self._node.get_indication_partition()
 
+    @instrumented('update_possible_words')
     def update_possible_words(self):
         """
         updates the list of possible words
         :return:
         """
-        possible_words = []
-        for w in self._possible_words:
-            possible = True
-            for i in range(WORD_LEN):
-                if (self._indication[i] == Indication.GREEN and w[i] != self._word[i]) \
-                        or (
-                        self._indication[i] == Indication.YELLOW and (self._word[i] not in w or w[i] == self._word[i])) \
-                        or (self._indication[i] == Indication.GREY and self._word[i] in w):
-                    possible = False
-                    break
-            if possible and w not in self._prev_guess:
-                possible_words.append(w)
-        self._prev_possible_words_length = len(self._possible_words)
-        self._possible_words = possible_words
+        self._node = self._node.with_indication(self._node.get_indication(), add_letters=False)
 
     def get_legal_actions(self, agent):
         """
@@ -192,30 +612,139 @@ class GameState(object):
         :param agent:
         :return:
         """
-        if agent == Players.INDICATOR:
-            return self.get_possible_indications()
-        elif agent == Players.GUESSER:
-            return self._possible_words
-        else:
-            raise Exception("illegal agent index.")
+        return self._node.get_legal_actions(agent)
 
     def generate_successor(self, agent, action):
         """
         generates a successor for an action
         :param agent:
         :param action: word or indication
+        :return: SearchState
+        """
+        return self._node.generate_successor(agent, action)
+
+
+def replay(words, history):
+    """
+    returns the game state after a history of guesses and their feedback
+    :param words: Words object
+    :param history: list of (guess, pattern code)
+    :return: GameState
+    """
+    state = GameState(history[0][0], words, prev_guess=set())
+    for turn, (guess, pattern) in enumerate(history):
+        if turn > 0:
+            state.set_word(guess)
+        state.set_indication(pattern_to_indication(pattern))
+    return state
+
+
+class MultiBoardState(object):
+    """
+    The state of a multi board game (Quordle, Octordle) - every guess is played on all the unsolved boards.
+    The possible words of all the boards are one (boards, answers) boolean matrix, filtered by the indications of
+    a guess on all the boards at once. Solved boards drop out of the state.
+    """
+
+    def __init__(self, words: Words, num_boards, word=START_WORD, candidates=None, solved=None, prev_guess=None):
+        self.words = words
+        self.num_boards = num_boards
+        self._word = word
+        if candidates is None:
+            candidates = np.ones((num_boards, words.num_answers), dtype=bool)
+        if solved is None:
+            solved = np.zeros(num_boards, dtype=bool)
+        self._candidates = candidates
+        self._solved = solved
+        self._prev_guess = frozenset() if prev_guess is None else frozenset(prev_guess)
+
+    def get_word(self):
+        """
+        returns the word of the state (the next guess)
         :return:
         """
-        yellow_letters = self._yellow_letters.copy()
-        green_letters = self._green_letters[:]
-        possible_words = self._possible_words[:]
-        if agent == Players.INDICATOR:
-            return GameState(self.get_word(), self.words, indication=action, yellow_letters=yellow_letters,
-                             green_letters=green_letters, possible_words=possible_words,
-                             prev_guess= self.get_prev_guess())
-        elif agent == Players.GUESSER:
-            return GameState(action, self.words, yellow_letters=yellow_letters,
-                             green_letters=green_letters, possible_words=possible_words,
-                             prev_guess= self.get_prev_guess())
-        else:
-            raise Exception("illegal agent index.")
+        return self._word
+
+    def get_prev_guess(self):
+        """
+        returns the words guessed before
+        :return:
+        """
+        return self._prev_guess
+
+    def get_solved(self):
+        """
+        returns a boolean array of the solved boards
+        :return:
+        """
+        return self._solved
+
+    def get_unsolved_boards(self):
+        """
+        returns the indexes of the unsolved boards
+        :return:
+        """
+        return np.flatnonzero(~self._solved)
+
+    def is_solved(self):
+        """
+        returns True if all the boards are solved
+        :return:
+        """
+        return bool(self._solved.all())
+
+    def get_num_possible_words(self):
+        """
+        returns the number of possible words of each unsolved board
+        :return: array, in the order of get_unsolved_boards
+        """
+        return self._candidates[~self._solved].sum(axis=1)
+
+    def get_possible_words(self, board):
+        """
+        returns a list of the possible words of a board
+        :param board: board index
+        :return:
+        """
+        return self.words.get_words(np.flatnonzero(self._candidates[board]))
+
+    def get_candidates(self):
+        """
+        returns a boolean mask (over word ids) of the words possible on some unsolved board
+        :return:
+        """
+        mask = np.zeros(len(self.words.vocabulary), dtype=bool)
+        mask[:self.words.num_answers] = self._candidates[~self._solved].any(axis=0)
+        return mask
+
+    def get_candidate_pairs(self):
+        """
+        returns the possible words of all the unsolved boards as pairs
+        :return: (array of board positions in get_unsolved_boards, array of word ids), ordered by board
+        """
+        return np.nonzero(self._candidates[~self._solved])
+
+    def with_word(self, word):
+        """
+        returns the state with another next guess
+        :param word:
+        :return: MultiBoardState
+        """
+        return MultiBoardState(self.words, self.num_boards, word, self._candidates, self._solved, self._prev_guess)
+
+    def with_indications(self, patterns):
+        """
+        returns the state after the indications on the word of the state are given
+        :param patterns: array of the pattern code of the indication on each board (ignored on solved boards)
+        :return: MultiBoardState
+        """
+        word_patterns = self.words.feedback.patterns(self.words.get_word_id(self._word),
+                                                     np.arange(self.words.num_answers))
+        unsolved = ~self._solved
+        patterns = np.asarray(patterns)
+        # the possible words of each board give the board's indication on the word
+        candidates = self._candidates.copy()
+        candidates[unsolved] &= word_patterns[None, :] == patterns[unsolved][:, None]
+        solved = self._solved | (unsolved & (patterns == ALL_GREEN))
+        return MultiBoardState(self.words, self.num_boards, self._word, candidates, solved,
+                               self._prev_guess | {self._word})
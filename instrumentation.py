@@ -0,0 +1,156 @@
+import cProfile
+import functools
+import io
+import pstats
+import time
+from collections import defaultdict
+
+PROFILE_LINES = 25  # functions listed in a move profile
+
+
+class Instrumentation:
+    """
+    Opt-in counters and timers of the game and the search.
+    Instrumented functions only check the enabled flag when it is off, so the calls stay in production code.
+    Timers are inclusive - the time of an instrumented function includes the instrumented functions it calls.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.profile_moves = 0  # number of next moves profiled with cProfile
+        self.calls = defaultdict(int)
+        self.seconds = defaultdict(float)
+        self.profiles = []
+
+    def enable(self, profile_moves=0):
+        """
+        turns the instrumentation on
+        :param profile_moves: number of next moves to profile with cProfile
+        :return:
+        """
+        self.enabled = True
+        self.profile_moves = profile_moves
+
+    def disable(self):
+        self.enabled = False
+        self.profile_moves = 0
+
+    def reset(self):
+        self.calls.clear()
+        self.seconds.clear()
+        self.profiles = []
+
+    def count(self, name, num=1):
+        """
+        counts events (without timing them)
+        :param name: counter name
+        :param num:
+        :return:
+        """
+        self.calls[name] += num
+
+    def timed(self, name, func, *args, **kwargs):
+        """
+        calls a function, counting the call and its time
+        :param name: phase name
+        :param func:
+        :param args: arguments of func
+        :param kwargs: keyword arguments of func
+        :return: the result of func
+        """
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            self.seconds[name] += time.perf_counter() - start
+            self.calls[name] += 1
+
+    def move(self, func, *args, **kwargs):
+        """
+        calls a move function (get_action), profiling it if profiled moves are left
+        :param func:
+        :param args: arguments of func
+        :param kwargs: keyword arguments of func
+        :return: the result of func
+        """
+        if self.profile_moves <= 0:
+            return self.timed('get_action', func, *args, **kwargs)
+        self.profile_moves -= 1
+        profiler = cProfile.Profile()
+        res = profiler.runcall(self.timed, 'get_action', func, *args, **kwargs)
+        stream = io.StringIO()
+        pstats.Stats(profiler, stream=stream).sort_stats('cumulative').print_stats(PROFILE_LINES)
+        self.profiles.append(stream.getvalue())
+        return res
+
+    def snapshot(self):
+        """
+        returns the current counters and timers
+        :return: dictionary of phase: {'calls', 'ms'}
+        """
+        return {name: {'calls': self.calls[name], 'ms': self.seconds[name] * 1000} for name in self.calls}
+
+    @staticmethod
+    def difference(after, before):
+        """
+        returns the counters and timers between two snapshots
+        :param after: snapshot
+        :param before: earlier snapshot
+        :return: dictionary of phase: {'calls', 'ms'}
+        """
+        res = dict()
+        for name, phase in after.items():
+            prev = before.get(name, {'calls': 0, 'ms': 0.0})
+            if phase['calls'] != prev['calls']:
+                res[name] = {'calls': phase['calls'] - prev['calls'], 'ms': phase['ms'] - prev['ms']}
+        return res
+
+    @staticmethod
+    def total(snapshots):
+        """
+        sums snapshots (or differences)
+        :param snapshots: list of dictionaries of phase: {'calls', 'ms'}
+        :return: dictionary of phase: {'calls', 'ms'}
+        """
+        res = dict()
+        for snapshot in snapshots:
+            for name, phase in snapshot.items():
+                total = res.setdefault(name, {'calls': 0, 'ms': 0.0})
+                total['calls'] += phase['calls']
+                total['ms'] += phase['ms']
+        return res
+
+
+# the instrumentation of the process
+STATS = Instrumentation()
+
+
+def instrumented(name):
+    """
+    decorator counting and timing the calls of a function as a phase, while the instrumentation is enabled
+    :param name: phase name
+    :return:
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if STATS.enabled:
+                return STATS.timed(name, func, *args, **kwargs)
+            return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def instrumented_move(func):
+    """
+    decorator of the move function of an agent (get_action) - counts, times and profiles the moves
+    while the instrumentation is enabled
+    :param func:
+    :return:
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if STATS.enabled:
+            return STATS.move(func, *args, **kwargs)
+        return func(*args, **kwargs)
+    return wrapper
@@ -0,0 +1,149 @@
+import argparse
+import hashlib
+import json
+import os
+from game_state import *
+from feedback import words_digest, ALL_GREEN
+
+OPENING_BOOK_FILE = 'opening_book.json'
+BOOK_VERSION = 2  # bump when agents decisions change, so older books are ignored
+DEFAULT_TURNS = 2
+
+
+def book_key(state):
+    """
+    returns the opening book key of a state - the decision of an agent depends only on the possible words,
+    the word of the state and the letters known so far
+    :param state: GameState or SearchState
+    :return: hex digest
+    """
+    digest = hashlib.blake2b(digest_size=8)
+    digest.update(state.get_candidates_key())
+    digest.update(state.get_word().encode('ascii'))
+    digest.update(repr(tuple(state.get_green_letters())).encode('ascii'))
+    digest.update(''.join(sorted(state.get_yellow_letters())).encode('ascii'))
+    return digest.hexdigest()
+
+
+class OpeningBook:
+    """
+    Holds the precomputed decisions of agents in the first turns after START_WORD
+    """
+    _loaded = dict()  # file name: OpeningBook, so every agent shares the loaded book
+
+    def __init__(self, words: Words, moves=None):
+        self.start_word = START_WORD
+        self.words_digest = words_digest(words.vocabulary, words.num_answers)
+        # agent configuration name: {book key: word}
+        self.moves = moves if moves is not None else dict()
+
+    @classmethod
+    def load(cls, words: Words, file_name=OPENING_BOOK_FILE):
+        """
+        loads a book file (once), ignoring books made for another start word, other words or an older version
+        :param words: Words object
+        :param file_name:
+        :return: OpeningBook
+        """
+        if file_name not in cls._loaded:
+            book = OpeningBook(words)
+            if os.path.exists(file_name):
+                with open(file_name, 'r') as book_file:
+                    data = json.load(book_file)
+                if data.get('version') == BOOK_VERSION and data.get('start_word') == book.start_word \
+                        and data.get('words_digest') == book.words_digest:
+                    book.moves = data['moves']
+            cls._loaded[file_name] = book
+        return cls._loaded[file_name]
+
+    def save(self, file_name=OPENING_BOOK_FILE):
+        data = {'version': BOOK_VERSION, 'start_word': self.start_word, 'words_digest': self.words_digest,
+                'moves': self.moves}
+        tmp_name = file_name + '.tmp'
+        with open(tmp_name, 'w') as book_file:
+            json.dump(data, book_file, separators=(',', ':'), sort_keys=True)
+        os.replace(tmp_name, file_name)
+        OpeningBook._loaded[file_name] = self
+
+    def get_moves(self, config_name):
+        """
+        returns the book of an agent configuration
+        :param config_name: agent configuration name
+        :return: dictionary of book key: word
+        """
+        return self.moves.get(config_name, dict())
+
+
+def opening_state(words: Words, history):
+    """
+    returns the state after START_WORD and the given guesses and indications
+    :param words: Words object
+    :param history: list of (indication pattern code, next guess or None)
+    :return: GameState
+    """
+    state = GameState(START_WORD, words, prev_guess=set())
+    for code, guess in history:
+        state.set_indication(pattern_to_indication(code))
+        if guess is not None:
+            state.set_word(guess)
+    return state
+
+
+def solve_opening(agent, words: Words, turns=DEFAULT_TURNS):
+    """
+    solves the decisions of an agent for every indication of START_WORD (and of its next guess, for 3 turns)
+    :param agent: Agent object - searched without a book
+    :param words: Words object
+    :param turns: last turn to solve (2 or 3)
+    :return: dictionary of book key: word
+    """
+    use_opening_book = agent.use_opening_book
+    agent.use_opening_book = False
+    moves = dict()
+    root = opening_state(words, [])
+    for code in root.get_indication_partition():
+        if code == ALL_GREEN:
+            continue
+        state = opening_state(words, [(code, None)])
+        guess = agent.get_action(state)
+        moves[book_key(state)] = guess
+        if turns < 3:
+            continue
+        state.set_word(guess)
+        for next_code in state.get_search_state().get_indication_partition():
+            if next_code == ALL_GREEN:
+                continue
+            next_state = opening_state(words, [(code, guess), (next_code, None)])
+            moves[book_key(next_state)] = agent.get_action(next_state)
+    agent.use_opening_book = use_opening_book
+    return moves
+
+
+def main():
+    """
+    builds the opening book of agent configurations (all the performance tests configurations by default)
+    :return:
+    """
+    from performance_tests import CONFIGURATIONS
+    from search import make_agent
+    parser = argparse.ArgumentParser(description='Wordle opening book')
+    parser.add_argument('--agent', choices=list(CONFIGURATIONS.keys()), default=list(CONFIGURATIONS.keys()),
+                        nargs='+', help='Agents to solve.')
+    parser.add_argument('--depth', help='Depths to solve (default all).', default=None, type=int, nargs='+')
+    parser.add_argument('--turns', help='Last turn to solve.', choices=[2, 3], default=DEFAULT_TURNS, type=int)
+    parser.add_argument('--output', help='Opening book file.', default=OPENING_BOOK_FILE)
+    args = parser.parse_args()
+    words = Words()
+    book = OpeningBook.load(words, args.output)
+    for agent_name in args.agent:
+        for configuration in CONFIGURATIONS[agent_name]:
+            if args.depth is not None and configuration[2] not in args.depth and agent_name != 'tree':
+                continue
+            agent = make_agent(*configuration[:3])
+            book.moves[agent.get_config_name()] = solve_opening(agent, words, args.turns)
+            print('solved ' + configuration[3])
+            book.save(args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,336 @@
+import argparse
+import csv
+import hashlib
+import os
+import numpy as np
+from feedback import words_digest, WORD_LEN, NUM_PATTERNS
+
+WORDS_LIST_FILE = 'wordslist.txt'
+FREQ_WORDS_FILE = 'freq_words.txt'
+WORD_DATA_FILE = 'word_data.csv'
+ENTROPY_FILE = 'entropies_final.txt'
+# the words and their constant values packed to one binary file, rebuilt when any of the source files changes
+PACKED_WORDS_FILE = 'words.bin'
+
+# per word constant values (columns of word_data.csv, frequent words only)
+FEATURES = ['entropy', 'entropy_scaled', 'avg_green_scaled', 'avg_yellow_scaled', 'avg_grey_scaled']
+# columns of the packed file - FEATURES and the unrounded entropy of every word (entropies_final.txt)
+PACKED_FEATURES = FEATURES + ['full_entropy']
+
+# Packed file layout (little endian), every section starts at a multiple of ALIGNMENT:
+# header (HEADER_DTYPE) | feature names (S32 each) | word table (WORD_LEN bytes per word id - frequent words first)
+# | ids of all words in wordslist order (int32) | a float32 column per feature, by word id (nan if not valued)
+MAGIC = b'WORDLEPK'
+FORMAT_VERSION = 1
+ALIGNMENT = 64
+FEATURE_NAME_DTYPE = np.dtype('S32')
+HEADER_DTYPE = np.dtype([('magic', 'S8'), ('version', '<u4'), ('header_size', '<u4'), ('num_words', '<u4'),
+                         ('num_answers', '<u4'), ('num_all_words', '<u4'), ('num_features', '<u4'),
+                         ('word_bytes', '<u4'), ('names_offset', '<u8'), ('words_offset', '<u8'),
+                         ('order_offset', '<u8'), ('features_offset', '<u8'), ('column_stride', '<u8'),
+                         ('file_size', '<u8'), ('words_digest', 'S40'), ('sources_digest', 'S32')])
+HEADER_SIZE = -(-HEADER_DTYPE.itemsize // ALIGNMENT) * ALIGNMENT
+MAX_ENTROPY = np.log2(NUM_PATTERNS)
+
+
+def word_file_to_list(file_name):
+    """
+    converts a words file to list od words
+    :param file_name:
+    :return: list of words in file
+    """
+    with open(file_name, 'r', encoding='utf-8-sig') as words:
+        return [word.rstrip() for word in words.readlines()]
+
+
+def read_word_data(file_name=WORD_DATA_FILE):
+    """
+    reads the constant values of the words
+    :param file_name: word data csv file
+    :return: (list of words, (words, FEATURES) array of values)
+    """
+    with open(file_name, 'r', newline='') as word_data:
+        rows = list(csv.DictReader(word_data))
+    values = np.array([[float(row[value]) for value in FEATURES] for row in rows]).reshape(-1, len(FEATURES))
+    return [row['word'] for row in rows], values
+
+
+def read_entropies(file_name=ENTROPY_FILE):
+    """
+    reads the entropies file. Lines repeated by resumed runs are dropped.
+    :param file_name:
+    :return: (dictionary of word: entropy, number of repeated lines)
+    """
+    entropies = dict()
+    repeated = 0
+    with open(file_name, 'r') as entropy_file:
+        for line in entropy_file:
+            if not line.strip():
+                continue
+            word, entropy = line.split()
+            entropy = float(entropy)
+            if word in entropies:
+                if entropies[word] != entropy:
+                    raise Exception("conflicting entropies for word {} in {}.".format(word, file_name))
+                repeated += 1
+            entropies[word] = entropy
+    return entropies, repeated
+
+
+def sources_digest(file_names):
+    """
+    returns a digest of the size and modification time of files
+    :param file_names:
+    :return: hex digest
+    """
+    stamps = []
+    for file_name in file_names:
+        stat = os.stat(file_name)
+        stamps.append('{}:{}:{}'.format(file_name, stat.st_size, stat.st_mtime_ns))
+    return hashlib.blake2b(';'.join(stamps).encode('utf-8'), digest_size=16).hexdigest()
+
+
+def _align(offset):
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+def is_legal_word(word):
+    """
+    checks a word of the words table - the converter and the validation accept the same words
+    :param word:
+    :return: True if the word is WORD_LEN ascii letters
+    """
+    return len(word) == WORD_LEN and word.isascii() and word.isalpha()
+
+
+def pack_words(words_list_file=WORDS_LIST_FILE, freq_words_file=FREQ_WORDS_FILE, word_data_file=WORD_DATA_FILE,
+               entropy_file=ENTROPY_FILE):
+    """
+    converts the words files, word_data.csv and the entropies file to the packed format
+    :param words_list_file:
+    :param freq_words_file:
+    :param word_data_file:
+    :param entropy_file:
+    :return: (packed bytes, number of repeated entropy lines dropped)
+    """
+    all_words = word_file_to_list(words_list_file)
+    frequent_words = word_file_to_list(freq_words_file)
+    frequent_set = set(frequent_words)
+    vocabulary = frequent_words + [w for w in all_words if w not in frequent_set]
+    word_index = dict(zip(vocabulary, range(len(vocabulary))))
+    for word in vocabulary:
+        if not is_legal_word(word):
+            raise Exception("illegal word {!r}, words must be {} ascii letters.".format(word, WORD_LEN))
+    valued_words, values = read_word_data(word_data_file)
+    entropies, repeated = read_entropies(entropy_file)
+    columns = np.full((len(PACKED_FEATURES), len(vocabulary)), np.nan, dtype='<f4')
+    valued_ids = [word_index[w] for w in valued_words]
+    columns[:len(FEATURES), valued_ids] = values.T
+    unknown = set(entropies) - set(word_index)
+    if unknown:
+        raise Exception("{} words of {} are not in the words list.".format(len(unknown), entropy_file))
+    columns[len(FEATURES), [word_index[w] for w in entropies]] = list(entropies.values())
+    names_offset = HEADER_SIZE
+    words_offset = _align(names_offset + len(PACKED_FEATURES) * FEATURE_NAME_DTYPE.itemsize)
+    order_offset = _align(words_offset + len(vocabulary) * WORD_LEN)
+    features_offset = _align(order_offset + len(all_words) * 4)
+    column_stride = _align(len(vocabulary) * 4)
+    file_size = features_offset + len(PACKED_FEATURES) * column_stride
+    header = np.zeros(1, dtype=HEADER_DTYPE)[0]
+    header['magic'] = MAGIC
+    header['version'] = FORMAT_VERSION
+    header['header_size'] = HEADER_SIZE
+    header['num_words'] = len(vocabulary)
+    header['num_answers'] = len(frequent_words)
+    header['num_all_words'] = len(all_words)
+    header['num_features'] = len(PACKED_FEATURES)
+    header['word_bytes'] = WORD_LEN
+    header['names_offset'] = names_offset
+    header['words_offset'] = words_offset
+    header['order_offset'] = order_offset
+    header['features_offset'] = features_offset
+    header['column_stride'] = column_stride
+    header['file_size'] = file_size
+    header['words_digest'] = words_digest(vocabulary, len(frequent_words))
+    header['sources_digest'] = sources_digest([words_list_file, freq_words_file, word_data_file, entropy_file])
+    buffer = np.zeros(file_size, dtype=np.uint8)
+    buffer[:HEADER_DTYPE.itemsize] = np.frombuffer(header.tobytes(), dtype=np.uint8)
+    sections = [(names_offset, np.array(PACKED_FEATURES, dtype=FEATURE_NAME_DTYPE)),
+                (words_offset, np.array(vocabulary, dtype='S{}'.format(WORD_LEN))),
+                (order_offset, np.array([word_index[w] for w in all_words], dtype='<i4'))]
+    sections += [(features_offset + i * column_stride, column) for i, column in enumerate(columns)]
+    for offset, array in sections:
+        data = np.frombuffer(array.tobytes(), dtype=np.uint8)
+        buffer[offset:offset + len(data)] = data
+    return buffer.tobytes(), repeated
+
+
+def write_packed_words(file_name=PACKED_WORDS_FILE, **sources):
+    """
+    converts the source files and writes the packed file
+    :param file_name: packed file
+    :param sources: source file names of pack_words
+    :return: number of repeated entropy lines dropped
+    """
+    packed, repeated = pack_words(**sources)
+    tmp_name = file_name + '.tmp'
+    with open(tmp_name, 'wb') as packed_file:
+        packed_file.write(packed)
+    os.replace(tmp_name, file_name)
+    return repeated
+
+
+def read_header(buffer):
+    """
+    reads the header of a packed file, checking its format version
+    :param buffer: uint8 array of the packed file
+    :return: header record
+    """
+    if len(buffer) < HEADER_SIZE:
+        raise Exception("packed words file is too short.")
+    header = buffer[:HEADER_DTYPE.itemsize].view(HEADER_DTYPE)[0]
+    if header['magic'] != MAGIC:
+        raise Exception("not a packed words file.")
+    if header['version'] != FORMAT_VERSION:
+        raise Exception("packed words file version {} is not supported (expected {}).".format(
+            header['version'], FORMAT_VERSION))
+    return header
+
+
+def unpack_words(buffer):
+    """
+    returns the words and the feature columns of a packed file, as views of its buffer (nothing is parsed)
+    :param buffer: uint8 array of the packed file (a memmap, so processes share the pages)
+    :return: dictionary - vocabulary (array of bytes words), num_answers, all_words_order, features,
+    words_digest, sources_digest
+    """
+    header = read_header(buffer)
+    num_words = int(header['num_words'])
+
+    def section(offset, dtype, count):
+        return buffer[int(offset):int(offset) + count * np.dtype(dtype).itemsize].view(dtype)
+
+    names = section(header['names_offset'], FEATURE_NAME_DTYPE, int(header['num_features']))
+    features = {name.decode('ascii'): section(header['features_offset'] + i * header['column_stride'], '<f4',
+                                              num_words)
+                for i, name in enumerate(names)}
+    return {'vocabulary': section(header['words_offset'], 'S{}'.format(int(header['word_bytes'])), num_words),
+            'num_answers': int(header['num_answers']),
+            'all_words_order': section(header['order_offset'], '<i4', int(header['num_all_words'])),
+            'features': features, 'words_digest': header['words_digest'].decode('ascii'),
+            'sources_digest': header['sources_digest'].decode('ascii')}
+
+
+def map_packed_words(file_name=PACKED_WORDS_FILE):
+    """
+    maps a packed file read only
+    :param file_name:
+    :return: uint8 memmap of the file
+    """
+    return np.memmap(file_name, dtype=np.uint8, mode='r')
+
+
+def load_packed_words(file_name=PACKED_WORDS_FILE):
+    """
+    loads the packed words file, converting the source files first if it is missing or they changed
+    :param file_name: packed file
+    :return: dictionary of unpack_words
+    """
+    digest = sources_digest([WORDS_LIST_FILE, FREQ_WORDS_FILE, WORD_DATA_FILE, ENTROPY_FILE])
+    if os.path.exists(file_name):
+        buffer = map_packed_words(file_name)
+        if len(buffer) >= HEADER_SIZE and buffer[:len(MAGIC)].tobytes() == MAGIC:
+            header = buffer[:HEADER_DTYPE.itemsize].view(HEADER_DTYPE)[0]
+            if header['version'] == FORMAT_VERSION and header['file_size'] == len(buffer) and \
+                    header['sources_digest'].decode('ascii') == digest:
+                return unpack_words(buffer)
+        del buffer
+    try:
+        write_packed_words(file_name)
+    except OSError:
+        # the packed file only saves time, the words are used from the converted buffer
+        return unpack_words(np.frombuffer(pack_words()[0], dtype=np.uint8))
+    return unpack_words(map_packed_words(file_name))
+
+
+def validate_packed_words(file_name=PACKED_WORDS_FILE, check_sources=False):
+    """
+    validates a packed words file - layout, words and values
+    :param file_name: packed file
+    :param check_sources: also compare the file to the source files
+    :return: dictionary of the file statistics
+    """
+    buffer = map_packed_words(file_name)
+    header = read_header(buffer)
+    if header['header_size'] != HEADER_SIZE or header['word_bytes'] != WORD_LEN:
+        raise Exception("unexpected header or word size.")
+    if header['file_size'] != len(buffer):
+        raise Exception("file size {} does not match the header ({}).".format(len(buffer), header['file_size']))
+    num_words, num_features = int(header['num_words']), int(header['num_features'])
+    offsets = ['names_offset', 'words_offset', 'order_offset', 'features_offset']
+    if any(header[name] % ALIGNMENT for name in offsets + ['column_stride']):
+        raise Exception("sections are not aligned to {} bytes.".format(ALIGNMENT))
+    ends = [header['names_offset'] + num_features * FEATURE_NAME_DTYPE.itemsize,
+            header['words_offset'] + num_words * WORD_LEN, header['order_offset'] + header['num_all_words'] * 4,
+            header['features_offset'] + num_features * header['column_stride']]
+    starts = [header[name] for name in offsets]
+    if starts[0] < HEADER_SIZE or any(end > start for end, start in zip(ends, starts[1:] + [len(buffer)])):
+        raise Exception("sections overlap or exceed the file.")
+    if header['column_stride'] < num_words * 4:
+        raise Exception("feature columns are shorter than the words table.")
+    data = unpack_words(buffer)
+    if list(data['features']) != PACKED_FEATURES:
+        raise Exception("unexpected feature columns {}.".format(list(data['features'])))
+    vocabulary = data['vocabulary'].astype('U{}'.format(WORD_LEN)).tolist()
+    if len(set(vocabulary)) != num_words or not all(map(is_legal_word, vocabulary)):
+        raise Exception("words table has repeated or illegal words.")
+    if data['words_digest'] != words_digest(vocabulary, data['num_answers']):
+        raise Exception("words digest does not match the words table.")
+    order = np.asarray(data['all_words_order'])
+    if len(np.unique(order)) != len(order) or order.min() < 0 or order.max() >= num_words:
+        raise Exception("all words order is not a set of word ids.")
+    features = data['features']
+    valued = ~np.isnan(features['entropy_scaled'])
+    for name in FEATURES:
+        if not np.array_equal(~np.isnan(features[name]), valued):
+            raise Exception("feature {} is not valued for the same words as entropy_scaled.".format(name))
+        column = features[name][valued]
+        high = MAX_ENTROPY if name == 'entropy' else 1
+        if len(column) and (column.min() < 0 or column.max() > high):
+            raise Exception("feature {} is out of range.".format(name))
+    full_entropy = features['full_entropy']
+    known = ~np.isnan(full_entropy)
+    if np.any(full_entropy[known] < 0) or np.any(full_entropy[known] > MAX_ENTROPY + 1e-5):
+        raise Exception("full_entropy is out of range.")
+    if check_sources:
+        expected = np.frombuffer(pack_words()[0], dtype=np.uint8)
+        source = unpack_words(expected)
+        if source['words_digest'] != data['words_digest'] or \
+                not np.array_equal(source['all_words_order'], data['all_words_order']):
+            raise Exception("words do not match the source files.")
+        for name in PACKED_FEATURES:
+            if not np.array_equal(source['features'][name], features[name], equal_nan=True):
+                raise Exception("feature {} does not match the source files.".format(name))
+    return {'words': num_words, 'answers': data['num_answers'], 'valued_words': int(valued.sum()),
+            'words_with_full_entropy': int(known.sum()), 'file_size': len(buffer),
+            'version': int(header['version'])}
+
+
+def main():
+    """
+    converts the source files to the packed words file and validates it
+    :return:
+    """
+    parser = argparse.ArgumentParser(description='Packed binary words file')
+    parser.add_argument('--output', help='Packed file.', default=PACKED_WORDS_FILE)
+    parser.add_argument('--validate', help='Only validate the packed file (against the source files).',
+                        action='store_true')
+    args = parser.parse_args()
+    if not args.validate:
+        repeated = write_packed_words(args.output)
+        print('dropped {} repeated lines of {}'.format(repeated, ENTROPY_FILE))
+    print('valid: {}'.format(validate_packed_words(args.output, check_sources=True)))
+
+
+if __name__ == '__main__':
+    main()
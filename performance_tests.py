@@ -1,72 +1,651 @@
+import argparse
+import csv
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from multiprocessing import Pool, active_children
 from words import *
-from game import *
+from game_engine import *
+from search import *
+from feedback import get_pattern
+from packed_words import PACKED_WORDS_FILE
+from instrumentation import STATS, Instrumentation
+from shared_tables import SharedTables, attach_tables, memory_usage
+
+RESULTS_FILE = 'results.txt'
+BENCHMARK_DIR = 'benchmark_results'
+LATENCY_PERCENTILES = [50, 95, 99]
+LOST = 'X'  # histogram key of lost games
+STARTUP_RUNS = 10
+STARTUP_TARGET_MS = 100
+MULTI_BOARD_GAMES = 100
+SAMPLE_SIZES = [64, 128, 256, 512]  # sample sizes of the sampled entropies test
+SAMPLING_GAMES = 500
+
+# launches the game like wordle.py and prints the time of the first AI guess
+STARTUP_CODE = '''
+import sys
 import time
+import wordle
+words = wordle.Words()
+agent = wordle.make_agent(wordle.AGENT_NAMES[sys.argv[1]], sys.argv[3], int(sys.argv[2]))
+game = wordle.Game(words)
+game.true_word = sys.argv[4]
+game.make_a_guess(wordle.START_WORD)
+state = wordle.GameState(wordle.START_WORD, words, prev_guess=set())
+state.set_indication(game.indication)
+agent.get_action(state)
+print(time.time())
+'''
+
+# (agent, evaluation function, depth, title) of each configuration tested for an agent
+CONFIGURATIONS = {
+    'tree': [('tree', None, 0, 'AGENT: Decision Tree, HEURISTIC: Null'),
+             ('tree', 'local', 0, 'AGENT: Decision Tree, HEURISTIC: Local Evaluation'),
+             ('tree', 'const', 0, 'AGENT: Decision Tree, HEURISTIC: Constant Evaluation')],
+    'policy': [('tree', 'policy', 0, 'AGENT: Decision Tree, HEURISTIC: Policy')],
+    # normal mode compared to guessing possible words only
+    NORMAL: [('tree', 'local', 0, 'AGENT: Decision Tree, HEURISTIC: Local Evaluation'),
+             (NORMAL, 'local', 0, 'AGENT: Decision Tree (normal mode - all guesses), HEURISTIC: Local Evaluation')],
+    'minmax': [('minmax', 'local', 1, 'AGENT: MinMax, HEURISTIC: Local Evaluation, DEPTH: 1'),
+               ('minmax', 'const', 1, 'AGENT: MinMax, HEURISTIC: Constant Evaluation, DEPTH: 1'),
+               ('minmax', 'const', 2, 'AGENT: MinMax, HEURISTIC: Constant Evaluation, DEPTH: 2')],
+    'alphabeta': [('alphabeta', 'local', 1, 'AGENT: AlphaBeta, HEURISTIC: Local Evaluation, DEPTH: 1'),
+                  ('alphabeta', 'const', 1, 'AGENT: AlphaBeta, HEURISTIC: Constant Evaluation, DEPTH: 1'),
+                  ('alphabeta', 'const', 2, 'AGENT: AlphaBeta, HEURISTIC: Constant Evaluation, DEPTH: 2')],
+    'expectimax': [('expectimax', 'local', 1, 'AGENT: ExpectiMax, HEURISTIC: Local Evaluation, DEPTH: 1'),
+                   ('expectimax', 'local', 2, 'AGENT: ExpectiMax, HEURISTIC: Local Evaluation, DEPTH: 2'),
+                   ('expectimax', 'const', 1, 'AGENT: ExpectiMax, HEURISTIC: Constant Evaluation, DEPTH: 1'),
+                   ('expectimax', 'const', 2, 'AGENT: ExpectiMax, HEURISTIC: Constant Evaluation, DEPTH: 2')],
+}
+
+
+def play_game(agent, words, true_word, start_word=START_WORD):
+    """
+    plays a single game of an agent
+    :param agent: Agent object
+    :param words: Words object
+    :param true_word: the hidden word
+    :param start_word: the first guess
+    :return: dictionary of the game results
+    """
+    game = Game(words)
+    game.true_word = true_word
+    table_stats = agent.transpositions.stats()
+    search_stats = agent.search_stats()
+    state = GameState(start_word, words, prev_guess=set())
+    guesses = []
+    latencies = []
+    nodes = []
+    depths = []
+    moves_stats = []
+    num_profiles = len(STATS.profiles)
+    while game.not_ended():
+        new_guess = state.get_word()
+        guesses.append(new_guess)
+        game.make_a_guess(new_guess)
+        if not game.winning_flag:
+            before = STATS.snapshot() if STATS.enabled else None
+            state.set_indication(game.indication)
+            num_nodes = agent.nodes
+            start_time = time.perf_counter()
+            word = agent.get_action(state)
+            latencies.append((time.perf_counter() - start_time) * 1000)
+            nodes.append(agent.nodes - num_nodes)
+            depths.append(agent.depth_reached)
+            if before is not None:
+                moves_stats.append(Instrumentation.difference(STATS.snapshot(), before))
+            state.set_word(word)
+    table_hits = agent.transpositions.hits - table_stats['hits']
+    table_misses = agent.transpositions.misses - table_stats['misses']
+    res = {'target': true_word, 'win': game.winning_flag, 'num_guesses': game.guess_num,
+           'guesses': guesses, 'latency_ms': latencies, 'table_hits': table_hits, 'table_misses': table_misses,
+           'agent_calls': len(latencies), 'nodes': nodes, 'cutoffs': agent.cutoffs - search_stats['cutoffs'],
+           'depths': depths}
+    if STATS.enabled:
+        add_instrumentation(res, moves_stats, STATS.profiles[num_profiles:])
+    return res
+
+
+def add_instrumentation(game, moves_stats, profiles):
+    """
+    adds the instrumentation counters and timers of a game to its results
+    :param game: dictionary of the game results
+    :param moves_stats: counters and timers of each move (the indication update and the agent's decision)
+    :param profiles: cProfile reports of the profiled moves of the game
+    :return:
+    """
+    game['instrumentation'] = {'moves': moves_stats, 'total': Instrumentation.total(moves_stats)}
+    if profiles:
+        game['profiles'] = profiles
+
+
+def play_batch(agent, words, true_words):
+    """
+    plays the games of all the hidden words together, as a tree - games with the same guesses and indications
+    so far share one state, and the agent decides once for each state. The results are the same as playing
+    the games one by one (with a deterministic agent).
+    :param agent: Agent object
+    :param words: Words object
+    :param true_words: hidden words
+    :return: list of games results, in the order of true_words (the decision of a shared state is recorded on the
+    first game in it only - its agent call, latency, nodes, depth and instrumentation - and all the profiles are
+    added to the first game)
+    """
+    games = [{'target': true_word, 'win': False, 'num_guesses': 0, 'guesses': [], 'latency_ms': [],
+              'table_hits': 0, 'table_misses': 0, 'agent_calls': 0, 'nodes': [], 'cutoffs': 0, 'depths': []}
+             for true_word in true_words]
+    moves_stats = [[] for _ in true_words]
+    num_profiles = len(STATS.profiles)
+    # (state, indexes of the games in it)
+    groups = [(GameState(START_WORD, words, prev_guess=set()), list(range(len(true_words))))]
+    for turn in range(NUM_GUSSES):
+        next_groups = []
+        for state, indexes in groups:
+            guess = state.get_word()
+            by_pattern = dict()
+            for i in indexes:
+                games[i]['guesses'].append(guess)
+                games[i]['num_guesses'] += 1
+                if guess == true_words[i]:
+                    games[i]['win'] = True
+                else:
+                    by_pattern.setdefault(get_pattern(guess, true_words[i]), []).append(i)
+            if turn == NUM_GUSSES - 1:
+                continue
+            for code, group in by_pattern.items():
+                before = STATS.snapshot() if STATS.enabled else None
+                child = state.copy()
+                child.set_indication(pattern_to_indication(code))
+                table_stats = agent.transpositions.stats()
+                search_stats = agent.search_stats()
+                start_time = time.perf_counter()
+                word = agent.get_action(child)
+                latency = (time.perf_counter() - start_time) * 1000
+                child.set_word(word)
+                first = games[group[0]]
+                first['agent_calls'] += 1
+                first['table_hits'] += agent.transpositions.hits - table_stats['hits']
+                first['table_misses'] += agent.transpositions.misses - table_stats['misses']
+                first['cutoffs'] += agent.cutoffs - search_stats['cutoffs']
+                # a decision is recorded once, so the percentiles and means are over decisions as without batching
+                first['latency_ms'].append(latency)
+                first['nodes'].append(agent.nodes - search_stats['nodes'])
+                first['depths'].append(agent.depth_reached)
+                if before is not None:
+                    moves_stats[group[0]].append(Instrumentation.difference(STATS.snapshot(), before))
+                next_groups.append((child, group))
+        groups = next_groups
+    if STATS.enabled:
+        for game, game_stats in zip(games, moves_stats):
+            add_instrumentation(game, game_stats, [])
+        if len(STATS.profiles) > num_profiles:
+            games[0]['profiles'] = STATS.profiles[num_profiles:]
+    return games
+
+
+_worker_words = None
+_worker_agent = None
+_worker_reset_table = False
+
+
+def _init_worker(configuration, reset_table, time_budget_ms=None, instrument=False, profile_moves=0,
+                 tables_spec=None):
+    global _worker_words, _worker_agent, _worker_reset_table
+    _worker_words = Words(attach_tables(tables_spec))
+    _worker_agent = make_agent(*configuration[:3], time_budget_ms=time_budget_ms)
+    _worker_reset_table = reset_table
+    STATS.reset()
+    if instrument:
+        STATS.enable(profile_moves)
+    else:
+        STATS.disable()
+
+
+def _play_game(true_word):
+    if _worker_reset_table:
+        _worker_agent.reset_transpositions()
+    return play_game(_worker_agent, _worker_words, true_word)
+
+
+def pool_memory():
+    """
+    returns the memory of this process and its pool workers
+    :return: dictionary of the proportional (shared pages split between the processes) and private memory (kB),
+    or None if it is unknown
+    """
+    parent = memory_usage()
+    workers = [memory_usage(process.pid) for process in active_children()]
+    workers = [usage for usage in workers if usage is not None]
+    if parent is None or not workers:
+        return None
+    return {'processes': len(workers) + 1, 'pss_total': parent['Pss'] + sum(usage['Pss'] for usage in workers),
+            'pss_parent': parent['Pss'],
+            'pss_worker_mean': sum(usage['Pss'] for usage in workers) / len(workers),
+            'private_worker_mean': sum(usage['Private_Clean'] + usage['Private_Dirty']
+                                       for usage in workers) / len(workers)}
+
+
+def run_games(configuration, true_words, workers=1, reset_table=False, batch=False, time_budget_ms=None,
+              instrument=False, profile_moves=0, memory=None):
+    """
+    plays a game for each of the hidden words, on a process pool when workers > 1
+    :param configuration: (agent, evaluation function, depth, title)
+    :param true_words: hidden words
+    :param workers: number of processes
+    :param reset_table: clear the agent's transposition table before each game (otherwise it is kept between games)
+    :param batch: play all the games together in a single process, deciding once for games in the same state
+    :param time_budget_ms: time budget of a move
+    :param instrument: count and time the phases of each move (instrumentation.py)
+    :param profile_moves: number of first moves profiled with cProfile, in each process (when instrumented)
+    :param memory: dictionary filled with the memory of the processes (pool_memory), if given
+    :return: list of games results, in the order of true_words
+    """
+    worker_args = (configuration, reset_table, time_budget_ms, instrument, profile_moves)
+    try:
+        if batch:
+            _init_worker(*worker_args)
+            return play_batch(_worker_agent, _worker_words, true_words)
+        if workers <= 1:
+            _init_worker(*worker_args)
+            return [_play_game(true_word) for true_word in true_words]
+    finally:
+        STATS.disable()
+    chunk_size = max(1, len(true_words) // (workers * 8))
+    # the word tables are published once, the workers attach them read-only
+    with SharedTables.publish(Words().get_tables()) as tables, \
+            Pool(workers, initializer=_init_worker, initargs=worker_args + (tables.spec,)) as pool:
+        games = pool.map(_play_game, true_words, chunksize=chunk_size)
+        if memory is not None:
+            memory.update(pool_memory() or {})
+        return games
+
 
+def summarize(configuration, games, run_time, time_budget_ms=None):
+    """
+    summarizes games results
+    :param configuration: (agent, evaluation function, depth, title)
+    :param games: list of games results
+    :param run_time: wall time of all games (seconds)
+    :param time_budget_ms: time budget of a move
+    :return: dictionary of the summary
+    """
+    agent_name, evaluation_func, depth, title = configuration
+    histogram = {str(i): 0 for i in range(1, NUM_GUSSES + 1)}
+    histogram[LOST] = 0
+    for game in games:
+        histogram[str(game['num_guesses']) if game['win'] else LOST] += 1
+    latencies = [latency for game in games for latency in game['latency_ms']]
+    latency_summary = {'decisions': len(latencies)}
+    if latencies:
+        for p in LATENCY_PERCENTILES:
+            latency_summary['p{}'.format(p)] = float(np.percentile(latencies, p))
+        latency_summary['mean'] = float(np.mean(latencies))
+        latency_summary['max'] = float(np.max(latencies))
+    nodes = [num_nodes for game in games for num_nodes in game['nodes']]
+    nodes_summary = dict()
+    if nodes:
+        nodes_summary = {'mean': float(np.mean(nodes)), 'p50': float(np.percentile(nodes, 50)),
+                         'max': int(np.max(nodes))}
+    depths = [depth for game in games for depth in game['depths']]
+    depth_summary = dict()
+    if depths:
+        depth_summary = {'mean': float(np.mean(depths)), 'min': int(np.min(depths)), 'max': int(np.max(depths))}
+    return {'title': title, 'agent': agent_name, 'evaluation_function': evaluation_func or NULL, 'depth': depth,
+            'games': len(games), 'wins': sum(game['win'] for game in games),
+            'avg_guesses': sum(game['num_guesses'] for game in games) / len(games),
+            'guesses_histogram': histogram, 'latency_ms': latency_summary, 'run_time': run_time,
+            'table_hits': sum(game['table_hits'] for game in games),
+            'table_misses': sum(game['table_misses'] for game in games),
+            'agent_calls': sum(game['agent_calls'] for game in games),
+            'nodes_per_decision': nodes_summary, 'cutoffs': sum(game['cutoffs'] for game in games),
+            'time_budget_ms': time_budget_ms, 'depth_reached': depth_summary,
+            'instrumentation': Instrumentation.total([game['instrumentation']['total'] for game in games
+                                                      if 'instrumentation' in game]) or None}
 
-def agents_performace_test(agent, true_words, title, results_file):
-    num_guesses = 0
-    num_wins = 0
-    for true_word in true_words:
-        game = Game()
-        game.true_word = true_word
-        state = GameState(START_WORD, game.words, prev_guess=set())
-        while game.not_ended():
-            new_guess = state.get_word()
-            game.make_a_guess(new_guess)
-            if not game.winning_flag:
-                state.set_indication(game.indication)
-                word = agent.get_action(state)
-                state.set_word(word)
-        num_guesses += game.guess_num
-        num_wins += game.winning_flag
+
+def write_results(summary, games, output_dir):
+    """
+    writes the summary and the per game results of a configuration as json and csv files
+    :param summary: dictionary of the summary
+    :param games: list of games results
+    :param output_dir:
+    :return: path of the json file (the profiles of the instrumented moves are written to a text file beside it)
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    name = '{}_{}_depth{}'.format(summary['agent'], summary['evaluation_function'], summary['depth'])
+    if summary['time_budget_ms'] is not None:
+        name += '_budget{:g}ms'.format(summary['time_budget_ms'])
+    json_path = os.path.join(output_dir, name + '.json')
+    # the profiles are written as text, the games keep the counters and timers
+    profiles = [(game['target'], profile) for game in games for profile in game.get('profiles', [])]
+    if profiles:
+        with open(os.path.join(output_dir, name + '_profiles.txt'), 'w') as profiles_file:
+            for target, profile in profiles:
+                profiles_file.write('### target: {}\n{}\n'.format(target, profile))
+    games = [{key: value for key, value in game.items() if key != 'profiles'} for game in games]
+    with open(json_path, 'w') as json_file:
+        json.dump({'summary': summary, 'games': games}, json_file, indent=1)
+    with open(os.path.join(output_dir, name + '.csv'), 'w', newline='') as csv_file:
+        writer = csv.writer(csv_file)
+        writer.writerow(['target', 'win', 'num_guesses', 'guesses', 'latency_ms', 'table_hits', 'table_misses',
+                         'nodes', 'cutoffs', 'depths'])
+        for game in games:
+            writer.writerow([game['target'], int(game['win']), game['num_guesses'], ' '.join(game['guesses']),
+                             ' '.join('{:.3f}'.format(latency) for latency in game['latency_ms']),
+                             game['table_hits'], game['table_misses'], ' '.join(map(str, game['nodes'])),
+                             game['cutoffs'], ' '.join(map(str, game['depths']))])
+    return json_path
+
+
+def agents_performace_test(configuration, true_words, results_file, workers=1, output_dir=BENCHMARK_DIR,
+                           reset_table=False, batch=False, time_budget_ms=None, instrument=False, profile_moves=0):
+    """
+    tests a configuration on all the hidden words
+    :param configuration: (agent, evaluation function, depth, title)
+    :param true_words: hidden words
+    :param results_file: opened results text file
+    :param workers: number of processes
+    :param output_dir: directory of the json and csv results
+    :param reset_table: clear the agent's transposition table before each game
+    :param batch: play all the games together, deciding once for games in the same state
+    :param time_budget_ms: time budget of a move
+    :param instrument: count and time the phases of each move
+    :param profile_moves: number of first moves profiled with cProfile, in each process
+    :return: dictionary of the summary
+    """
+    start_time = time.time()
+    memory = dict()
+    games = run_games(configuration, true_words, workers, reset_table, batch, time_budget_ms, instrument,
+                      profile_moves, memory)
+    summary = summarize(configuration, games, time.time() - start_time, time_budget_ms)
+    summary['memory_kb'] = memory or None
+    write_results(summary, games, output_dir)
     results_file.write('#########################################################\n')
-    results_file.write(title+'\n')
-    results_file.write('AVG num guesses: ' + str(num_guesses / 3000) + '\n')
-    results_file.write('TOTAL num wins: ' + str(num_wins) + '/' + str(3000)+'\n')
+    results_file.write(summary['title'] + '\n')
+    results_file.write('AVG num guesses: ' + str(summary['avg_guesses']) + '\n')
+    results_file.write('TOTAL num wins: ' + str(summary['wins']) + '/' + str(len(true_words)) + '\n')
+    latency = summary['latency_ms']
+    if latency['decisions']:
+        results_file.write('decision ms p50/p95/p99: {:.2f}/{:.2f}/{:.2f}\n'.format(
+            latency['p50'], latency['p95'], latency['p99']))
+    results_file.write('agent calls: ' + str(summary['agent_calls']) + '\n')
+    if summary['nodes_per_decision']:
+        results_file.write('nodes per decision mean/max: {:.1f}/{}, cutoffs: {}\n'.format(
+            summary['nodes_per_decision']['mean'], summary['nodes_per_decision']['max'], summary['cutoffs']))
+    if time_budget_ms is not None and summary['depth_reached']:
+        results_file.write('time budget {:g} ms, depth reached mean/min/max: {:.2f}/{}/{}\n'.format(
+            time_budget_ms, summary['depth_reached']['mean'], summary['depth_reached']['min'],
+            summary['depth_reached']['max']))
+    if memory:
+        results_file.write('memory kB - {} processes, pss total {}, parent {}, private per worker {:.0f}\n'.format(
+            memory['processes'], memory['pss_total'], memory['pss_parent'], memory['private_worker_mean']))
+    if summary['instrumentation']:
+        results_file.write('phases calls/ms: ' + ', '.join(
+            '{} {}/{:.1f}'.format(name, phase['calls'], phase['ms'])
+            for name, phase in sorted(summary['instrumentation'].items())) + '\n')
+    return summary
+
+
+def performance_tests(agent, workers=1, limit=None, depths=None, output_dir=BENCHMARK_DIR, reset_table=False,
+                      batch=False, time_budget_ms=None, instrument=False, profile_moves=0):
+    """
+    tests all configurations of an agent
+    :param agent: key of CONFIGURATIONS
+    :param workers: number of processes
+    :param limit: number of hidden words to test (default all frequent words)
+    :param depths: depths to test (default all)
+    :param output_dir: directory of the json and csv results
+    :param reset_table: clear the agent's transposition table before each game
+    :param batch: play all the games together, deciding once for games in the same state
+    :param time_budget_ms: time budget of a move
+    :param instrument: count and time the phases of each move
+    :param profile_moves: number of first moves profiled with cProfile, in each process
+    :return:
+    """
+    all_words = Words().get_word_list(FREQ_WORDS)[:limit]
+    start_time = time.time()
+    with open(RESULTS_FILE, 'a') as results:
+        for configuration in CONFIGURATIONS[agent]:
+            if depths is None or configuration[2] in depths or AGENT_CLASSES[configuration[0]] is None:
+                agents_performace_test(configuration, all_words, results, workers, output_dir, reset_table,
+                                       batch, time_budget_ms, instrument, profile_moves)
+        results.write(agent + ' run time: ' + str(time.time() - start_time) + '\n')
+
+
+def launch_time(agent_name, depth, evaluation_func, true_word):
+    """
+    launches a new process playing the first AI guess of a game
+    :param agent_name: wordle.py agent name
+    :param depth:
+    :param evaluation_func: local, const, null or policy
+    :param true_word: the hidden word
+    :return: time from launch to the first AI guess (ms)
+    """
+    start_time = time.time()
+    res = subprocess.run([sys.executable, '-c', STARTUP_CODE, agent_name, str(depth), evaluation_func, true_word],
+                         capture_output=True, text=True, check=True)
+    return (float(res.stdout.split()[-1]) - start_time) * 1000
 
 
-def performance_tests(agent):
-    results = open('results.txt', 'a')
-    all_words = Words().get_word_list('freq_words')
+def startup_test(runs=STARTUP_RUNS, agent_name='DecisionTree', depth=0, evaluation_func=CONST,
+                 output_dir=BENCHMARK_DIR):
+    """
+    measures the time from launching the game to the first AI guess - once after removing the packed words file
+    (which is rebuilt) and then runs times with the packed file
+    :param runs: number of launches
+    :param agent_name: wordle.py agent name
+    :param depth:
+    :param evaluation_func: local, const, null or policy
+    :param output_dir: directory of the json results
+    :return: dictionary of the summary
+    """
+    true_word = Words().frequent_words[0]
+    if os.path.exists(PACKED_WORDS_FILE):
+        os.remove(PACKED_WORDS_FILE)
+    rebuild = launch_time(agent_name, depth, evaluation_func, true_word)
+    launches = [launch_time(agent_name, depth, evaluation_func, true_word) for _ in range(runs)]
+    summary = {'agent': agent_name, 'evaluation_function': evaluation_func, 'depth': depth, 'runs': runs,
+               'packed_rebuild_ms': rebuild, 'launches_ms': launches,
+               'p50': float(np.percentile(launches, 50)), 'max': float(np.max(launches)),
+               'target_ms': STARTUP_TARGET_MS}
+    os.makedirs(output_dir, exist_ok=True)
+    with open(os.path.join(output_dir, 'startup.json'), 'w') as json_file:
+        json.dump(summary, json_file, indent=1)
+    with open(RESULTS_FILE, 'a') as results:
+        results.write('#########################################################\n')
+        results.write('STARTUP: {} {} depth {}\n'.format(agent_name, evaluation_func, depth))
+        results.write('first AI guess ms p50/max: {:.1f}/{:.1f} (packed file rebuild: {:.1f})\n'.format(
+            summary['p50'], summary['max'], rebuild))
+    return summary
+
+
+def play_multi_game(agent, words, true_words):
+    """
+    plays a single multi board game of an agent
+    :param agent: MultiBoardAgent object
+    :param words: Words object
+    :param true_words: the hidden word of each board
+    :return: dictionary of the game results
+    """
+    game = MultiGame(len(true_words), words, true_words)
+    state = MultiBoardState(words, len(true_words))
+    guesses = []
+    latencies = []
+    while game.not_ended():
+        guesses.append(state.get_word())
+        game.make_a_guess(state.get_word())
+        if not game.winning_flag:
+            state = state.with_indications(game.indications)
+            start_time = time.perf_counter()
+            word = agent.get_action(state)
+            latencies.append((time.perf_counter() - start_time) * 1000)
+            state = state.with_word(word)
+    return {'targets': list(true_words), 'win': game.winning_flag, 'num_guesses': game.guess_num,
+            'solved_turns': game.solved_turns, 'guesses': guesses, 'latency_ms': latencies}
+
+
+def multi_board_test(num_boards, games=MULTI_BOARD_GAMES, seed=None, all_guesses=False, output_dir=BENCHMARK_DIR):
+    """
+    tests the multi board agent on random hidden words
+    :param num_boards: number of boards of a game
+    :param games: number of games
+    :param seed: seed of the hidden words
+    :param all_guesses: the agent guesses any word, not only answers
+    :param output_dir: directory of the json results
+    :return: dictionary of the summary
+    """
+    words = Words()
+    agent = MultiBoardAgent(all_guesses=all_guesses)
+    rand = random.Random(seed)
     start_time = time.time()
-    if agent == 'tree':
-        agents_performace_test(agent=DecisionTree(), true_words=all_words, results_file=results,
-                              title='AGENT: Decision Tree, HEURISTIC: Null')
-        agents_performace_test(agent=DecisionTree(evaluation_func='local'), true_words=all_words, results_file=results,
-                              title='AGENT: Decision Tree, HEURISTIC: Local Evaluation')
-        agents_performace_test(agent=DecisionTree(evaluation_func='const'), true_words=all_words, results_file=results,
-                              title='AGENT: Decision Tree, HEURISTIC: Constant Evaluation')
-        results.write('tree run time: ' + str(time.time() - start_time))
-    elif agent == 'minmax':
-        agents_performace_test(agent=MinmaxAgent(depth=1, evaluation_func='local'), true_words=all_words, results_file=results,
-                               title='AGENT: MinMax, HEURISTIC: Local Evaluation, DEPTH: 1')
-        agents_performace_test(agent=MinmaxAgent(depth=1, evaluation_func='const'), true_words=all_words, results_file=results,
-                               title='AGENT: MinMax, HEURISTIC: Constant Evaluation, DEPTH: 1')
-        agents_performace_test(agent=MinmaxAgent(depth=2, evaluation_func='const'), true_words=all_words, results_file=results,
-                               title='AGENT: MinMax, HEURISTIC: Constant Evaluation, DEPTH: 2')
-        results.write('minmax run time: ' + str(time.time() - start_time))
-    elif agent == 'alphabeta':
-        agents_performace_test(agent=AlphaBetaAgent(depth=1, evaluation_func='local'), true_words=all_words, results_file=results,
-                               title='AGENT: AlphaBeta, HEURISTIC: Local Evaluation, DEPTH: 1')
-        agents_performace_test(agent=AlphaBetaAgent(depth=1, evaluation_func='const'), true_words=all_words, results_file=results,
-                               title='AGENT: AlphaBeta, HEURISTIC: Constant Evaluation, DEPTH: 1')
-        agents_performace_test(agent=AlphaBetaAgent(depth=2, evaluation_func='const'), true_words=all_words, results_file=results,
-                               title='AGENT: AlphaBeta, HEURISTIC: Constant Evaluation, DEPTH: 2')
-        results.write('alphabeta run time: ' + str(time.time() - start_time))
-    elif agent == 'expectimax':
-        agents_performace_test(agent=ExpectiMaxAgent(depth=1, evaluation_func='local'), true_words=all_words, results_file=results,
-                               title='AGENT: ExpectiMax, HEURISTIC: Local Evaluation, DEPTH: 1')
-        agents_performace_test(agent=ExpectiMaxAgent(depth=2, evaluation_func='local'), true_words=all_words, results_file=results,
-                               title='AGENT: ExpectiMax, HEURISTIC: Local Evaluation, DEPTH: 2')
-        agents_performace_test(agent=ExpectiMaxAgent(depth=1, evaluation_func='const'), true_words=all_words, results_file=results,
-                               title='AGENT: ExpectiMax, HEURISTIC: Constant Evaluation, DEPTH: 1')
-        agents_performace_test(agent=ExpectiMaxAgent(depth=2, evaluation_func='const'), true_words=all_words, results_file=results,
-                               title='AGENT: ExpectiMax, HEURISTIC: Constant Evaluation, DEPTH: 2')
-        results.write('expectimax run time: ' + str(time.time() - start_time))
-    results.close()
-
-
-performance_tests('tree')
-# performance_tests('minmax')
-# performance_tests('alphabeta')
-# performance_tests('expectimax')
+    results = [play_multi_game(agent, words, rand.sample(words.frequent_words, num_boards)) for _ in range(games)]
+    run_time = time.time() - start_time
+    latencies = [latency for game in results for latency in game['latency_ms']]
+    summary = {'agent': agent.get_config_name(), 'boards': num_boards, 'max_guesses': board_guesses(num_boards),
+               'games': games, 'seed': seed, 'wins': sum(game['win'] for game in results),
+               'avg_guesses': sum(game['num_guesses'] for game in results) / games, 'run_time': run_time,
+               'latency_ms': {'p{}'.format(p): float(np.percentile(latencies, p)) for p in LATENCY_PERCENTILES}}
+    os.makedirs(output_dir, exist_ok=True)
+    name = 'multi{}_{}'.format(num_boards, 'all' if all_guesses else 'answers')
+    with open(os.path.join(output_dir, name + '.json'), 'w') as json_file:
+        json.dump({'summary': summary, 'games': results}, json_file, indent=1)
+    with open(RESULTS_FILE, 'a') as results_file:
+        results_file.write('#########################################################\n')
+        results_file.write('AGENT: {}, BOARDS: {}\n'.format(summary['agent'], num_boards))
+        results_file.write('AVG num guesses: {}\n'.format(summary['avg_guesses']))
+        results_file.write('TOTAL num wins: {}/{}\n'.format(summary['wins'], games))
+        results_file.write('decision ms p50/p95/p99: {}\n'.format(
+            '/'.join('{:.2f}'.format(latency) for latency in summary['latency_ms'].values())))
+    return summary
+
+
+def sampling_test(sample_sizes=None, top_k=SAMPLE_TOP_K, games=SAMPLING_GAMES, seed=0, all_guesses=False,
+                  output_dir=BENCHMARK_DIR):
+    """
+    measures the guesses penalty and the decision time of sampled entropies at each sample size, compared to exact
+    entropies (the decision tree with the local evaluation, without the opening book). The agent chooses the first
+    guess too - the decision over all the frequent words, where the entropies take the longest
+    :param sample_sizes: list of sample sizes
+    :param top_k: number of best estimated words calculated exactly
+    :param games: number of frequent words played
+    :param seed: seed of the samples
+    :param all_guesses: normal mode - the decision tree guesses any word
+    :param output_dir: directory of the json results
+    :return: list of the summaries of exact entropies and each sample size
+    """
+    words = Words()
+    true_words = words.frequent_words[:games]
+    summaries = []
+    for sample_size in [None] + (SAMPLE_SIZES if sample_sizes is None else sample_sizes):
+        agent = DecisionTree(evaluation_func=LOCAL, use_opening_book=False, all_guesses=all_guesses,
+                             sample_size=sample_size, sample_top_k=top_k, sample_seed=seed)
+        start_time = time.time()
+        opening_time = time.perf_counter()
+        opening = agent.get_action(GameState(START_WORD, words, prev_guess=set()))
+        opening_ms = (time.perf_counter() - opening_time) * 1000
+        results = [play_game(agent, words, true_word, opening) for true_word in true_words]
+        latencies = [latency for game in results for latency in game['latency_ms']]
+        summary = {'sample_size': sample_size, 'opening': opening, 'opening_ms': opening_ms,
+                   'games': len(results), 'wins': sum(game['win'] for game in results),
+                   'avg_guesses': sum(game['num_guesses'] for game in results) / len(results),
+                   'run_time': time.time() - start_time,
+                   'latency_ms': {'p{}'.format(p): float(np.percentile(latencies, p)) for p in LATENCY_PERCENTILES},
+                   'estimator': None if agent.estimator is None else agent.estimator.report()}
+        summary['penalty'] = summary['avg_guesses'] - summaries[0]['avg_guesses'] if summaries else 0.0
+        summaries.append(summary)
+    os.makedirs(output_dir, exist_ok=True)
+    name = 'sampling_{}'.format('all' if all_guesses else 'possible')
+    with open(os.path.join(output_dir, name + '.json'), 'w') as json_file:
+        json.dump({'top_k': top_k, 'seed': seed, 'all_guesses': all_guesses, 'summaries': summaries}, json_file,
+                  indent=1)
+    with open(RESULTS_FILE, 'a') as results_file:
+        results_file.write('#########################################################\n')
+        results_file.write('SAMPLED ENTROPIES: Decision Tree{}, top k {}\n'.format(
+            ' (normal mode - all guesses)' if all_guesses else '', top_k))
+        for summary in summaries:
+            line = 'sample {}: first guess {} ({:.1f} ms), AVG num guesses {:.4f} (penalty {:+.4f}), wins {}/{}, ' \
+                   'decision ms p50/p95/p99: {}'.format(
+                       summary['sample_size'] or 'exact', summary['opening'], summary['opening_ms'],
+                       summary['avg_guesses'], summary['penalty'], summary['wins'], summary['games'],
+                       '/'.join('{:.2f}'.format(latency) for latency in summary['latency_ms'].values()))
+            if summary['estimator'] is not None:
+                line += ', exact words per call {:.1f}, confident calls {:.1%}'.format(
+                    summary['estimator']['exact_per_call'], summary['estimator']['confident_calls'])
+            results_file.write(line + '\n')
+    return summaries
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Wordle agents performance tests')
+    parser.add_argument('--agent', choices=list(CONFIGURATIONS.keys()), default=['tree'], nargs='+',
+                        help='Agents to test.')
+    parser.add_argument('--workers', help='Number of processes.', default=os.cpu_count(), type=int)
+    parser.add_argument('--limit', help='Number of frequent words to test (default all).', default=None, type=int)
+    parser.add_argument('--depth', help='Depths to test (default all).', default=None, type=int, nargs='+')
+    parser.add_argument('--output-dir', help='Directory of the json and csv results.', default=BENCHMARK_DIR)
+    parser.add_argument('--reset-table-per-game', help="Clear the agents' transposition tables before each game.",
+                        action='store_true')
+    parser.add_argument('--batch', help='Play all the games of a configuration together (single process), '
+                                        'deciding once for games with the same guesses and indications.',
+                        action='store_true')
+    parser.add_argument('--time-budget-ms', help='Time budget of a move - the search agents deepen iteratively '
+                                                 'up to the tested depth.', default=None, type=float)
+    parser.add_argument('--instrument', help='Count and time the phases of each move (successors, filtering, '
+                                             'evaluation...) and add them to the results.', action='store_true')
+    parser.add_argument('--profile-moves', help='Profile the first moves of each process with cProfile '
+                                                '(implies --instrument).', default=0, type=int)
+    parser.add_argument('--startup', help='Measure the time from launch to the first AI guess instead.',
+                        action='store_true')
+    parser.add_argument('--startup-runs', help='Number of launches of the startup test.', default=STARTUP_RUNS,
+                        type=int)
+    parser.add_argument('--boards', help='Test the multi board agent on games of this many boards instead.',
+                        default=None, type=int)
+    parser.add_argument('--games', help='Number of multi board games.', default=MULTI_BOARD_GAMES, type=int)
+    parser.add_argument('--seed', help='Seed of the hidden words of the multi board games (of the samples in the '
+                                       'sampling test).', default=None, type=int)
+    parser.add_argument('--all-guesses', help='The multi board agent (the decision tree of the sampling test) '
+                                              'guesses any word, not only answers.',
+                        action='store_true')
+    parser.add_argument('--sampling', help='Test sampled entropies (decision tree, local evaluation) at each of '
+                                           'these sample sizes against exact entropies instead.', nargs='*',
+                        type=int, default=None)
+    parser.add_argument('--sample-top-k', help='Best estimated words calculated exactly (sampling test).',
+                        default=SAMPLE_TOP_K, type=int)
+    args = parser.parse_args()
+    if args.sample_top_k < 1:
+        parser.error('--sample-top-k should be at least 1')
+    if args.sampling is not None and any(sample_size < 2 for sample_size in args.sampling):
+        parser.error('--sampling sample sizes should be at least 2')
+    if args.batch and args.reset_table_per_game:
+        parser.error('--batch plays all the games with one agent, it cannot reset the table per game')
+    if args.sampling is not None:
+        for summary in sampling_test(args.sampling or None, args.sample_top_k, args.limit or SAMPLING_GAMES,
+                                     args.seed or 0, args.all_guesses, args.output_dir):
+            print('sample {}: first guess {} ({:.1f} ms), AVG num guesses {:.4f} (penalty {:+.4f})'.format(
+                summary['sample_size'] or 'exact', summary['opening'], summary['opening_ms'], summary['avg_guesses'],
+                summary['penalty']))
+        return
+    if args.boards is not None:
+        num_answers = Words().num_answers
+        if not 1 <= args.boards <= num_answers:
+            parser.error('--boards must be between 1 and {}'.format(num_answers))
+        summary = multi_board_test(args.boards, args.games, args.seed, args.all_guesses, args.output_dir)
+        print('{} boards - AVG num guesses: {}, TOTAL num wins: {}/{}'.format(
+            args.boards, summary['avg_guesses'], summary['wins'], summary['games']))
+        return
+    if args.startup:
+        summary = startup_test(args.startup_runs, output_dir=args.output_dir)
+        print('first AI guess ms p50: {:.1f} (target {} ms)'.format(summary['p50'], STARTUP_TARGET_MS))
+        return
+    for agent in args.agent:
+        performance_tests(agent, args.workers, args.limit, args.depth, args.output_dir, args.reset_table_per_game,
+                          args.batch, args.time_budget_ms, args.instrument or args.profile_moves > 0,
+                          args.profile_moves)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,257 @@
+import argparse
+import os
+import math
+import time
+import tracemalloc
+import numpy as np
+from game_state import *
+from feedback import words_digest, ALL_GREEN
+
+POLICY_FILE = 'decision_policy.npz'
+EXPECTED = 'expected'  # minimize the expected number of guesses
+WORST = 'worst'  # minimize the worst case number of guesses
+BRANCH_WIDTH = 10  # guesses searched at each node, the most promising by their lower bound
+MAX_GUESSES = 6
+
+
+def lower_bounds(counts, objective):
+    """
+    returns a lower bound of the cost of each guess, by the sizes of the groups it splits the possible words to
+    :param counts: (guesses, NUM_PATTERNS) array - number of possible words giving each pattern
+    :param objective: EXPECTED or WORST
+    :return: array of lower bounds
+    """
+    num_words = counts[0].sum()
+    is_possible = counts[:, ALL_GREEN] > 0
+    # words and groups left after the guess (the all green group ends the game)
+    num_left = num_words - is_possible
+    groups_left = (counts > 0).sum(axis=1) - is_possible
+    if objective == WORST:
+        # 1 guess if the guess is the hidden word, 2 if every group left is a single word
+        return 1 + np.where(num_left == 0, 0, np.where(num_left > groups_left, 2, 1))
+    # in each group one word is guessed next, the others take at least one more guess
+    return num_words + 2 * num_left - groups_left
+
+
+class PolicySolver:
+    """
+    Builds a complete guessing tree over the frequent words, by a depth first branch and bound search.
+    Subproblems are memoized by their set of possible words (and the guesses left).
+    The cost of a node is the total number of guesses of all its possible words (EXPECTED),
+    or the maximal number of guesses (WORST).
+    """
+
+    def __init__(self, words: Words, objective=EXPECTED, branch_width=BRANCH_WIDTH, max_guesses=MAX_GUESSES,
+                 all_guesses=False):
+        self.words = words
+        self.feedback = words.feedback
+        self.objective = objective
+        self.branch_width = branch_width
+        self.max_guesses = max_guesses
+        num_guesses = len(words.vocabulary) if all_guesses else words.num_answers
+        self.guess_ids = np.arange(num_guesses, dtype=np.intp)
+        # (possible words bytes, guesses left): (cost, guess id) - guess id is None if cost is only a lower bound
+        self._memo = dict()
+        self.nodes = 0
+        self.pruned = 0
+
+    def _group_bound(self, size):
+        if self.objective == WORST:
+            return 1 if size == 1 else 2
+        return 2 * size - 1
+
+    def partition(self, guess_id, candidate_ids):
+        """
+        splits the possible words by the pattern they give on a guess
+        :param guess_id: word id of the guess
+        :param candidate_ids: sorted array of word ids
+        :return: list of (pattern code, sorted array of word ids), not including the all green pattern
+        """
+        patterns = self.feedback.patterns(guess_id, candidate_ids)
+        order = np.argsort(patterns, kind='stable')
+        codes, starts = np.unique(patterns[order], return_index=True)
+        groups = np.split(candidate_ids[order], starts[1:])
+        return [(int(code), group) for code, group in zip(codes, groups) if code != ALL_GREEN]
+
+    def solve(self, candidate_ids, guesses_left, bound=math.inf):
+        """
+        finds the best guess of a set of possible words
+        :param candidate_ids: sorted array of word ids
+        :param guesses_left: number of guesses left in the game
+        :param bound: only costs lower than bound are searched
+        :return: (cost, guess id) - if no cost lower than bound was found returns (a lower bound of the cost, None)
+        """
+        num_words = len(candidate_ids)
+        if guesses_left <= 0 or (guesses_left == 1 and num_words > 1):
+            return math.inf, None
+        if num_words == 1:
+            return 1, int(candidate_ids[0])
+        if num_words == 2:
+            return (2 if self.objective == WORST else 3), int(candidate_ids[0])
+        key = (candidate_ids.tobytes(), guesses_left)
+        saved = self._memo.get(key)
+        if saved is not None and (saved[1] is not None or saved[0] >= bound):
+            return saved
+        self.nodes += 1
+        counts = self.feedback.pattern_counts(self.guess_ids, candidate_ids)
+        bounds = lower_bounds(counts, self.objective)
+        is_possible = counts[:, ALL_GREEN] > 0
+        largest_group = counts.max(axis=1)
+        # a guess which is not possible and does not split the words is useless
+        useful = np.flatnonzero(is_possible | (largest_group < num_words))
+        # lowest bound first, then smallest largest group, then possible words
+        order = useful[np.lexsort((useful, ~is_possible[useful], largest_group[useful], bounds[useful]))]
+        order = order[:self.branch_width]
+        best, best_guess = bound, None
+        for guess in order:
+            total = bounds[guess]
+            if total >= best:
+                self.pruned += 1
+                break
+            for code, group in self.partition(self.guess_ids[guess], candidate_ids):
+                if self.objective == WORST:
+                    cost, _ = self.solve(group, guesses_left - 1, best - 1)
+                    total = max(total, 1 + cost)
+                else:
+                    group_bound = self._group_bound(len(group))
+                    cost, _ = self.solve(group, guesses_left - 1, best - total + group_bound)
+                    total += cost - group_bound
+                if total >= best:
+                    break
+            if total < best:
+                best, best_guess = total, int(self.guess_ids[guess])
+        self._memo[key] = (best, best_guess)
+        return best, best_guess
+
+    def build_policy(self, start_word=START_WORD):
+        """
+        solves the game after the start word and builds the guessing tree
+        :param start_word: first guess
+        :return: (cost of the tree, dictionary of the tree arrays)
+        """
+        answers = np.arange(self.words.num_answers, dtype=np.int32)
+        guesses = [self.words.get_word_id(start_word)]
+        nodes = [answers]
+        depths = [1]  # number of guesses made when a node's guess is made
+        child_start, child_count, edge_patterns, edge_children = [], [], [], []
+        costs = []
+        # nodes are added breadth first, the root's possible words are all the answers
+        i = 0
+        while i < len(nodes):
+            child_start.append(len(edge_patterns))
+            groups = self.partition(guesses[i], nodes[i])
+            child_count.append(len(groups))
+            for code, group in groups:
+                cost, guess = self.solve(group, self.max_guesses - depths[i])
+                if guess is None:
+                    raise Exception("no policy solves all the words in {} guesses.".format(self.max_guesses))
+                if i == 0:
+                    costs.append(cost)
+                edge_patterns.append(code)
+                edge_children.append(len(nodes))
+                nodes.append(group)
+                guesses.append(guess)
+                depths.append(depths[i] + 1)
+            i += 1
+        total = 1 + max(costs) if self.objective == WORST else len(answers) + sum(costs)
+        tree = {'guesses': np.array(guesses, dtype=np.int32), 'child_start': np.array(child_start, dtype=np.int32),
+                'child_count': np.array(child_count, dtype=np.uint8),
+                'edge_patterns': np.array(edge_patterns, dtype=np.uint8),
+                'edge_children': np.array(edge_children, dtype=np.int32)}
+        return total, tree
+
+    def stats(self):
+        return {'nodes': self.nodes, 'pruned': self.pruned, 'memo': len(self._memo)}
+
+
+def save_policy(tree, words: Words, objective, file_name=POLICY_FILE, start_word=START_WORD):
+    """
+    saves a guessing tree
+    :param tree: dictionary of the tree arrays
+    :param words: Words object
+    :param objective: EXPECTED or WORST
+    :param file_name:
+    :param start_word: first guess of the tree
+    :return:
+    """
+    tmp_name = file_name + '.tmp'
+    with open(tmp_name, 'wb') as policy_file:
+        np.savez_compressed(policy_file, words_digest=words_digest(words.vocabulary, words.num_answers),
+                            start_word=start_word, objective=objective, **tree)
+    os.replace(tmp_name, file_name)
+
+
+class Policy:
+    """
+    A guessing tree loaded for play - maps the possible words of every node of the tree to its guess
+    """
+
+    def __init__(self, words: Words, file_name=POLICY_FILE):
+        if not os.path.exists(file_name):
+            raise Exception("policy file {} is missing, run policy_solver.py to build it.".format(file_name))
+        with np.load(file_name) as data:
+            if str(data['words_digest']) != words_digest(words.vocabulary, words.num_answers):
+                raise Exception("policy file {} was built for other words.".format(file_name))
+            self.start_word = str(data['start_word'])
+            self.objective = str(data['objective'])
+            tree = {name: data[name] for name in ['guesses', 'child_start', 'child_count', 'edge_patterns',
+                                                  'edge_children']}
+        self.moves = dict()  # possible words key: guess
+        feedback = words.feedback
+        nodes = [(0, np.arange(words.num_answers, dtype=np.int32))]
+        while nodes:
+            node, candidate_ids = nodes.pop()
+            guess = tree['guesses'][node]
+            self.moves[candidates_key(candidate_ids)] = words.vocabulary[guess]
+            patterns = feedback.patterns(guess, candidate_ids)
+            start = tree['child_start'][node]
+            for edge in range(start, start + tree['child_count'][node]):
+                child_ids = candidate_ids[patterns == tree['edge_patterns'][edge]]
+                nodes.append((tree['edge_children'][edge], child_ids))
+
+    def get_guess(self, state):
+        """
+        returns the guess of the tree in a state, or None if the state is not in the tree
+        :param state: GameState or SearchState
+        :return:
+        """
+        return self.moves.get(state.get_candidates_key())
+
+
+def main():
+    """
+    solves the game after the start word and saves the guessing tree
+    :return:
+    """
+    parser = argparse.ArgumentParser(description='Wordle guessing tree solver')
+    parser.add_argument('--objective', choices=[EXPECTED, WORST], default=EXPECTED,
+                        help='Minimize the expected or the worst case number of guesses.')
+    parser.add_argument('--width', help='Guesses searched at each node.', default=BRANCH_WIDTH, type=int)
+    parser.add_argument('--max-guesses', help='Guesses allowed in a game.', default=MAX_GUESSES, type=int)
+    parser.add_argument('--all-guesses', help='Guess from all words, not only the frequent words.',
+                        action='store_true')
+    parser.add_argument('--output', help='Policy file.', default=POLICY_FILE)
+    parser.add_argument('--trace-memory', help='Measure the peak memory of the solver (slower).',
+                        action='store_true')
+    args = parser.parse_args()
+    words = Words()
+    solver = PolicySolver(words, args.objective, args.width, args.max_guesses, args.all_guesses)
+    if args.trace_memory:
+        tracemalloc.start()
+    start_time = time.time()
+    cost, tree = solver.build_policy()
+    run_time = time.time() - start_time
+    save_policy(tree, words, args.objective, args.output)
+    if args.objective == WORST:
+        print('WORST CASE num guesses: ' + str(cost))
+    else:
+        print('AVG num guesses: ' + str(cost / words.num_answers))
+    print('tree nodes: {}, solver: {}, run time: {:.2f}s, file size: {} bytes'.format(
+        len(tree['guesses']), solver.stats(), run_time, os.path.getsize(args.output)))
+    if args.trace_memory:
+        print('peak memory: {:.1f} MB'.format(tracemalloc.get_traced_memory()[1] / 2 ** 20))
+        tracemalloc.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,14 @@
 import math
 import random
+import time
+from collections import OrderedDict
 
-from game_state import GameState, Players, WORD_LEN
+from game_state import GameState, MultiBoardState, Players, WORD_LEN, letter_counts
+from feedback import NUM_PATTERNS
+from words import Words
+from opening_book import OpeningBook, book_key
+from policy_solver import Policy, POLICY_FILE
+from instrumentation import STATS, instrumented, instrumented_move
 import numpy as np
 import abc
 
@@ -13,6 +20,7 @@ THRESHOLD_EVAL_FUNC = 100
 LOCAL = 'local'  # calculates state score locally, according to state's possible words (not all words)
 CONST = 'const'  # returns state's constant score, calculated in advance using all words
 NULL = 'null'  # random choice between all possible words of state
+POLICY = 'policy'  # decision tree only - follows a guessing tree solved in advance (policy_solver.py)
 
 # Heuristic weights - chosen after testing
 ENTROPY_WEIGHT = 0.6
@@ -22,13 +30,97 @@ GREY_WEIGHT = 0.05
 
 MAX_ENTROPY = 7
 
+TRANSPOSITION_SIZE = 100000  # max number of node values kept by an agent
+
+# max working memory of scoring guesses at once (normal mode scores all the words, in chunks under this cap)
+SCORING_MEMORY_MB = 64
+
+# sampled entropy estimation - the entropies are estimated from a sample of the possible words, and the best
+# scored words (top k, and words whose score may be as good as theirs) are calculated exactly
+SAMPLE_TOP_K = 16
+SAMPLE_Z = 2  # standard errors of the upper bound of an estimated score (about 97.5% one sided confidence)
+# below this number of possible words the exact entropies are as fast as the estimates (whose work per pattern
+# is larger), so they are calculated exactly
+SAMPLE_MIN_CANDIDATES = 1000
+# states whose sampled scores are kept by the search agents (the leaves of a state are scored together)
+SAMPLED_STATES = 256
+
+ITERATIVE_MAX_DEPTH = 5  # max depth of iterative deepening, for agents created without a depth
+
+# flags of alpha-beta values in the transposition table
+EXACT = 0
+LOWER = 1  # the value is a lower bound (the search failed high)
+UPPER = 2  # the value is an upper bound (the search failed low)
+
+
+class TranspositionTable:
+    """
+    A size capped (least recently used) table of search node values
+    """
+
+    def __init__(self, size=TRANSPOSITION_SIZE):
+        self.size = size
+        self._values = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """
+        returns the value stored for a node, or None
+        :param key: node key
+        :return:
+        """
+        value = self._values.get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self._values.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        """
+        stores the value of a node, dropping the least recently used node if the table is full
+        :param key: node key
+        :param value: node value
+        :return:
+        """
+        if self.size <= 0:
+            return
+        self._values[key] = value
+        self._values.move_to_end(key)
+        if len(self._values) > self.size:
+            self._values.popitem(last=False)
+
+    def clear(self):
+        self._values.clear()
+
+    def stats(self):
+        """
+        returns the table counters
+        :return: dictionary
+        """
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self._values)}
+
+    def __len__(self):
+        return len(self._values)
+
+
+class SearchTimeout(Exception):
+    """
+    Raised inside a search when the budget of the move is used up
+    """
+
 
 class Agent:
     """
     An abstract agent class. All the agents inherit from this class.
     """
+    # searches deeper than 1 guess use the constant evaluation instead of the local one
+    const_eval_when_deep = False
 
-    def __init__(self, depth=1, evaluation_function=None):
+    def __init__(self, depth=1, evaluation_function=None, transposition_size=TRANSPOSITION_SIZE,
+                 use_opening_book=True, time_budget_ms=None, node_budget=None):
         self._depth = depth
         if evaluation_function == LOCAL:
             self.evaluation_function = eval_func
@@ -36,9 +128,171 @@ class Agent:
             self.evaluation_function = eval_func_const
         else:
             self.evaluation_function = null_heuristic
+        # node values are kept between get_action calls (and games), until reset_transpositions is called
+        self.transpositions = TranspositionTable(transposition_size)
+        # search statistics - nodes expanded (not found in the table) and alpha-beta cutoffs
+        self.nodes = 0
+        self.cutoffs = 0
+        self.use_opening_book = use_opening_book
+        self._book_moves = None
+        # with a budget the search deepens iteratively, until the budget of the move is used up
+        self.time_budget_ms = time_budget_ms
+        self.node_budget = node_budget
+        self.depth_reached = 0  # depth of the last completed search of the last move
+        self._deadline = None
+        self._node_limit = None
+        self._principal = None  # best action of the previous iteration
+        # sampled entropies of the local evaluation (SampledEntropy) and, for the search agents, the evaluation
+        # using them instead of the constant evaluation in the searches from large states
+        self.estimator = None
+        self.sampled_evaluation = None
 
-    @abc.abstractmethod
+    def get_config_name(self):
+        """
+        returns the name of the agent configuration, used as its opening book name
+        :return:
+        """
+        name = '{}:{}:{}'.format(type(self).__name__, self.evaluation_function.__name__, self._depth)
+        if self.estimator is not None:
+            name += ':sample{}'.format(self.estimator.sample_size)
+        return name
+
+    def set_sampling(self, sample_size, top_k=SAMPLE_TOP_K, seed=None):
+        """
+        the searches from states with too many possible indications to evaluate every leaf locally estimate the
+        entropies of the local evaluation from samples of sample_size possible words, instead of using the
+        constant evaluation
+        :param sample_size: number of sampled possible words (None - the constant evaluation is used)
+        :param top_k: number of best estimated words calculated exactly
+        :param seed: seed of the samples
+        :return:
+        """
+        if sample_size is None:
+            return
+        if self.evaluation_function is not eval_func:
+            raise Exception("sampled entropies need the local evaluation.")
+        # the alternative is the constant evaluation, so even small sets of possible words are sampled
+        self.estimator = SampledEntropy(sample_size, top_k, seed, min_candidates=0)
+        self.sampled_evaluation = SampledEvaluation(self.estimator)
+
+    def fallback_evaluation(self):
+        """
+        returns the evaluation of a search from a state with too many possible indications to evaluate every leaf
+        locally - the sampled local evaluation if the agent has one, otherwise the constant evaluation
+        :return:
+        """
+        if self.sampled_evaluation is not None and self.evaluation_function is eval_func:
+            return self.sampled_evaluation
+        return eval_func_const
+
+    def get_book_action(self, state: GameState):
+        """
+        returns the precomputed action of the state from the opening book, or None if it is not in the book
+        :param state: game state
+        :return:
+        """
+        if not self.use_opening_book:
+            return None
+        if self._book_moves is None:
+            self._book_moves = OpeningBook.load(state.words).get_moves(self.get_config_name())
+        if not self._book_moves:
+            return None
+        return self._book_moves.get(book_key(state))
+
+    def node_key(self, state: GameState, depth, agent):
+        """
+        returns the transposition table key of a search node.
+        The indicator only branches on realizable indications, so the value of a node depends on its
+        possible words and, for the indicator or a node without possible words, on the guessed word.
+        :param state: game state
+        :param depth: depth left to search
+        :param agent: the player to move
+        :return: hashable key
+        """
+        word = state.get_word() if agent == Players.INDICATOR or state.get_num_possible_words() == 0 else None
+        return state.get_candidates_key(), word, depth, agent, self.evaluation_function
+
+    def search_stats(self):
+        """
+        returns the search counters
+        :return: dictionary
+        """
+        return {'nodes': self.nodes, 'cutoffs': self.cutoffs}
+
+    def reset_transpositions(self):
+        """
+        clears the transposition table
+        :return:
+        """
+        self.transpositions.clear()
+
+    def expand_node(self):
+        """
+        counts an expanded node, stopping the search if the budget of the move is used up
+        :return:
+        """
+        self.nodes += 1
+        if STATS.enabled:
+            STATS.count('nodes')
+        if self._deadline is not None and (time.perf_counter() >= self._deadline or self.nodes >= self._node_limit):
+            raise SearchTimeout()
+
+    @instrumented_move
     def get_action(self, state: GameState):
+        """
+        Returns the action of the agent - from the opening book, by a search of self.depth or,
+        if the agent has a budget, by the deepest search completed within the budget.
+        """
+        book_action = self.get_book_action(state)
+        if book_action is not None:
+            return book_action
+        if self.time_budget_ms is None and self.node_budget is None:
+            self.depth_reached = self._depth
+            return self.search_action(state, self._depth)
+        return self.iterative_deepening(state)
+
+    def iterative_deepening(self, state: GameState):
+        """
+        searches with depth 1, 2, ... until the budget is used up. Each iteration reuses the table
+        entries of the previous ones and searches the previous best action first.
+        :param state: game state
+        :return: the action of the last completed depth
+        """
+        max_depth = self._depth if self._depth > 0 else ITERATIVE_MAX_DEPTH
+        deadline = math.inf if self.time_budget_ms is None else time.perf_counter() + self.time_budget_ms / 1000
+        self._node_limit = math.inf if self.node_budget is None else self.nodes + self.node_budget
+        self._deadline = deadline
+        action = None
+        self.depth_reached = 0
+        set_eval_func = self.evaluation_function
+        try:
+            for depth in range(1, max_depth + 1):
+                if depth > 1 and self.const_eval_when_deep:
+                    # as for a fixed depth > 1 - local evaluation is not relevant
+                    self.evaluation_function = eval_func_const
+                action = self.search_action(state, depth)
+                self._principal = action
+                self.depth_reached = depth
+        except SearchTimeout:
+            pass
+        finally:
+            self._deadline = None
+            self._principal = None
+            self.evaluation_function = set_eval_func
+        if action is None:
+            # not even depth 1 was completed - the action with the best constant score
+            actions = state.get_legal_actions(Players.GUESSER)
+            action = actions[np.argmax(state.words.get_const_scores(state.words.get_word_ids(actions)))]
+        return action
+
+    @abc.abstractmethod
+    def search_action(self, state: GameState, depth):
+        """
+        returns the best action by a search of the given depth
+        :param state: game state
+        :param depth: number of guesses to look ahead
+        :return:
+        """
         return
 
 
@@ -46,13 +300,17 @@ class MinmaxAgent(Agent):
     """
     implements the MinMax Adversarial Search
     """
+    const_eval_when_deep = True
 
-    def __init__(self, depth=1, evaluation_func=None):
-        super().__init__(depth, evaluation_func)
+    def __init__(self, depth=1, evaluation_func=None, transposition_size=TRANSPOSITION_SIZE, use_opening_book=True,
+                 time_budget_ms=None, node_budget=None, sample_size=None, sample_top_k=SAMPLE_TOP_K,
+                 sample_seed=None):
+        super().__init__(depth, evaluation_func, transposition_size, use_opening_book, time_budget_ms, node_budget)
         self._depth = depth
-        if self._depth > 1:
+        if self._depth > 1 and self.const_eval_when_deep:
             # local evaluation is not relevant with depth > 1
             self.evaluation_function = eval_func_const
+        self.set_sampling(sample_size, sample_top_k, sample_seed)
 
     def max_value(self, state, depth):
         """
@@ -60,9 +318,15 @@ class MinmaxAgent(Agent):
         :param depth: depth to check
         :return: max path score
         """
-        actions = state.get_legal_actions(Players.GUESSER)
-        scores = self.min_max(state, actions, depth, self.min_value, Players.GUESSER)
-        return max(scores)
+        key = self.node_key(state, depth, Players.GUESSER)
+        value = self.transpositions.get(key)
+        if value is None:
+            self.expand_node()
+            actions = state.get_legal_actions(Players.GUESSER)
+            scores = self.min_max(state, actions, depth, self.min_value, Players.GUESSER)
+            value = max(scores)
+            self.transpositions.put(key, value)
+        return value
 
     def min_value(self, state, depth):
         """
@@ -70,9 +334,16 @@ class MinmaxAgent(Agent):
         :param depth: depth to check
         :return: min path score
         """
-        actions = state.get_legal_actions(Players.INDICATOR)
-        scores = self.min_max(state, actions, depth, self.max_value, Players.INDICATOR)
-        return min(scores)
+        key = self.node_key(state, depth, Players.INDICATOR)
+        value = self.transpositions.get(key)
+        if value is None:
+            self.expand_node()
+            # the indications of a leaf are not needed for its evaluation
+            actions = state.get_legal_actions(Players.INDICATOR) if depth > 0 else []
+            scores = self.min_max(state, actions, depth, self.max_value, Players.INDICATOR)
+            value = min(scores)
+            self.transpositions.put(key, value)
+        return value
 
     def min_max(self, state: GameState, actions, depth, f_val, agent):
         """
@@ -92,18 +363,21 @@ class MinmaxAgent(Agent):
         scores = [f_val(succ, depth - 1) for succ in successors]
         return scores
 
-    def get_action(self, state: GameState):
+    def search_action(self, state: GameState, depth):
         """
-        Returns the minimax action from the current gameState using self.depth
+        Returns the minimax action from the current gameState using depth
         and evaluation function.
         """
         set_eval_func = self.evaluation_function
         actions = state.get_legal_actions(Players.GUESSER)
         len_indications = len(state.get_possible_indications())
         if len_indications > THRESHOLD_EVAL_FUNC:
-            self.evaluation_function = eval_func_const
-        score_list = self.min_max(state, actions, 2 * self._depth - 1, self.min_value, Players.GUESSER)
-        self.evaluation_function = set_eval_func
+            self.evaluation_function = self.fallback_evaluation()
+        try:
+            self.expand_node()
+            score_list = self.min_max(state, actions, 2 * depth - 1, self.min_value, Players.GUESSER)
+        finally:
+            self.evaluation_function = set_eval_func
         return actions[np.argmax(score_list)]
 
 
@@ -111,91 +385,151 @@ class AlphaBetaAgent(Agent):
     """
     implements the AlphaBeta Adversarial Search
     """
-    def __init__(self, depth=1, evaluation_func=None):
-        super().__init__(depth, evaluation_func)
+    const_eval_when_deep = True
+
+    def __init__(self, depth=1, evaluation_func=None, transposition_size=TRANSPOSITION_SIZE, use_opening_book=True,
+                 time_budget_ms=None, node_budget=None, sample_size=None, sample_top_k=SAMPLE_TOP_K,
+                 sample_seed=None):
+        super().__init__(depth, evaluation_func, transposition_size, use_opening_book, time_budget_ms, node_budget)
         self._depth = depth
-        if self._depth > 1:
+        if self._depth > 1 and self.const_eval_when_deep:
             # local evaluation is not relevant with depth > 1
             self.evaluation_function = eval_func_const
-        self.alpha = -math.inf
-        self.beta = math.inf
+        self.set_sampling(sample_size, sample_top_k, sample_seed)
 
-    def max_value(self, state, depth):
+    def max_value(self, state, depth, alpha, beta):
         """
         :param state: game state object
         :param depth: depth to check
-        :return: max path score
+        :param alpha: best score the guesser is assured of
+        :param beta: best score the indicator is assured of
+        :return: max path score (a bound if it is not between alpha and beta)
         """
-        actions = state.get_legal_actions(Players.GUESSER)
-        scores = self.alpha_beta(state, actions, depth, self.min_value, Players.GUESSER)
-        return max(scores)
+        return self.alpha_beta(state, depth, alpha, beta, Players.GUESSER)
 
-    def min_value(self, state, depth):
+    def min_value(self, state, depth, alpha, beta):
         """
         :param state: game state object
         :param depth: depth to check
-        :return: min path score
+        :param alpha: best score the guesser is assured of
+        :param beta: best score the indicator is assured of
+        :return: min path score (a bound if it is not between alpha and beta)
         """
-        actions = state.get_legal_actions(Players.INDICATOR)
-        scores = self.alpha_beta(state, actions, depth, self.max_value, Players.INDICATOR)
-        return min(scores)
+        return self.alpha_beta(state, depth, alpha, beta, Players.INDICATOR)
 
-    def alpha_beta(self, state: GameState, actions, depth, f_val, agent):
+    def ordered_actions(self, state, agent):
         """
-        AlphaBeta calculation.
-        :param actions: legal actions
+        returns the legal actions of a player, the most promising first - words by their constant score,
+        indications by the number of possible words giving them (fewer first)
+        :param state: game state
+        :param agent: us VS them
+        :return: list of actions
+        """
+        actions = state.get_legal_actions(agent)
+        if len(actions) < 2:
+            return actions
+        if agent == Players.GUESSER:
+            keys = -state.words.get_const_scores(state.words.get_word_ids(actions))
+        else:
+            keys = state.get_indication_probabilities()
+        return [actions[i] for i in np.argsort(keys, kind='stable')]
+
+    def alpha_beta(self, state: GameState, depth, alpha, beta, agent):
+        """
+        AlphaBeta calculation of a node (fail-soft). Node values are kept in the transposition table
+        with a flag telling if the value is exact, or a lower or upper bound.
         :param state: game state
         :param depth: current depth
-        :param f_val: max or min validation
+        :param alpha: best score the guesser is assured of
+        :param beta: best score the indicator is assured of
         :param agent: us VS them
         :return: score
         """
-        if not actions or depth == 0:
-            return [self.evaluation_function(state)]
-        successors = [state.generate_successor(agent, action) for action in actions]
-        if not successors:
-            return [self.evaluation_function(state)]
-
-        scores = []
+        key = self.node_key(state, depth, agent)
+        entry = self.transpositions.get(key)
+        if entry is not None:
+            value, flag = entry
+            if flag == EXACT or (flag == LOWER and value >= beta) or (flag == UPPER and value <= alpha):
+                return value
+        self.expand_node()
+        actions = self.ordered_actions(state, agent) if depth > 0 else []
+        if not actions:
+            value = self.evaluation_function(state)
+            self.transpositions.put(key, (value, EXACT))
+            return value
+        orig_alpha, orig_beta = alpha, beta
         if agent == Players.GUESSER:
-            best_value = -math.inf
-            for succ in successors:
-                best_value = max(best_value, f_val(succ, depth - 1))
-                self.alpha = max(self.alpha, best_value)
-                if self.beta <= self.alpha:
+            value = -math.inf
+            for action in actions:
+                value = max(value, self.min_value(state.generate_successor(agent, action), depth - 1, alpha, beta))
+                if value >= beta:
+                    self.cutoffs += 1
                     break
-            scores.append(best_value)
+                alpha = max(alpha, value)
         else:
-            best_value = math.inf
-            for succ in successors:
-                best_value = min(best_value, f_val(succ, depth - 1))
-                self.alpha = min(self.alpha, best_value)
-                if self.beta <= self.alpha:
+            value = math.inf
+            for action in actions:
+                value = min(value, self.max_value(state.generate_successor(agent, action), depth - 1, alpha, beta))
+                if value <= alpha:
+                    self.cutoffs += 1
                     break
-            scores.append(best_value)
-        return scores
+                beta = min(beta, value)
+        if value <= orig_alpha:
+            flag = UPPER
+        elif value >= orig_beta:
+            flag = LOWER
+        else:
+            flag = EXACT
+        self.transpositions.put(key, (value, flag))
+        return value
 
-    def get_action(self, state: GameState):
+    def search_action(self, state: GameState, depth):
         """
         Returns the action after alpha-beta pruning from the current gameState
-        using self.depth and evaluation function.
+        using depth and evaluation function.
+        The action is the same as MinMax's - of the actions with the best score, the first in the legal actions.
         """
-        set_eval_func = self.evaluation_function
         actions = state.get_legal_actions(Players.GUESSER)
+        depth = 2 * depth - 1
+        if depth <= 0 or len(actions) < 2:
+            return actions[0]
+        set_eval_func = self.evaluation_function
         len_indications = len(state.get_possible_indications())
         if len_indications > THRESHOLD_EVAL_FUNC:
-            self.evaluation_function = eval_func_const
-        score_list = self.alpha_beta(state, actions, 2 * self._depth - 1, self.min_value, Players.GUESSER)
-        self.evaluation_function = set_eval_func
-        return actions[np.argmax(score_list)]
+            self.evaluation_function = self.fallback_evaluation()
+        index = {action: i for i, action in enumerate(actions)}
+        ordered = self.ordered_actions(state, Players.GUESSER)
+        if self._principal in index:
+            # the best action of the previous iteration is searched first
+            ordered.remove(self._principal)
+            ordered.insert(0, self._principal)
+        best_index, best_value = None, -math.inf
+        try:
+            self.expand_node()
+            for action in ordered:
+                # an action before the best one also replaces it with an equal score
+                if best_index is not None and index[action] < best_index:
+                    alpha = np.nextafter(best_value, -math.inf)
+                else:
+                    alpha = best_value
+                value = self.min_value(state.generate_successor(Players.GUESSER, action), depth - 1, alpha,
+                                       math.inf)
+                if best_index is None or value > alpha:
+                    best_index, best_value = index[action], value
+        finally:
+            self.evaluation_function = set_eval_func
+        return actions[best_index]
 
 
 class ExpectiMaxAgent(Agent):
     """
     implements the Expectimax Adversarial Search
     """
-    def __init__(self, depth=1, evaluation_func=None):
-        super().__init__(depth, evaluation_func)
+    def __init__(self, depth=1, evaluation_func=None, transposition_size=TRANSPOSITION_SIZE, use_opening_book=True,
+                 time_budget_ms=None, node_budget=None, sample_size=None, sample_top_k=SAMPLE_TOP_K,
+                 sample_seed=None):
+        super().__init__(depth, evaluation_func, transposition_size, use_opening_book, time_budget_ms, node_budget)
+        self.set_sampling(sample_size, sample_top_k, sample_seed)
 
     def max_value(self, state, depth):
         """
@@ -203,19 +537,36 @@ class ExpectiMaxAgent(Agent):
         :param depth: depth to check
         :return: max path score
         """
-        actions = state.get_legal_actions(Players.GUESSER)
-        scores = self.expectimax(state, actions, depth, self.chance_value, Players.GUESSER)
-        return max(scores)
+        key = self.node_key(state, depth, Players.GUESSER)
+        value = self.transpositions.get(key)
+        if value is None:
+            self.expand_node()
+            actions = state.get_legal_actions(Players.GUESSER)
+            scores = self.expectimax(state, actions, depth, self.chance_value, Players.GUESSER)
+            value = max(scores)
+            self.transpositions.put(key, value)
+        return value
 
     def chance_value(self, state, depth):
         """
         :param state: game state object
         :param depth: depth to check
-        :return: mean of scores
+        :return: expected score
         """
-        actions = state.get_legal_actions(Players.INDICATOR)
-        scores = self.expectimax(state, actions, depth, self.max_value, Players.INDICATOR)
-        return np.mean(scores)
+        key = self.node_key(state, depth, Players.INDICATOR)
+        value = self.transpositions.get(key)
+        if value is None:
+            self.expand_node()
+            # the indications of a leaf are not needed for its evaluation
+            actions = state.get_legal_actions(Players.INDICATOR) if depth > 0 else []
+            scores = self.expectimax(state, actions, depth, self.max_value, Players.INDICATOR)
+            if len(scores) == len(actions):
+                # each indication is weighted by the number of possible words giving it
+                value = float(np.dot(state.get_indication_probabilities(), scores))
+            else:
+                value = scores[0]
+            self.transpositions.put(key, value)
+        return value
 
     def expectimax(self, state: GameState, actions, depth, f_val, agent):
         """
@@ -235,18 +586,21 @@ class ExpectiMaxAgent(Agent):
         scores = [f_val(succ, depth - 1) for succ in successors]
         return scores
 
-    def get_action(self, state: GameState):
+    def search_action(self, state: GameState, depth):
         """
-        Returns the expectimax action from the current gameState using self.depth
+        Returns the expectimax action from the current gameState using depth
         and evaluation function.
         """
         set_eval_func = self.evaluation_function
         actions = state.get_legal_actions(Players.GUESSER)
         len_indications = len(state.get_possible_indications())
         if len_indications > THRESHOLD_EVAL_FUNC:
-            self.evaluation_function = eval_func_const
-        score_list = self.expectimax(state, actions, 2 * self._depth - 1, self.chance_value, Players.GUESSER)
-        self.evaluation_function = set_eval_func
+            self.evaluation_function = self.fallback_evaluation()
+        try:
+            self.expand_node()
+            score_list = self.expectimax(state, actions, 2 * depth - 1, self.chance_value, Players.GUESSER)
+        finally:
+            self.evaluation_function = set_eval_func
         return actions[np.argmax(score_list)]
 
 
@@ -254,89 +608,370 @@ class DecisionTree(Agent):
     """
     implements a DecisionTree
     """
-    def __init__(self, evaluation_func=None):
-        super().__init__(0, evaluation_func)
+    def __init__(self, evaluation_func=None, use_opening_book=True, policy_file=POLICY_FILE, all_guesses=False,
+                 scoring_memory_mb=SCORING_MEMORY_MB, sample_size=None, sample_top_k=SAMPLE_TOP_K, sample_seed=None):
+        if evaluation_func == POLICY:
+            # states out of the guessing tree are decided by the constant evaluation, the tree needs no book
+            super().__init__(0, CONST, use_opening_book=False)
+            self.policy_file = policy_file
+        else:
+            super().__init__(0, evaluation_func, use_opening_book=use_opening_book)
+            self.policy_file = None
+        self._policy = None
+        # normal mode - guesses are any word of the words list (the hidden word is still a frequent word)
+        if all_guesses and self.evaluation_function is not eval_func:
+            raise Exception("guessing all words (normal mode) needs the local evaluation.")
+        self.all_guesses = all_guesses
+        self.scoring_memory_mb = scoring_memory_mb
+        # approximate local evaluation - entropies estimated from a sample of sample_size possible words
+        if sample_size is not None and self.evaluation_function is not eval_func:
+            raise Exception("sampled entropies need the local evaluation.")
+        self.estimator = None if sample_size is None else SampledEntropy(sample_size, sample_top_k, sample_seed)
+
+    def get_config_name(self):
+        """
+        returns the name of the agent configuration, used as its opening book name
+        :return:
+        """
+        name = super().get_config_name()
+        if self.all_guesses:
+            name += ':all'
+        return name
 
+    def get_all_guesses_action(self, state: GameState):
+        """
+        returns the best scored word of all the words (normal mode)
+        :param state: game state
+        :return:
+        """
+        words = state.words
+        scores = eval_word_ids(state, np.arange(len(words.vocabulary)), self.scoring_memory_mb, self.estimator)
+        # among the best scored words a possible word is preferred, it may be the hidden word
+        best = np.flatnonzero(scores == scores.max())
+        possible = best[state.get_candidates()[best]]
+        return words.vocabulary[possible[0] if len(possible) else best[0]]
+
+    def get_policy_action(self, state: GameState):
+        """
+        returns the guess of the guessing tree in the state, or None if the state is not in the tree
+        :param state: game state
+        :return:
+        """
+        if self.policy_file is None:
+            return None
+        if self._policy is None:
+            self._policy = Policy(state.words, self.policy_file)
+        return self._policy.get_guess(state)
+
+    @instrumented_move
     def get_action(self, state: GameState):
         """
         Returns the next decision according to the indication given in game state
         """
+        policy_action = self.get_policy_action(state)
+        if policy_action is not None:
+            return policy_action
+        book_action = self.get_book_action(state)
+        if book_action is not None:
+            return book_action
+        # with two possible words or less, guessing a possible word is never worse
+        if self.all_guesses and state.get_num_possible_words() > 2:
+            return self.get_all_guesses_action(state)
         actions = state.get_legal_actions(Players.GUESSER)
         if self.evaluation_function is None:
             return random.choice(actions)
+        # all the words are scored together
+        if self.evaluation_function is eval_func and self.estimator is not None:
+            return actions[np.argmax(eval_word_ids(state, state.words.get_word_ids(actions), self.scoring_memory_mb,
+                                                   self.estimator))]
+        if self.evaluation_function is eval_func:
+            return actions[np.argmax(eval_func_batch(state, actions))]
+        if self.evaluation_function is eval_func_const:
+            return actions[np.argmax(state.words.get_const_scores(state.words.get_word_ids(actions)))]
         score_list = []
         for word in actions:
-            new_state = GameState(word, state.words, indication=None, yellow_letters=state.get_yellow_letters(),
-                             green_letters=state.get_green_letters(), possible_words=state.get_possible_words(),
-                             prev_guess= state.get_prev_guess())
+            new_state = state.generate_successor(Players.GUESSER, word)
             score_list.append(self.evaluation_function(new_state))
         return actions[np.argmax(score_list)]
 
+
+class MultiBoardAgent(Agent):
+    """
+    A greedy agent of multi board games - guesses the word with the most information on all the unsolved boards
+    together
+    """
+    def __init__(self, all_guesses=False, scoring_memory_mb=SCORING_MEMORY_MB):
+        super().__init__(0, None, use_opening_book=False)
+        self.all_guesses = all_guesses
+        self.scoring_memory_mb = scoring_memory_mb
+
+    def get_config_name(self):
+        """
+        returns the name of the agent configuration
+        :return:
+        """
+        return 'MultiBoardAgent:{}'.format('all' if self.all_guesses else 'answers')
+
+    @instrumented_move
+    def get_action(self, state: MultiBoardState):
+        """
+        Returns the next guess - the last possible word of a board if there is one, otherwise the word with the
+        highest joint entropy (a word possible on some board is preferred among equal entropies)
+        """
+        words = state.words
+        sizes = state.get_num_possible_words()
+        if np.any(sizes == 1):
+            board = state.get_unsolved_boards()[np.argmax(sizes == 1)]
+            return state.get_possible_words(board)[0]
+        num_guesses = len(words.vocabulary) if self.all_guesses else words.num_answers
+        guess_ids = np.arange(num_guesses)
+        scores = get_joint_entropies(state, guess_ids, self.scoring_memory_mb)
+        # guessed words give no information, unless a board is left with them only
+        scores[words.get_word_ids(list(state.get_prev_guess()))] = -1
+        best = np.flatnonzero(scores == scores.max())
+        possible = best[state.get_candidates()[best]]
+        return words.vocabulary[possible[0] if len(possible) else best[0]]
+
+    def search_action(self, state, depth):
+        """
+        the agent is greedy - its action does not depend on the depth
+        :param state: multi board state
+        :param depth: number of guesses to look ahead (ignored)
+        :return:
+        """
+        return self.get_action(state)
+
+
+class SampledEntropy:
+    """
+    Estimates the entropies of the local evaluation from a random sample of the possible words, when there are more
+    possible words than sample_size and min_candidates. The top_k best scored words are then calculated exactly,
+    and so are the words whose score's upper confidence bound reaches the best exact score (up to top_k more words).
+    With a seed the sample of a state depends only on the seed and its possible words, so games are reproducible.
+    """
+    def __init__(self, sample_size, top_k=SAMPLE_TOP_K, seed=None, z=SAMPLE_Z, min_candidates=SAMPLE_MIN_CANDIDATES):
+        if sample_size < 2:
+            raise Exception("the sample size should be at least 2.")
+        if top_k < 1:
+            raise Exception("at least the best estimated word should be calculated exactly (top k >= 1).")
+        self.sample_size = sample_size
+        self.top_k = top_k
+        self.seed = seed
+        self.z = z
+        self.min_candidates = min_candidates
+        self._rng = np.random.default_rng(seed)
+        # statistics of the evaluations - calls estimated, words estimated and calculated exactly,
+        # sum of the standard errors (bits), and calls where no estimated word may beat the best exact word
+        self.calls = 0
+        self.estimated = 0
+        self.escalated = 0
+        self.error_sum = 0.0
+        self.confident = 0
+
+    def sample(self, state: GameState, candidate_ids):
+        """
+        returns a sample of the candidates, or None if they are calculated exactly
+        :param state: GameState object
+        :param candidate_ids: array of word ids
+        :return:
+        """
+        if len(candidate_ids) <= max(self.sample_size, self.min_candidates):
+            return None
+        rng = self._rng
+        if self.seed is not None:
+            rng = np.random.default_rng([self.seed, int.from_bytes(state.get_candidates_key()[:8], 'little')])
+        return np.sort(rng.choice(candidate_ids, self.sample_size, replace=False))
+
+    def escalate(self, scores, errors, exact_scores):
+        """
+        replaces the estimated scores of the contenders with their exact scores
+        :param scores: array of estimated scores (changed in place)
+        :param errors: array of the standard errors of the scores
+        :param exact_scores: function returning the exact scores of an array of indexes of scores
+        :return: scores
+        """
+        exact = np.zeros(len(scores), dtype=bool)
+        contenders = np.argsort(-scores, kind='stable')[:self.top_k]
+        scores[contenders] = exact_scores(contenders)
+        exact[contenders] = True
+        upper = scores + self.z * errors
+        # estimated words which may be as good as the best exact word
+        contenders = np.flatnonzero(~exact & (upper >= scores[exact].max()))
+        contenders = contenders[np.argsort(-upper[contenders], kind='stable')[:self.top_k]]
+        if len(contenders):
+            scores[contenders] = exact_scores(contenders)
+            exact[contenders] = True
+        self.calls += 1
+        self.estimated += len(scores)
+        self.escalated += int(exact.sum())
+        self.error_sum += float(errors.sum())
+        self.confident += bool(not np.any(~exact & (upper >= scores.max())))
+        return scores
+
+    def report(self):
+        """
+        returns the statistics of the evaluations
+        :return: dictionary
+        """
+        return {'sample_size': self.sample_size, 'top_k': self.top_k, 'calls': self.calls,
+                'words_per_call': self.estimated / self.calls if self.calls else 0,
+                'exact_per_call': self.escalated / self.calls if self.calls else 0,
+                'mean_stderr_bits': self.error_sum / self.estimated if self.estimated else 0,
+                'confident_calls': self.confident / self.calls if self.calls else 1}
+
+
+class SampledEvaluation:
+    """
+    The local evaluation of the search agents with sampled entropies. The leaves of a state (its possible words
+    guessed) are scored together by eval_word_ids with the estimator - the first leaf evaluated scores all of them.
+    """
+    __name__ = 'eval_func_sampled'
+
+    def __init__(self, estimator, memory_mb=SCORING_MEMORY_MB, size=SAMPLED_STATES):
+        self.estimator = estimator
+        self.memory_mb = memory_mb
+        # scores of the possible words of the recent states, by their possible and guessed words
+        self._scores = TranspositionTable(size)
+
+    def __call__(self, state: GameState):
+        key = state.get_candidates_key(), frozenset(state.get_prev_guess())
+        scores = self._scores.get(key)
+        if scores is None:
+            word_ids = state.get_candidate_ids()
+            scores = dict(zip(word_ids.tolist(), eval_word_ids(state, word_ids, self.memory_mb, self.estimator)))
+            self._scores.put(key, scores)
+        score = scores.get(state.words.get_word_id(state.get_word()))
+        # a word which is not possible is evaluated alone
+        return eval_func(state) if score is None else float(score)
+
+
+TREE = 'tree'
+NORMAL = 'normal'  # the decision tree guessing all the words (normal mode)
+
+# agent name: agent class (None for the decision tree, which has no depth)
+AGENT_CLASSES = {TREE: None, NORMAL: None, 'minmax': MinmaxAgent, 'alphabeta': AlphaBetaAgent,
+                 'expectimax': ExpectiMaxAgent}
+
+
+def make_agent(agent_name, evaluation_func=None, depth=0, time_budget_ms=None, all_guesses=False, sample_size=None,
+               sample_top_k=SAMPLE_TOP_K, sample_seed=None):
+    """
+    creates an agent - the factory of the game, the performance tests, the opening book and the solver service
+    :param agent_name: key of AGENT_CLASSES
+    :param evaluation_func: local, const, policy, null or None
+    :param depth: search depth (the decision tree has no depth)
+    :param time_budget_ms: time budget of a move (search agents deepen iteratively up to depth)
+    :param all_guesses: the decision tree guesses any word, not only possible words (normal mode)
+    :param sample_size: the local evaluation estimates the entropies from samples of this many possible words
+    (the search agents - only in the searches from large states, instead of using the constant evaluation)
+    :param sample_top_k: number of best estimated words calculated exactly
+    :param sample_seed: seed of the samples
+    :return: Agent object
+    """
+    if agent_name not in AGENT_CLASSES:
+        raise Exception("unknown agent: {}".format(agent_name))
+    if evaluation_func == NULL:
+        evaluation_func = None
+    agent_class = AGENT_CLASSES[agent_name]
+    if agent_class is None:
+        return DecisionTree(evaluation_func=evaluation_func, all_guesses=all_guesses or agent_name == NORMAL,
+                            sample_size=sample_size, sample_top_k=sample_top_k, sample_seed=sample_seed)
+    return agent_class(depth=depth, evaluation_func=evaluation_func, time_budget_ms=time_budget_ms,
+                       sample_size=sample_size, sample_top_k=sample_top_k, sample_seed=sample_seed)
+
+
 # __________________ Heuristics _______________________
 
 
+@instrumented('get_entropy')
 def get_entropy(state: GameState):
     """
     calculates the entropy of a state, by the word it holds
     :param state: GameState object
     :return:
     """
-    possible_words = state.get_possible_words()
-    num_words = len(possible_words)
-    entropy = 0
+    num_words = state.get_num_possible_words()
     if num_words == 0:
-        return entropy
-    indications = state.get_possible_indications()
-    for indication in indications:
-        sample_state = GameState(word=state.get_word(), words=state.words, indication=indication,
-                                 possible_words=state.get_possible_words()[:],
-                                 yellow_letters=state.get_yellow_letters().copy(),
-                                 green_letters=state.get_green_letters()[:],
-                                 prev_guess=state.get_prev_guess())
-        sample_state.update_possible_words()
-        num_possible_words = len(sample_state.get_possible_words())
-        prob = num_possible_words / num_words
-        if prob != 0:
-            info = math.log2(1 / prob)
-        else:
-            info = 0
-        entropy += prob * info
-    return round(entropy, 5)
+        return 0
+    words = state.words
+    entropy = words.feedback.entropies(words.get_word_id(state.get_word()), _counted_candidate_ids(state), num_words)
+    return round(float(entropy), 5)
 
 
-def get_color_avgs(word, all_words):
+def get_entropies(state: GameState, word_list):
+    """
+    calculates the entropies of many words at once, as get_entropy would for each word in the given state
+    :param state: GameState object
+    :param word_list: words to calculate entropy for
+    :return: array of entropies
+    """
+    words = state.words
+    entropies = words.feedback.entropies(words.get_word_ids(word_list), _counted_candidate_ids(state),
+                                         state.get_num_possible_words())
+    return np.round(entropies, 5)
+
+
+def _counted_candidate_ids(state: GameState):
+    """
+    returns the ids of the state's possible words that were not guessed before
+    :param state: GameState object
+    :return:
+    """
+    candidate_ids = state.get_candidate_ids()
+    prev_guess = state.get_prev_guess()
+    if not prev_guess:
+        return candidate_ids
+    return candidate_ids[~np.isin(candidate_ids, state.words.get_word_ids(list(prev_guess)))]
+
+
+def get_color_totals(words: Words, word_ids, counts, num_words):
+    """
+    calculates the total number of green, yellow and grey letters of guessing each of a group of words,
+    when each of the given words is hidden - by the letter counts of the group (5 lookups per word)
+    :param words: Words object
+    :param word_ids: array of the ids of the hidden words
+    :param counts: letter counts of the group of words (game_state.letter_counts)
+    :param num_words: number of words in the group
+    :return: (green, yellow, grey) arrays of totals
+    """
+    hidden_letters = words.letters[word_ids]
+    # a guessed letter is green at the hidden word's letter position, yellow or green if the hidden word has it
+    green = counts[np.arange(WORD_LEN), hidden_letters].sum(axis=1)
+    present = counts.sum(axis=0) @ ~words.grey_masks[:, word_ids]
+    return green, present - green, WORD_LEN * num_words - present
+
+
+def get_color_avgs(word, all_words, words: Words):
     """
     calculates the average number of green, yellow and grey letters of a specific word
     :param word: specified word
     :param all_words:
+    :param words: Words object
     :return:
     """
     if not all_words:
         return 0, 0, 0
-    avg_green_letters = 0
-    avg_yellow_letters = 0
-    avg_grey_letters = 0
-    for w in all_words:
-        for i in range(WORD_LEN):
-            if w[i] == word[i]:
-                avg_green_letters += 1
-            elif w[i] in word:
-                avg_yellow_letters += 1
-            elif w[i] not in word:
-                avg_grey_letters += 1
-    avg_green_letters /= len(all_words)
-    avg_yellow_letters /= len(all_words)
-    avg_grey_letters /= len(all_words)
+    # the colors of each w in all_words are the indication of guessing w when word is hidden
+    totals = get_color_totals(words, [words.get_word_id(word)], letter_counts(words, words.get_word_ids(all_words)),
+                              len(all_words))
+    avg_green_letters, avg_yellow_letters, avg_grey_letters = [total[0] / len(all_words) for total in totals]
     return avg_green_letters, avg_yellow_letters, avg_grey_letters
 
 
+@instrumented('eval_func')
 def eval_func(state: GameState):
     """
     evaluates scores based on possible words in the given state
     :param state: GameState object
     :return:
     """
-    avg_green, avg_yellow, avg_grey = get_color_avgs( state.get_word(), state.get_possible_words())
+    num_words = state.get_num_possible_words()
+    avg_green, avg_yellow, avg_grey = 0, 0, 0
+    if num_words:
+        # the colors of each possible word when it is guessed and the word of the state is hidden
+        totals = get_color_totals(state.words, [state.words.get_word_id(state.get_word())],
+                                  state.get_letter_counts(), num_words)
+        avg_green, avg_yellow, avg_grey = [total[0] / num_words for total in totals]
     entropy = get_entropy(state)
     scaled_entropy = entropy / MAX_ENTROPY
     scaled_avg_green = avg_green / WORD_LEN
@@ -346,6 +981,7 @@ def eval_func(state: GameState):
            YELLOW_WEIGHT*scaled_avg_yellow + GREY_WEIGHT*scaled_avg_grey
 
 
+@instrumented('eval_func_const')
 def eval_func_const(state: GameState):
     """
     evaluates scores based on all words (calculations were preprocessed)
@@ -360,6 +996,133 @@ def eval_func_const(state: GameState):
     return ENTROPY_WEIGHT*scaled_entropy + GREEN_WEIGHT*scaled_avg_green + \
            YELLOW_WEIGHT*scaled_avg_yellow + GREY_WEIGHT*scaled_avg_grey
 
+
+@instrumented('eval_func_batch')
+def eval_func_batch(state: GameState, word_list):
+    """
+    evaluates the scores of many words at once, as eval_func would for each word in the given state
+    :param state: GameState object
+    :param word_list: words to evaluate
+    :return: array of scores
+    """
+    return eval_word_ids(state, state.words.get_word_ids(word_list))
+
+
+def eval_word_ids(state: GameState, word_ids, memory_mb=SCORING_MEMORY_MB, estimator=None):
+    """
+    evaluates the scores of many words (any words, not only possible words) as eval_func would in the given state.
+    The words are scored in chunks, so the working memory stays under memory_mb.
+    :param state: GameState object
+    :param word_ids: array of the ids of the words to evaluate
+    :param memory_mb: max working memory
+    :param estimator: SampledEntropy estimating the entropies (None for exact entropies)
+    :return: array of scores
+    """
+    num_words = state.get_num_possible_words()
+    res = np.zeros(len(word_ids))
+    if num_words == 0:
+        return res
+    words = state.words
+    counted_ids = _counted_candidate_ids(state)
+    sample_ids = None if estimator is None else estimator.sample(state, counted_ids)
+    if sample_ids is not None:
+        return _eval_sampled(state, np.asarray(word_ids), counted_ids, sample_ids, memory_mb, estimator)
+    # pattern rows and codes of the possible words, and the pattern counts and entropy terms of each word
+    word_bytes = words.num_answers + 9 * len(counted_ids) + 2 * 8 * NUM_PATTERNS
+    chunk = max(1, memory_mb * 2 ** 20 // word_bytes)
+    for start in range(0, len(word_ids), chunk):
+        ids = word_ids[start:start + chunk]
+        entropies = words.feedback.entropies(ids, counted_ids, num_words, max_cells=len(ids) * len(counted_ids))
+        res[start:start + chunk] = _local_scores(state, ids, np.round(entropies, 5))
+    return res
+
+
+def _local_scores(state: GameState, word_ids, entropies):
+    """
+    returns the local evaluation of words, given their entropies
+    :param state: GameState object
+    :param word_ids: array of word ids
+    :param entropies: array of the entropies of the words
+    :return: array of scores
+    """
+    num_words = state.get_num_possible_words()
+    # colors of each possible word when it is guessed and the evaluated word is hidden
+    green, yellow, grey = get_color_totals(state.words, word_ids, state.get_letter_counts(), num_words)
+    scaled_avg_green = green / num_words / WORD_LEN
+    scaled_avg_yellow = yellow / num_words / WORD_LEN
+    scaled_avg_grey = grey / num_words / WORD_LEN
+    scaled_entropy = entropies / MAX_ENTROPY
+    return ENTROPY_WEIGHT*scaled_entropy + GREEN_WEIGHT*scaled_avg_green + \
+        YELLOW_WEIGHT*scaled_avg_yellow + GREY_WEIGHT*scaled_avg_grey
+
+
+@instrumented('eval_sampled')
+def _eval_sampled(state: GameState, word_ids, counted_ids, sample_ids, memory_mb, estimator):
+    """
+    evaluates words as eval_word_ids would, with entropies estimated from a sample of the possible words -
+    the contenders chosen by the estimator are calculated exactly
+    :param state: GameState object
+    :param word_ids: array of the ids of the words to evaluate
+    :param counted_ids: ids of the possible words not guessed before
+    :param sample_ids: ids of the sampled possible words
+    :param memory_mb: max working memory
+    :param estimator: SampledEntropy object
+    :return: array of scores
+    """
+    words = state.words
+    num_words = state.get_num_possible_words()
+    res = np.zeros(len(word_ids))
+    errors = np.zeros(len(word_ids))
+    word_bytes = words.num_answers + 9 * len(sample_ids) + 4 * 8 * NUM_PATTERNS
+    chunk = max(1, memory_mb * 2 ** 20 // word_bytes)
+    for start in range(0, len(word_ids), chunk):
+        ids = word_ids[start:start + chunk]
+        entropies, entropy_errors = words.feedback.entropy_estimates(ids, sample_ids, len(counted_ids), num_words,
+                                                                     max_cells=len(ids) * len(sample_ids))
+        res[start:start + chunk] = _local_scores(state, ids, entropies)
+        errors[start:start + chunk] = ENTROPY_WEIGHT * entropy_errors / MAX_ENTROPY
+
+    def exact_scores(indexes):
+        ids = word_ids[indexes]
+        return _local_scores(state, ids, np.round(words.feedback.entropies(ids, counted_ids, num_words), 5))
+
+    return estimator.escalate(res, errors, exact_scores)
+
+
+@instrumented('get_joint_entropies')
+def get_joint_entropies(state: MultiBoardState, guess_ids, memory_mb=SCORING_MEMORY_MB):
+    """
+    calculates the information of each guess on all the unsolved boards of a multi board state - the sum of the
+    entropies of its indications on the boards. The patterns of all the boards are counted in one batched pass
+    (per chunk of guesses, so the working memory stays under memory_mb).
+    :param state: MultiBoardState object
+    :param guess_ids: array of word ids
+    :param memory_mb: max working memory
+    :return: array of joint entropies
+    """
+    board_ids, candidate_ids = state.get_candidate_pairs()
+    sizes = state.get_num_possible_words()
+    num_boards = len(sizes)
+    res = np.zeros(len(guess_ids))
+    if len(candidate_ids) == 0:
+        return res
+    # the term of each pattern count on each board
+    probs = np.arange(sizes.max() + 1)[None, :] / np.maximum(sizes, 1)[:, None]
+    terms = probs * np.log2(probs, where=probs > 0, out=np.zeros_like(probs))
+    board_rows = np.arange(num_boards)[None, :, None]
+    # pattern rows and codes of the possible words, and the pattern counts and entropy terms of each word
+    guess_bytes = state.words.num_answers + 9 * len(candidate_ids) + 2 * 8 * NUM_PATTERNS * num_boards
+    chunk = max(1, memory_mb * 2 ** 20 // guess_bytes)
+    for start in range(0, len(guess_ids), chunk):
+        ids = guess_ids[start:start + chunk]
+        codes = state.words.feedback.patterns(ids, candidate_ids).astype(np.intp)
+        codes += NUM_PATTERNS * (board_ids + num_boards * np.arange(len(ids))[:, None])
+        counts = np.bincount(codes.ravel(), minlength=len(ids) * num_boards * NUM_PATTERNS)
+        counts = counts.reshape(len(ids), num_boards, NUM_PATTERNS)
+        res[start:start + chunk] = -terms[board_rows, counts].sum(axis=(1, 2))
+    return res
+
+
 def null_heuristic(state: GameState):
     """
     null heuristic - returns 0 for each state
@@ -0,0 +1,125 @@
+import os
+from multiprocessing import shared_memory
+import numpy as np
+
+ALIGNMENT = 64  # byte alignment of the arrays in the block
+
+# memory counters of /proc/<pid>/smaps_rollup (kB)
+MEMORY_FIELDS = ['Rss', 'Pss', 'Shared_Clean', 'Private_Clean', 'Private_Dirty']
+
+
+class SharedTables:
+    """
+    Read-only numpy arrays published once in a shared memory block, and attached by the workers of a process pool
+    instead of computing their own copies.
+    The publishing process owns the block - it is removed when the owner closes it (a context manager closes it
+    on errors too), and by the multiprocessing resource tracker if the owner is killed.
+    """
+
+    def __init__(self, block, layout, owner):
+        self._block = block
+        self._layout = layout
+        self.owner = owner
+        self._arrays = dict()
+        for name, (offset, shape, dtype) in layout.items():
+            array = np.ndarray(shape, dtype=dtype, buffer=block.buf, offset=offset)
+            array.flags.writeable = False
+            self._arrays[name] = array
+
+    @classmethod
+    def publish(cls, arrays):
+        """
+        copies arrays to a new shared memory block
+        :param arrays: dictionary of name: array
+        :return: SharedTables object owning the block
+        """
+        layout = dict()
+        size = 0
+        for name, array in arrays.items():
+            layout[name] = (size, array.shape, array.dtype.str)
+            size += -(-array.nbytes // ALIGNMENT) * ALIGNMENT
+        block = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        try:
+            for name, array in arrays.items():
+                offset, shape, dtype = layout[name]
+                np.ndarray(shape, dtype=dtype, buffer=block.buf, offset=offset)[...] = array
+        except Exception:
+            block.close()
+            block.unlink()
+            raise
+        return cls(block, layout, owner=True)
+
+    @classmethod
+    def attach(cls, spec):
+        """
+        attaches a block published by another process
+        :param spec: the spec of the published tables
+        :return: SharedTables object
+        """
+        name, layout = spec
+        return cls(shared_memory.SharedMemory(name), layout, owner=False)
+
+    @property
+    def spec(self):
+        """
+        the name and layout of the block - passed to the workers (picklable)
+        :return:
+        """
+        return self._block.name, self._layout
+
+    @property
+    def nbytes(self):
+        return self._block.size
+
+    def __getitem__(self, name):
+        return self._arrays[name]
+
+    def __contains__(self, name):
+        return name in self._arrays
+
+    def close(self):
+        """
+        detaches the block, and removes it if this process owns it. Arrays still used elsewhere in the process
+        keep the mapping until they are released, but the block is removed anyway.
+        :return:
+        """
+        if self._block is None:
+            return
+        self._arrays.clear()
+        try:
+            self._block.close()
+        except BufferError:
+            pass
+        if self.owner:
+            self._block.unlink()
+        self._block = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def attach_tables(spec):
+    """
+    attaches published tables, if there are any
+    :param spec: the spec of the published tables or None
+    :return: SharedTables object or None
+    """
+    return None if spec is None else SharedTables.attach(spec)
+
+
+def memory_usage(pid='self'):
+    """
+    returns the memory counters of a process (linux only)
+    :param pid: process id
+    :return: dictionary of counter: kB, or None if they are unknown
+    """
+    try:
+        with open(os.path.join('/proc', str(pid), 'smaps_rollup')) as rollup:
+            lines = [line.split() for line in rollup]
+    except OSError:
+        return None
+    counters = {fields[0][:-1]: int(fields[1]) for fields in lines if len(fields) == 3 and fields[2] == 'kB'}
+    return {name: counters.get(name, 0) for name in MEMORY_FIELDS}
@@ -0,0 +1,451 @@
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from words import *
+from game_engine import NUM_GUSSES
+from game_state import GameState, START_WORD, format_feedback, parse_feedback, pattern_to_indication, replay
+from feedback import ALL_GREEN, get_pattern
+from search import AGENT_CLASSES, NULL, SAMPLE_TOP_K, TREE, make_agent
+from performance_tests import BENCHMARK_DIR, LATENCY_PERCENTILES
+from shared_tables import SharedTables, attach_tables
+
+HOST = '127.0.0.1'
+PORT = 8765
+MAX_SESSIONS = 10000
+IDLE_SECONDS = 600
+LOAD_GAMES = 200
+LOAD_CONCURRENCY = 8
+
+# The protocol - one json object per line, answered by one json line:
+# {"op": "new", "agent": "tree", "evaluation_function": "local", "depth": 0}  ->  {"session": id, "guess": word}
+#     (optional make_agent fields too: time_budget_ms, all_guesses, sample_size, sample_top_k, sample_seed)
+# {"op": "feedback", "session": id, "feedback": "bbygb", "guess": word}  ->  {"guess": word, "possible": n}
+#     (the guess is optional - the word played, if it is not the last guess of the service)
+# {"op": "close", "session": id}  ->  {"closed": true}
+# {"op": "stats"}  ->  {"sessions": n, "evicted": n, ...}
+# A game ends ({"done": true, "win": ...}) when the feedback is all green or the guesses are used up.
+# Errors are answered with {"error": message}.
+
+
+def agent_configuration(request):
+    """
+    returns the agent configuration of a new session request
+    :param request: dictionary
+    :return: make_agent arguments - (agent, evaluation function, depth, time budget ms, all guesses, sample size,
+    sample top k, sample seed)
+    """
+    agent_name = request.get('agent', TREE)
+    if agent_name not in AGENT_CLASSES:
+        raise Exception('unknown agent: {}'.format(agent_name))
+    evaluation_func = request.get('evaluation_function', 'local')
+    if evaluation_func not in ('local', 'const', 'policy', NULL, None):
+        raise Exception('unknown evaluation function: {}'.format(evaluation_func))
+    depth = int(request.get('depth', 0 if AGENT_CLASSES[agent_name] is None else 1))
+    time_budget_ms = request.get('time_budget_ms')
+    if time_budget_ms is not None:
+        time_budget_ms = float(time_budget_ms)
+    all_guesses = bool(request.get('all_guesses', False))
+    if all_guesses and AGENT_CLASSES[agent_name] is not None:
+        raise Exception('all_guesses needs the decision tree agent')
+    sample_size, sample_seed = request.get('sample_size'), request.get('sample_seed')
+    configuration = (agent_name, None if evaluation_func == NULL else evaluation_func, depth, time_budget_ms,
+                     all_guesses, None if sample_size is None else int(sample_size),
+                     int(request.get('sample_top_k', SAMPLE_TOP_K)), None if sample_seed is None else int(sample_seed))
+    # a bad configuration fails when the session is opened, not in a worker on its first feedback
+    make_agent(*configuration)
+    return configuration
+
+
+# ___ pool workers ___
+# a worker keeps one agent per configuration (with its transposition table and opening book) between requests
+_worker_words = None
+_worker_agents = dict()
+
+
+def _init_worker(tables_spec=None):
+    global _worker_words
+    _worker_words = Words(attach_tables(tables_spec))
+
+
+def _worker_action(configuration, history):
+    """
+    decides the next guess of a session in a pool worker
+    :param configuration: make_agent arguments
+    :param history: list of (guess, pattern code) of the session
+    :return: (next guess, decision time ms)
+    """
+    agent = _worker_agents.get(configuration)
+    if agent is None:
+        agent = make_agent(*configuration)
+        _worker_agents[configuration] = agent
+    state = replay(_worker_words, history)
+    start_time = time.perf_counter()
+    word = agent.get_action(state)
+    return word, (time.perf_counter() - start_time) * 1000
+
+
+class Session:
+    """
+    A game played through the service - the state after the feedback given so far and the guesses history
+    """
+    def __init__(self, session_id, configuration, state: GameState):
+        self.session_id = session_id
+        self.configuration = configuration
+        self.state = state
+        self.history = []  # (guess, pattern code)
+        self.last_used = time.monotonic()
+        self.lock = asyncio.Lock()  # the requests of a session are handled one at a time
+
+
+class SessionCache:
+    """
+    The sessions of the service - bounded, dropping the least recently used session when full and sessions
+    idle for more than idle_seconds
+    """
+    def __init__(self, max_sessions=MAX_SESSIONS, idle_seconds=IDLE_SECONDS):
+        self.max_sessions = max_sessions
+        self.idle_seconds = idle_seconds
+        self._sessions = OrderedDict()
+        self.evicted = 0
+        self.expired = 0
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def get(self, session_id):
+        """
+        returns a session (marking it as used)
+        :param session_id:
+        :return: Session object
+        """
+        session = self._sessions.get(session_id)
+        if session is None:
+            raise Exception('unknown or expired session: {}'.format(session_id))
+        session.last_used = time.monotonic()
+        self._sessions.move_to_end(session_id)
+        return session
+
+    def add(self, session):
+        """
+        adds a session, dropping the least recently used session if the cache is full
+        :param session: Session object
+        :return:
+        """
+        self._sessions[session.session_id] = session
+        if len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+            self.evicted += 1
+
+    def remove(self, session_id):
+        return self._sessions.pop(session_id, None) is not None
+
+    def expire(self):
+        """
+        drops the sessions idle for more than idle_seconds
+        :return: number of sessions dropped
+        """
+        deadline = time.monotonic() - self.idle_seconds
+        # the sessions are ordered by their last use
+        expired = list(itertools.takewhile(lambda session: session.last_used < deadline, self._sessions.values()))
+        for session in expired:
+            del self._sessions[session.session_id]
+        self.expired += len(expired)
+        return len(expired)
+
+
+class SolverService:
+    """
+    A local asyncio service playing the agents for its clients.
+    The words are loaded once (the word tables are shared with the workers), the sessions states are kept in a
+    SessionCache, and the agents decide in process pools - the decision tree in a fast pool and the search agents
+    in a search pool, so slow searches don't delay the fast decisions.
+    """
+    def __init__(self, fast_workers=1, search_workers=1, max_sessions=MAX_SESSIONS, idle_seconds=IDLE_SECONDS):
+        self.words = Words()
+        self.sessions = SessionCache(max_sessions, idle_seconds)
+        self.tables = SharedTables.publish(self.words.get_tables())
+        try:
+            self.fast_pool = ProcessPoolExecutor(fast_workers, initializer=_init_worker,
+                                                 initargs=(self.tables.spec,))
+            self.search_pool = ProcessPoolExecutor(search_workers, initializer=_init_worker,
+                                                   initargs=(self.tables.spec,))
+        except Exception:
+            self.tables.close()
+            raise
+        self.requests = 0
+        self.errors = 0
+
+    def close(self):
+        self.fast_pool.shutdown(cancel_futures=True)
+        self.search_pool.shutdown(cancel_futures=True)
+        self.tables.close()
+
+    def _pool(self, configuration):
+        return self.fast_pool if AGENT_CLASSES[configuration[0]] is None else self.search_pool
+
+    def new_session(self, request):
+        """
+        opens a session
+        :param request: dictionary with the agent configuration
+        :return: response dictionary - the session id and the first guess
+        """
+        configuration = agent_configuration(request)
+        session = Session(uuid.uuid4().hex, configuration, GameState(START_WORD, self.words, prev_guess=set()))
+        self.sessions.add(session)
+        return {'session': session.session_id, 'guess': START_WORD}
+
+    async def feedback(self, request):
+        """
+        updates a session with the feedback on a guess, and decides the next guess
+        :param request: dictionary with the session id, the feedback and optionally the guess played
+        :return: response dictionary - the next guess, or the end of the game
+        """
+        session = self.sessions.get(request.get('session'))
+        async with session.lock:
+            state = session.state.copy()
+            guess = request.get('guess', state.get_word())
+            if guess not in self.words.word_index:
+                raise Exception('unknown guess: {}'.format(guess))
+            pattern = parse_feedback(request.get('feedback'))
+            if guess != state.get_word():
+                state.set_word(guess)
+            state.set_indication(pattern_to_indication(pattern))
+            history = session.history + [(guess, pattern)]
+            if pattern == ALL_GREEN or len(history) >= NUM_GUSSES:
+                self.sessions.remove(session.session_id)
+                return {'done': True, 'win': pattern == ALL_GREEN, 'turns': len(history)}
+            if state.get_num_possible_words() == 0:
+                raise Exception('no word gives this feedback')
+            loop = asyncio.get_running_loop()
+            word, decision_ms = await loop.run_in_executor(self._pool(session.configuration), _worker_action,
+                                                           session.configuration, history)
+            state.set_word(word)
+            session.state = state
+            session.history = history
+            return {'guess': word, 'possible': state.get_num_possible_words(), 'decision_ms': decision_ms}
+
+    def stats(self):
+        return {'sessions': len(self.sessions), 'evicted': self.sessions.evicted, 'expired': self.sessions.expired,
+                'requests': self.requests, 'errors': self.errors}
+
+    async def handle(self, request):
+        """
+        answers a request
+        :param request: dictionary
+        :return: response dictionary
+        """
+        self.requests += 1
+        try:
+            op = request.get('op')
+            if op == 'new':
+                return self.new_session(request)
+            if op == 'feedback':
+                return await self.feedback(request)
+            if op == 'close':
+                return {'closed': self.sessions.remove(request.get('session'))}
+            if op == 'stats':
+                return self.stats()
+            raise Exception('unknown op: {}'.format(op))
+        except Exception as e:
+            self.errors += 1
+            return {'error': str(e)}
+
+    async def handle_connection(self, reader, writer):
+        """
+        answers the requests of a connection, each request in its own task (a client may send requests of
+        several sessions without waiting). Responses carry the id of their request, if it has one.
+        """
+        async def answer(line):
+            try:
+                request = json.loads(line)
+                if not isinstance(request, dict):
+                    raise ValueError('a request should be a json object')
+            except ValueError as e:
+                self.errors += 1
+                response = {'error': 'bad request: {}'.format(e)}
+            else:
+                response = await self.handle(request)
+                if 'id' in request:
+                    response['id'] = request['id']
+            writer.write((json.dumps(response) + '\n').encode())
+            await writer.drain()
+
+        tasks = set()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if line.strip():
+                    task = asyncio.create_task(answer(line))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+            await asyncio.gather(*tasks, return_exceptions=True)
+        finally:
+            writer.close()
+
+    async def expire_sessions(self):
+        while True:
+            await asyncio.sleep(max(self.sessions.idle_seconds / 2, 1))
+            self.sessions.expire()
+
+    async def serve(self, host=HOST, port=PORT):
+        """
+        serves until cancelled
+        :param host:
+        :param port:
+        :return:
+        """
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        expiry = asyncio.create_task(self.expire_sessions())
+        print('solver service on {}:{}'.format(host, port), flush=True)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            expiry.cancel()
+            self.close()
+
+
+# ___ load generator ___
+
+async def request(reader, writer, message):
+    writer.write((json.dumps(message) + '\n').encode())
+    await writer.drain()
+    response = json.loads(await reader.readline())
+    if 'error' in response:
+        raise Exception(response['error'])
+    return response
+
+
+async def play_client(host, port, configuration, targets, latencies, new_latencies, games):
+    """
+    plays games through the service on one connection, one game after the other
+    :param host:
+    :param port:
+    :param configuration: new session request fields (agent, evaluation_function, depth)
+    :param targets: iterator of hidden words (shared by the clients)
+    :param latencies: list of the latencies of the feedback requests - the decisions (ms)
+    :param new_latencies: list of the latencies of the new session requests (ms)
+    :param games: list of the games results
+    :return:
+    """
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        for target in targets:
+            start_time = time.perf_counter()
+            response = await request(reader, writer, dict(configuration, op='new'))
+            new_latencies.append((time.perf_counter() - start_time) * 1000)
+            session, guesses = response['session'], [response['guess']]
+            while True:
+                feedback = format_feedback(get_pattern(guesses[-1], target))
+                start_time = time.perf_counter()
+                response = await request(reader, writer, {'op': 'feedback', 'session': session, 'feedback': feedback})
+                latencies.append((time.perf_counter() - start_time) * 1000)
+                if response.get('done'):
+                    games.append({'target': target, 'win': response['win'], 'num_guesses': len(guesses)})
+                    break
+                guesses.append(response['guess'])
+    finally:
+        writer.close()
+
+
+async def load_test(host=HOST, port=PORT, configuration=None, num_games=LOAD_GAMES, concurrency=LOAD_CONCURRENCY,
+                    seed=None):
+    """
+    plays games through a running service from concurrent clients
+    :param host:
+    :param port:
+    :param configuration: new session request fields (agent, evaluation_function, depth)
+    :param num_games: number of games
+    :param concurrency: number of clients (connections) playing at once
+    :param seed: seed of the hidden words
+    :return: dictionary of the summary - throughput and latency percentiles (of the feedback requests, and
+    separately of the new session requests, which decide nothing)
+    """
+    configuration = configuration or {'agent': 'tree', 'evaluation_function': 'local'}
+    rand = random.Random(seed)
+    frequent_words = Words().frequent_words
+    targets = iter([rand.choice(frequent_words) for _ in range(num_games)])
+    latencies = []
+    new_latencies = []
+    games = []
+    start_time = time.perf_counter()
+    await asyncio.gather(*[play_client(host, port, configuration, targets, latencies, new_latencies, games)
+                           for _ in range(concurrency)])
+    run_time = time.perf_counter() - start_time
+    requests = len(latencies) + len(new_latencies)
+    summary = {'configuration': configuration, 'concurrency': concurrency, 'games': len(games),
+               'wins': sum(game['win'] for game in games), 'requests': requests, 'run_time': run_time,
+               'requests_per_second': requests / run_time, 'games_per_second': len(games) / run_time}
+    for name, values in [('latency_ms', latencies), ('new_latency_ms', new_latencies)]:
+        summary[name] = {'p{}'.format(p): float(np.percentile(values, p)) for p in LATENCY_PERCENTILES}
+        summary[name]['max'] = float(np.max(values))
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Wordle solver service (json lines over TCP) and its load generator')
+    parser.add_argument('--host', default=HOST)
+    parser.add_argument('--port', default=PORT, type=int)
+    parser.add_argument('--fast-workers', help='Processes of the decision tree agents.', default=1, type=int)
+    parser.add_argument('--search-workers', help='Processes of the search agents (MinMax, AlphaBeta, '
+                                                 'ExpectiMax).', default=max(1, (os.cpu_count() or 1) - 1), type=int)
+    parser.add_argument('--max-sessions', help='Sessions kept - the least recently used session is dropped.',
+                        default=MAX_SESSIONS, type=int)
+    parser.add_argument('--idle-seconds', help='Sessions idle for longer are dropped.', default=IDLE_SECONDS,
+                        type=float)
+    parser.add_argument('--load', help='Run the load generator against a running service instead.',
+                        action='store_true')
+    parser.add_argument('--games', help='Number of games of the load generator.', default=LOAD_GAMES, type=int)
+    parser.add_argument('--concurrency', help='Clients of the load generator playing at once.',
+                        default=LOAD_CONCURRENCY, type=int)
+    parser.add_argument('--agent', choices=list(AGENT_CLASSES.keys()), default='tree',
+                        help='Agent of the load generator games.')
+    parser.add_argument('--evaluation_function', default='local', help='local, const, null or policy.')
+    parser.add_argument('--depth', default=None, type=int)
+    parser.add_argument('--all-guesses', help='The load generator decision tree guesses any word.',
+                        action='store_true')
+    parser.add_argument('--sample-size', help='Sample size of the load generator decision tree entropies.',
+                        default=None, type=int)
+    parser.add_argument('--seed', help='Seed of the load generator hidden words.', default=None, type=int)
+    parser.add_argument('--output-dir', help='Directory of the load generator json summary.', default=BENCHMARK_DIR)
+    args = parser.parse_args()
+    if args.load:
+        configuration = {'agent': args.agent, 'evaluation_function': args.evaluation_function}
+        if args.depth is not None:
+            configuration['depth'] = args.depth
+        if args.all_guesses:
+            configuration['all_guesses'] = True
+        if args.sample_size is not None:
+            configuration['sample_size'] = args.sample_size
+        summary = asyncio.run(load_test(args.host, args.port, configuration, args.games, args.concurrency,
+                                        args.seed))
+        os.makedirs(args.output_dir, exist_ok=True)
+        with open(os.path.join(args.output_dir, 'service_load_{}_c{}.json'.format(args.agent, args.concurrency)),
+                  'w') as json_file:
+            json.dump(summary, json_file, indent=1)
+        print('{} games, {} requests in {:.2f}s - {:.1f} requests/s'.format(
+            summary['games'], summary['requests'], summary['run_time'], summary['requests_per_second']))
+        print('feedback latency ms p50/p95/p99/max: ' + '/'.join('{:.2f}'.format(latency)
+                                                                 for latency in summary['latency_ms'].values()))
+        print('new session latency ms p50/p95/p99/max: ' + '/'.join('{:.2f}'.format(latency)
+                                                                    for latency in summary['new_latency_ms'].values()))
+        return
+    service = SolverService(args.fast_workers, args.search_workers, args.max_sessions, args.idle_seconds)
+    try:
+        asyncio.run(service.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,11 @@
 import argparse
-from game import *
+import json
+import os
+import random
+import sys
+import time
+from search import *
+from game_engine import *
 
 START_WORD = 'cares'
 
@@ -10,6 +16,198 @@ MINMAX = 'MinMax'
 ALPHABETA = 'AlphaBeta'
 EXPECTIMAX = 'Expectimax'
 
+# agent: make_agent name of the AI agents
+AGENT_NAMES = {DECISION_TREE: TREE, MINMAX: 'minmax', ALPHABETA: 'alphabeta', EXPECTIMAX: 'expectimax'}
+
+NUM_HEADLESS_GAMES = 10
+BATCH_TASKS_PER_WORKER = 4  # games read ahead of the workers in batch mode
+
+
+def play_headless(agent, words, targets):
+    """
+    plays games of an agent without the GUI, printing the guesses of each game
+    :param agent: Agent object
+    :param words: Words object
+    :param targets: hidden words
+    :return:
+    """
+    from performance_tests import play_game
+    wins = 0
+    total_guesses = 0
+    for target in targets:
+        game = play_game(agent, words, target)
+        wins += game['win']
+        total_guesses += game['num_guesses']
+        result = 'WON in {}'.format(game['num_guesses']) if game['win'] else 'LOST'
+        print('{}: {} - {}'.format(target, ' '.join(game['guesses']), result))
+    print('AVG num guesses: ' + str(total_guesses / len(targets)))
+    print('TOTAL num wins: ' + str(wins) + '/' + str(len(targets)))
+
+
+def play_multi_headless(agent, words, num_boards, games, seed=None, targets=None):
+    """
+    plays multi board games of an agent without the GUI, printing the guesses of each game
+    :param agent: MultiBoardAgent object
+    :param words: Words object
+    :param num_boards: number of boards of a game
+    :param games: number of games
+    :param seed: seed of the random hidden words
+    :param targets: hidden words of a single game to play instead of random games (a word per board)
+    :return:
+    """
+    from performance_tests import play_multi_game
+    if targets is None:
+        rand = random.Random(seed)
+        games_targets = [rand.sample(words.frequent_words, num_boards) for _ in range(games)]
+    else:
+        games_targets = [targets]
+    games = len(games_targets)
+    wins = 0
+    total_guesses = 0
+    for targets in games_targets:
+        game = play_multi_game(agent, words, targets)
+        wins += game['win']
+        total_guesses += game['num_guesses']
+        result = 'WON in {}'.format(game['num_guesses']) if game['win'] else 'LOST'
+        print('{}: {} - {}'.format(' '.join(targets), ' '.join(game['guesses']), result))
+    print('AVG num guesses: ' + str(total_guesses / games))
+    print('TOTAL num wins: ' + str(wins) + '/' + str(games))
+
+
+def parse_batch_line(line):
+    """
+    parses an input line of the batch mode - a hidden word, or a json object with an optional hidden word ("target")
+    and a history of guesses and their feedback ("history": [[guess, feedback], ...], feedback as b/y/g letters)
+    :param line:
+    :return: (hidden word or None, list of (guess, pattern code))
+    """
+    line = line.strip()
+    if not line.startswith('{'):
+        return line.lower(), []
+    game = json.loads(line)
+    target = game.get('target')
+    history = game.get('history', [])
+    if any(not isinstance(word, str) for word in [target or ''] + [guess for guess, _ in history]):
+        raise Exception('the target and the guesses should be words')
+    history = [(guess.lower(), parse_feedback(feedback)) for guess, feedback in history]
+    return None if target is None else target.lower(), history
+
+
+def play_batch_game(agent, words, target, history):
+    """
+    plays a game from a history of guesses - to its end if the hidden word is known, otherwise only the next guess
+    is decided
+    :param agent: Agent object
+    :param words: Words object
+    :param target: hidden word or None
+    :param history: list of (guess, pattern code) played so far
+    :return: dictionary of the game results
+    """
+    for word in [target] + [guess for guess, _ in history]:
+        if word is not None and word not in words.word_index:
+            raise Exception('unknown word: {}'.format(word))
+    if len(history) > NUM_GUSSES:
+        raise Exception('a game has at most {} guesses'.format(NUM_GUSSES))
+    if any(pattern == ALL_GREEN for _, pattern in history[:-1]):
+        raise Exception('the game ended before the last guess of the history')
+    for guess, pattern in history:
+        if target is not None and get_pattern(guess, target) != pattern:
+            raise Exception('feedback does not match the target: {} {}'.format(guess, format_feedback(pattern)))
+    if not history:
+        if target is None:
+            raise Exception('a game needs a hidden word or a history')
+        history = [(START_WORD, get_pattern(START_WORD, target))]
+    history = list(history)
+    state = replay(words, history)
+    decisions = []
+    next_guess = None
+    while history[-1][1] != ALL_GREEN and len(history) < NUM_GUSSES:
+        if state.get_num_possible_words() == 0:
+            raise Exception('no word gives this feedback')
+        start_time = time.perf_counter()
+        word = agent.get_action(state)
+        decisions.append((time.perf_counter() - start_time) * 1000)
+        if target is None:
+            next_guess = word
+            break
+        history.append((word, get_pattern(word, target)))
+        state.set_word(word)
+        state.set_indication(pattern_to_indication(history[-1][1]))
+    res = {'target': target, 'win': history[-1][1] == ALL_GREEN, 'turns': len(history),
+           'guesses': [guess for guess, _ in history], 'feedback': [format_feedback(p) for _, p in history],
+           'decision_ms': decisions}
+    if target is None:
+        res['next_guess'] = next_guess
+    return res
+
+
+# the agent and words of a batch process
+_batch_agent = None
+_batch_words = None
+
+
+def _init_batch_worker(agent_args, tables_spec=None):
+    global _batch_agent, _batch_words
+    from shared_tables import attach_tables
+    _batch_words = Words(attach_tables(tables_spec))
+    _batch_agent = make_agent(*agent_args)
+
+
+def _batch_game(line_num, line):
+    """
+    plays the game of an input line
+    :param line_num: input line number (results are written as games finish, not in the input order)
+    :param line:
+    :return: dictionary of the game results, or of the error
+    """
+    try:
+        res = play_batch_game(_batch_agent, _batch_words, *parse_batch_line(line))
+    except Exception as e:
+        res = {'error': str(e), 'input': line.strip()}
+    res['line'] = line_num
+    return res
+
+
+def run_batch(agent_args, lines, output, workers=1):
+    """
+    plays the games of input lines, writing a json line per game as soon as it ends.
+    Only a few games per worker are read ahead, so the memory is bounded for any input size.
+    :param agent_args: make_agent arguments
+    :param lines: iterable of input lines
+    :param output: text file of the results
+    :param workers: number of processes
+    :return: (games, wins, errors)
+    """
+    counts = {'games': 0, 'wins': 0, 'errors': 0}
+
+    def write(res):
+        counts['errors' if 'error' in res else 'games'] += 1
+        counts['wins'] += bool(res.get('win'))
+        output.write(json.dumps(res) + '\n')
+        output.flush()
+
+    games = ((line_num, line) for line_num, line in enumerate(lines, 1) if line.strip())
+    if workers <= 1:
+        _init_batch_worker(agent_args)
+        for line_num, line in games:
+            write(_batch_game(line_num, line))
+        return counts['games'], counts['wins'], counts['errors']
+    from concurrent.futures import ProcessPoolExecutor, wait, as_completed, FIRST_COMPLETED
+    from shared_tables import SharedTables
+    # the word tables are published once, the workers attach them read-only
+    with SharedTables.publish(Words().get_tables()) as tables, \
+            ProcessPoolExecutor(workers, initializer=_init_batch_worker, initargs=(agent_args, tables.spec)) as pool:
+        pending = set()
+        for line_num, line in games:
+            pending.add(pool.submit(_batch_game, line_num, line))
+            if len(pending) >= workers * BATCH_TASKS_PER_WORKER:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    write(future.result())
+        for future in as_completed(pending):
+            write(future.result())
+    return counts['games'], counts['wins'], counts['errors']
+
 
 def main():
     """
@@ -18,26 +216,100 @@ def main():
     """
     parser = argparse.ArgumentParser(description='Wordle AI Game')
     agents = [HUMAN, DECISION_TREE, MINMAX, ALPHABETA, EXPECTIMAX]
-    heuristics = [CONST, LOCAL, NULL]
+    heuristics = [CONST, LOCAL, NULL, POLICY]
     parser.add_argument('--agent', choices=agents, help='The agent (AI model or human player)', default=HUMAN, type=str)
     parser.add_argument('--depth', help='The maximum depth for to search in the game tree.', default=0, type=int)
-    parser.add_argument('--evaluation_function', choices=heuristics, help='The evaluation function for the AI agents - local, const or null',
+    parser.add_argument('--evaluation_function', choices=heuristics, help='The evaluation function for the AI agents - local, const or null (policy for the decision tree)',
                         default='null', type=str)
+    parser.add_argument('--time-budget-ms', help='Time budget of an AI move - the search deepens iteratively until '
+                                                 'it is used up (up to --depth, if given).', default=None, type=float)
+    parser.add_argument('--all-guesses', help='Normal mode - the decision tree guesses any word of the words list, '
+                                              'not only possible words (local evaluation).', action='store_true')
+    parser.add_argument('--sample-size', help='Estimate the entropies of the local evaluation from samples of this '
+                                              'many possible words in the searches from states with many possible '
+                                              'indications, which otherwise use the constant evaluation (MinMax, '
+                                              'AlphaBeta, Expectimax).', default=None, type=int)
+    parser.add_argument('--sample-top-k', help='Best estimated words whose entropies are calculated exactly.',
+                        default=SAMPLE_TOP_K, type=int)
+    parser.add_argument('--sample-seed', help='Seed of the samples.', default=None, type=int)
+    parser.add_argument('--headless', help='Play without the GUI, printing the games.', action='store_true')
+    parser.add_argument('--games', help='Number of random hidden words to play (headless).',
+                        default=NUM_HEADLESS_GAMES, type=int)
+    parser.add_argument('--targets', help='Hidden words to play (headless), instead of random words.', nargs='+')
+    parser.add_argument('--seed', help='Seed of the random hidden words (headless).', default=None, type=int)
+    parser.add_argument('--boards', help='Play multi board games (Quordle is 4, Octordle 8) headless with the '
+                                         'multi board agent.', default=None, type=int)
+    parser.add_argument('--batch', help='Play the games of a file (- for stdin) without the GUI: a hidden word or a '
+                                        'json game ({"target": ..., "history": [[guess, feedback], ...]}) per line. '
+                                        'A json line is written per game as soon as it ends.', nargs='?', const='-')
+    parser.add_argument('--output', help='File of the batch results (default stdout).', default=None)
+    parser.add_argument('--workers', help='Number of processes of the batch mode.', default=1, type=int)
     args = parser.parse_args()
-    human_player = False
-    depth = args.depth
-    heuristic = None if args.evaluation_function == 'null' else args.evaluation_function
-    if args.agent == HUMAN:
-        human_player = True
-        agent = None
-    elif args.agent == MINMAX:
-        agent = MinmaxAgent(depth=depth, evaluation_func=heuristic)
-    elif args.agent == ALPHABETA:
-        agent = AlphaBetaAgent(depth=depth, evaluation_func=heuristic)
-    elif args.agent == EXPECTIMAX:
-        agent = ExpectiMaxAgent(depth=depth, evaluation_func=heuristic)
-    else:
-        agent = DecisionTree(evaluation_func=heuristic)
+    if args.boards is not None:
+        if args.agent != HUMAN or args.evaluation_function != NULL or args.depth != 0 or \
+                args.time_budget_ms is not None or args.sample_size is not None or args.batch is not None:
+            parser.error('--boards plays the multi board agent, it takes no --agent, --evaluation_function, --depth, '
+                         '--time-budget-ms, --sample-size or --batch')
+        words = Words()
+        if not 1 <= args.boards <= words.num_answers:
+            parser.error('--boards must be between 1 and {}'.format(words.num_answers))
+        if args.targets is not None:
+            if len(args.targets) != args.boards:
+                parser.error('--targets needs a hidden word per board')
+            unknown = [target for target in args.targets if target not in words.word_index]
+            if unknown:
+                parser.error('unknown hidden words: ' + ' '.join(unknown))
+        agent = MultiBoardAgent(all_guesses=args.all_guesses)
+        play_multi_headless(agent, words, args.boards, args.games, args.seed, args.targets)
+        return
+    if args.headless and args.agent == HUMAN:
+        parser.error('--headless needs an AI agent')
+    if args.all_guesses and (args.agent != DECISION_TREE or args.evaluation_function != LOCAL):
+        parser.error('--all-guesses needs the DecisionTree agent with the local evaluation function')
+    if args.sample_size is not None and (args.agent in [HUMAN, DECISION_TREE] or args.evaluation_function != LOCAL):
+        parser.error('--sample-size needs a search agent (MinMax, AlphaBeta or Expectimax) with the local evaluation '
+                     'function')
+    if args.sample_size is not None and args.agent in [MINMAX, ALPHABETA] and args.depth > 1:
+        parser.error('--sample-size needs --depth 1 (or 0 with a time budget) with MinMax and AlphaBeta, which use '
+                     'the constant evaluation deeper')
+    if args.sample_size is not None and args.sample_size < 2:
+        parser.error('--sample-size should be at least 2')
+    if args.sample_top_k < 1:
+        parser.error('--sample-top-k should be at least 1')
+    agent_args = (AGENT_NAMES.get(args.agent), args.evaluation_function, args.depth, args.time_budget_ms,
+                  args.all_guesses, args.sample_size, args.sample_top_k, args.sample_seed)
+    if args.batch is not None:
+        if args.agent == HUMAN:
+            parser.error('--batch needs an AI agent')
+        lines = sys.stdin if args.batch == '-' else open(args.batch)
+        output = sys.stdout if args.output is None else open(args.output, 'w')
+        try:
+            games, wins, errors = run_batch(agent_args, lines, output, args.workers)
+        except BrokenPipeError:
+            # the reader of the results is gone (e.g. piped to head) - python flushing stdout at exit would fail too
+            os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+            return
+        finally:
+            if lines is not sys.stdin:
+                lines.close()
+            if output is not sys.stdout:
+                output.close()
+        print('games: {}, wins: {}, errors: {}'.format(games, wins, errors), file=sys.stderr)
+        return
+    human_player = args.agent == HUMAN
+    agent = None if human_player else make_agent(*agent_args)
+    if args.headless:
+        words = Words()
+        targets = args.targets
+        if targets is None:
+            targets = random.Random(args.seed).sample(words.frequent_words, min(args.games, words.num_answers))
+        unknown = [target for target in targets if target not in words.word_index]
+        if unknown:
+            parser.error('unknown hidden words: ' + ' '.join(unknown))
+        play_headless(agent, words, targets)
+        return
+    # tkinter is only loaded for the GUI
+    from game import Game_GUI
     gui = Game_GUI()
     gui.run(agent, human_player=human_player)
 
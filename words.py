@@ -1,5 +1,7 @@
 import random
-import pandas as pd
+import numpy as np
+from feedback import FeedbackMatrix, encode_words, ALPHABET_SIZE
+from packed_words import load_packed_words, word_file_to_list, FEATURES
 
 # Heuristic weights - chosen after testing
 ENTROPY_WEIGHT = 0.6
@@ -11,17 +13,97 @@ USED_WORDS = 'used_words'
 FREQ_WORDS = 'freq_words'
 ALL_WORDS = 'all_words'
 
+# the tables computed from the words, which processes can share (shared_tables.py) instead of computing them
+WORD_TABLES = ['vocabulary_array', 'letters', 'green_masks', 'grey_masks', 'yellow_masks']
+
 
 class Words:
     """
     Holds all used words and their constant scores
     """
-    def __init__(self):
-        self.word_map = pd.read_csv('word_data.csv')
-        # all possible 5 letters english words
-        self.all_words = self.word_file_to_list('wordslist.txt')
+    def __init__(self, tables=None):
+        """
+        :param tables: SharedTables published by another process holding the WORD_TABLES (computed if None)
+        """
+        data = load_packed_words()
+        # word ids - frequent words first (in their order), then the rest of the words
+        self.vocabulary_array = data['vocabulary'].astype('U') if tables is None else tables['vocabulary_array']
+        self.vocabulary = self.vocabulary_array.tolist()
+        self.num_answers = data['num_answers']
+        # all possible 5 letters english words (the strings of the vocabulary)
+        self.all_words = [self.vocabulary[i] for i in data['all_words_order'].tolist()]
         # 3000 most frequent words
-        self.frequent_words = self.word_file_to_list('freq_words.txt')
+        self.frequent_words = self.vocabulary[:self.num_answers]
+        self.word_index = dict(zip(self.vocabulary, range(len(self.vocabulary))))
+        self._feedback = None
+        # candidate filtering masks over word ids, for each (position, letter) and indication
+        self._tables = tables
+        if tables is None:
+            self.letters = encode_words(self.vocabulary)
+            alphabet = np.arange(ALPHABET_SIZE)
+            self.green_masks = self.letters.T[:, None, :] == alphabet[None, :, None]
+            present = np.zeros((ALPHABET_SIZE, len(self.vocabulary)), dtype=bool)
+            present[self.letters, np.arange(len(self.vocabulary))[:, None]] = True
+            self.grey_masks = ~present
+            self.yellow_masks = present[None, :, :] & ~self.green_masks
+        else:
+            for name in WORD_TABLES[1:]:
+                setattr(self, name, tables[name])
+        # constant values by word id (nan for words without pre-calculated values) - float32 columns mapped from
+        # the packed file, shared by all the processes using it
+        self.features = data['features']
+        self.valued_ids = np.flatnonzero(~np.isnan(self.features['entropy_scaled']))
+
+    @property
+    def feedback(self):
+        """
+        the feedback patterns matrix of all words against the frequent words (loaded on first use)
+        :return: FeedbackMatrix
+        """
+        if self._feedback is None:
+            self._feedback = FeedbackMatrix(self.vocabulary, self.num_answers, letters=self.letters)
+        return self._feedback
+
+    def get_tables(self):
+        """
+        returns the tables to publish to other processes
+        :return: dictionary of name: array
+        """
+        return {name: getattr(self, name) for name in WORD_TABLES}
+
+    def get_word_id(self, word):
+        """
+        returns the id of a word
+        :param word:
+        :return:
+        """
+        return self.word_index[word]
+
+    def get_word_ids(self, word_list):
+        """
+        returns an array of the ids of the given words
+        :param word_list:
+        :return:
+        """
+        return np.fromiter((self.word_index[w] for w in word_list), dtype=np.intp, count=len(word_list))
+
+    def get_words(self, word_ids):
+        """
+        returns a list of the words of the given ids
+        :param word_ids: array of word ids
+        :return:
+        """
+        return self.vocabulary_array[word_ids].tolist()
+
+    def get_words_mask(self, word_list):
+        """
+        returns a boolean mask over word ids, set for the given words
+        :param word_list:
+        :return:
+        """
+        mask = np.zeros(len(self.vocabulary), dtype=bool)
+        mask[self.get_word_ids(word_list)] = True
+        return mask
 
     def word_file_to_list(self, file_name):
         """
@@ -29,11 +111,7 @@ class Words:
         :param file_name:
         :return: list of words in file
         """
-        words = open(file_name, 'r', encoding='utf-8-sig')
-        word_lines = words.readlines()
-        word_list = [word.rstrip() for word in word_lines]
-        words.close()
-        return word_list
+        return word_file_to_list(file_name)
 
     def get_word(self, word_list):
         """
@@ -53,7 +131,7 @@ class Words:
         :param value: desired value
         :return:
         """
-        return self.word_map.loc[self.word_map['word'] == word][value].values[0]
+        return float(self.features[value][self.word_index[word]])
 
     def get_entropy(self, word):
         """
@@ -63,6 +141,14 @@ class Words:
         """
         return self._get_word_valued(word, 'entropy')
 
+    def get_full_entropy(self, word):
+        """
+        returns word entropy (not rounded, known for all words)
+        :param word:
+        :return:
+        """
+        return self._get_word_valued(word, 'full_entropy')
+
     def get_entropy_scaled(self, word):
         """
         returns word constant scaled entropy
@@ -111,17 +197,17 @@ class Words:
         returns max valued word (used for starting word)
         :return:
         """
-        max_word = 'which'
-        max_val = 0
-        for i, row in self.word_map.iterrows():
-            word = row['word']
-            scaled_entropy = self.get_entropy_scaled(word)
-            scaled_avg_green = self.get_avg_green(word)
-            scaled_avg_yellow = self.get_avg_yellow(word)
-            scaled_avg_grey = self.get_avg_grey(word)
-            val = ENTROPY_WEIGHT * scaled_entropy + GREEN_WEIGHT * scaled_avg_green + \
-                  YELLOW_WEIGHT * scaled_avg_yellow + GREY_WEIGHT * scaled_avg_grey
-            if val > max_val:
-                max_val = val
-                max_word = word
-        return max_word
\ No newline at end of file
+        scores = self.get_const_scores(self.valued_ids)
+        return self.vocabulary[self.valued_ids[np.argmax(scores)]]
+
+    def get_const_scores(self, word_ids):
+        """
+        returns the constant scores of many words at once
+        :param word_ids: array of word ids
+        :return: array of scores
+        """
+        # the stored values are float32, the scores are calculated in float64
+        return ENTROPY_WEIGHT * self.features['entropy_scaled'][word_ids].astype(np.float64) + \
+               GREEN_WEIGHT * self.features['avg_green_scaled'][word_ids].astype(np.float64) + \
+               YELLOW_WEIGHT * self.features['avg_yellow_scaled'][word_ids].astype(np.float64) + \
+               GREY_WEIGHT * self.features['avg_grey_scaled'][word_ids].astype(np.float64)